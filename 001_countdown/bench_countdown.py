@@ -0,0 +1,725 @@
+"""Scaling benchmark for the countdown window and its engine, headless
+
+For each size it builds a TimerEngine and a CountdownTimer window and
+measures:
+
+    create     engine.add_many and the list build (show_timers), timers per second
+    memory     traced Python allocations per timer, engine and UI together
+    steady     CPU share and thread count while every timer counts down, and
+               while the window is minimized, plus the catch-up on restore
+    refresh    time per update_timer_display call and per full frame flush
+    churn      timers added and deleted one at a time through the window, with
+               count timers already listed, and the rows built meanwhile
+    cold       start-up from a saved snapshot: time until the window takes
+               input (first restored batch shown) and until every timer is in
+    fire       lateness of every completion, in the engine and in the UI,
+               and drift of recurring timers over several cycles
+    sim        a day of timers on a VirtualClock, engine only: wall time to
+               advance through it and whether completions came in order
+    dag        a layered pipeline where each timer waits for DAG_FAN_IN of the
+               layer before, on a VirtualClock: time to add it (cycle check
+               and in-degree counters) and to run it through
+
+The window needs no display: by default Tk is replaced by an in-process
+mock that keeps the widget API and runs after callbacks from a real-time
+queue, so the numbers cover the Python side (engine, index, coalescing,
+row binding) but not Tk's own drawing. Under Xvfb the real Tk can be used:
+
+    python bench_countdown.py --sizes 100 1000 10000 100000 --json out.json
+    xvfb-run python bench_countdown.py --tk real --sizes 100 1000 10000
+    python bench_countdown.py --compare baseline.json out.json
+"""
+import argparse
+import heapq
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+
+SIZES = (100, 1000, 10000, 100000)
+
+# Steady-state timers never finish during the run
+STEADY_SECONDS = 3.0
+STEADY_DURATION = 3600
+
+# Recurring timers for the fire phase: first fires spread over one period
+FIRE_PERIOD = 1
+FIRE_CYCLES = 3
+
+# Add + delete pairs in the churn benchmark
+CHURN_CYCLES = 500
+
+# Simulated span of the sim phase; every SIM_REPEAT_EVERY-th timer repeats hourly
+SIM_SECONDS = 86400
+SIM_REPEAT_EVERY = 100
+
+# Pipeline shape of the dag phase
+DAG_WIDTH = 100
+DAG_FAN_IN = 3
+
+# Metrics where a higher value is better; everything else is a cost
+HIGHER_IS_BETTER = ('create_rate', 'show_rate', 'churn_rate', 'sim_in_order')
+
+# Mock Tk
+
+class _MockVariable:
+    default = ''
+
+    def __init__(self, master=None, value=None, name=None):
+        self.value = self.default if value is None else value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+    def trace_add(self, mode, callback):
+        return 'trace'
+
+class _MockWidget:
+    """Widget accepting the calls the window makes, keeping only its options"""
+    def __init__(self, master=None, cnf=None, **options):
+        self.master = master
+        self.children = []
+        self.options = options
+        if master is not None:
+            master.children.append(self)
+
+    def configure(self, cnf=None, **options):
+        self.options.update(options)
+    config = configure
+
+    def cget(self, key):
+        return self.options.get(key, '')
+
+    def get(self):
+        variable = self.options.get('textvariable')
+        return variable.get() if variable is not None else ''
+
+    def winfo_children(self):
+        return list(self.children)
+
+    def bindtags(self, tags=None):
+        return () if tags is None else None
+
+    def winfo_height(self):
+        return 600
+
+    def winfo_width(self):
+        return 800
+
+    def winfo_y(self):
+        return 0
+
+    def winfo_ismapped(self):
+        return True
+
+    def canvasy(self, y):
+        return y
+
+    def after_idle(self, func, *args):
+        return self.after(0, func, *args)
+
+    def destroy(self):
+        if self.master is not None and self in self.master.children:
+            self.master.children.remove(self)
+
+    def after(self, ms, func=None, *args):
+        return self.root_window().after(ms, func, *args)
+
+    def root_window(self):
+        widget = self
+        while widget.master is not None:
+            widget = widget.master
+        return widget
+
+    def _ignore(self, *args, **options):
+        return None
+
+    # Geometry, events and window manager calls have no visible effect here
+    pack = pack_forget = place = place_forget = grid = bind = bind_class = _ignore
+    title = geometry = resizable = protocol = withdraw = deiconify = lift = _ignore
+    focus_set = set = add = insert = delete = see = current = _ignore
+
+class _MockListbox(_MockWidget):
+    def __init__(self, master=None, cnf=None, **options):
+        super().__init__(master, cnf, **options)
+        self.lines = []
+
+    def insert(self, index, *lines):
+        self.lines.extend(lines)
+
+    def delete(self, first, last=None):
+        last = len(self.lines) if last == 'end' else (first if last is None else last) + 1
+        del self.lines[first:last]
+
+    def size(self):
+        return len(self.lines)
+
+class _MockCanvas(_MockWidget):
+    def create_window(self, *args, **options):
+        return 1
+
+    def bbox(self, *args):
+        return (0, 0, 0, 0)
+
+    def yview(self, *args):
+        return (0.0, 1.0)
+
+class _MockInterpreter:
+    """The Tcl calls the window makes itself: 'after info'"""
+    def __init__(self, root):
+        self.root = root
+
+    def call(self, *args):
+        if args == ('after', 'info'):
+            with self.root.cond:
+                return tuple(entry[2] for entry in self.root.queue)
+        raise _MockTclError(f"unsupported Tcl call {args!r}")
+
+    def splitlist(self, value):
+        return value
+
+class _MockTclError(Exception):
+    pass
+
+class _MockTk(_MockWidget):
+    """Root window whose after queue is drained by run_until()
+
+    after() may be called from other threads, as with the real Tk; it wakes
+    the pumping thread so those callbacks are not delayed.
+    """
+    def __init__(self, *args, **options):
+        super().__init__(None)
+        self.queue = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.tk = _MockInterpreter(self)
+
+    def after(self, ms, func=None, *args):
+        if func is None:
+            time.sleep(ms / 1000)
+            return None
+        with self.cond:
+            number = next(self.counter)
+            callback_id = f"after#{number}"
+            heapq.heappush(self.queue, (time.monotonic() + ms / 1000, number, callback_id, func, args))
+            self.cond.notify()
+        return callback_id
+
+    def after_cancel(self, callback_id):
+        with self.cond:
+            self.queue = [entry for entry in self.queue if entry[2] != callback_id]
+            heapq.heapify(self.queue)
+
+    def run_until(self, end):
+        """Run callbacks as they fall due until monotonic time end"""
+        queue = self.queue
+        while True:
+            with self.cond:
+                now = time.monotonic()
+                if now >= end:
+                    return
+                if not queue or queue[0][0] > now:
+                    self.cond.wait(min(end, queue[0][0] if queue else end) - now)
+                    continue
+                _, _, _, func, args = heapq.heappop(queue)
+            func(*args)
+
+    def mainloop(self):
+        raise RuntimeError("the mock Tk has no mainloop; the benchmark pumps it")
+
+def mock_tkinter():
+    """Install the mock as tkinter, ttk, messagebox and filedialog"""
+    tk = types.ModuleType('tkinter')
+    variables = {'StringVar': '', 'IntVar': 0, 'DoubleVar': 0.0, 'BooleanVar': False}
+    for name, default in variables.items():
+        setattr(tk, name, type(name, (_MockVariable,), {'default': default}))
+    for name in ('Frame', 'LabelFrame', 'Label', 'Button', 'Entry', 'Spinbox', 'Checkbutton',
+                 'Scrollbar', 'Toplevel'):
+        setattr(tk, name, type(name, (_MockWidget,), {}))
+    tk.Listbox = _MockListbox
+    tk.Canvas = _MockCanvas
+    tk.Tk = _MockTk
+    tk.TclError = _MockTclError
+    for name in ('BOTH', 'LEFT', 'RIGHT', 'TOP', 'BOTTOM', 'X', 'Y', 'END', 'NORMAL',
+                 'DISABLED', 'RAISED', 'VERTICAL', 'HORIZONTAL'):
+        setattr(tk, name, name.lower())
+
+    ttk = types.ModuleType('tkinter.ttk')
+    for name in ('PanedWindow', 'Progressbar', 'Scrollbar', 'Combobox'):
+        setattr(ttk, name, type(name, (_MockWidget,), {}))
+
+    # The benchmark never triggers dialogs; answer them as a user accepting would
+    messagebox = types.ModuleType('tkinter.messagebox')
+    for name in ('showinfo', 'showwarning', 'showerror'):
+        setattr(messagebox, name, lambda *args, **options: 'ok')
+    messagebox.askyesno = lambda *args, **options: True
+    filedialog = types.ModuleType('tkinter.filedialog')
+    filedialog.askopenfilename = filedialog.asksaveasfilename = lambda *args, **options: ''
+
+    tk.ttk, tk.messagebox, tk.filedialog = ttk, messagebox, filedialog
+    sys.modules.update({
+        'tkinter': tk,
+        'tkinter.ttk': ttk,
+        'tkinter.messagebox': messagebox,
+        'tkinter.filedialog': filedialog,
+    })
+
+def pump(root, seconds):
+    """Run the window's event loop for a while"""
+    end = time.monotonic() + seconds
+    if isinstance(root, _MockTk):
+        root.run_until(end)
+    else:
+        while time.monotonic() < end:
+            root.update()
+            time.sleep(0.001)
+
+# Benchmarks
+
+class _Session:
+    """One engine and window, closed together"""
+    def __init__(self, classic):
+        import tkinter as tk
+        from countdown_timer import CountdownTimer
+        from timer_engine import TimerEngine
+
+        self.engine = TimerEngine()
+        self.root = tk.Tk()
+        self.app = CountdownTimer(self.root, virtual_list=not classic, engine=self.engine)
+
+    def add(self, count, seconds, rule=None):
+        from timer_engine import TimerTask
+        timers = []
+        for i in range(count):
+            timer = TimerTask(f"计时器 {i}", 0, 0, seconds(i) if callable(seconds) else seconds)
+            if rule is not None:
+                timer.recurrence = rule
+            timers.append(timer)
+        return self.engine.add_many(timers)
+
+    def close(self):
+        self.engine.close()
+        self.root.destroy()
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def bench_create(count, classic):
+    session = _Session(classic)
+    try:
+        start = time.perf_counter()
+        timers = session.add(count, STEADY_DURATION)
+        added = time.perf_counter()
+        session.app.show_timers(timers)
+        shown = time.perf_counter()
+    finally:
+        session.close()
+    return {
+        'create_rate': count / (added - start),
+        'show_rate': count / (shown - added),
+    }
+
+def bench_memory(count, classic):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        session = _Session(classic)
+        baseline = tracemalloc.get_traced_memory()[0]
+        session.app.show_timers(session.add(count, STEADY_DURATION))
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    session.close()
+    return {
+        'window_bytes': baseline - before,
+        'bytes_per_timer': (after - baseline) / count,
+    }
+
+def bench_steady(count, classic, seconds):
+    session = _Session(classic)
+    app = session.app
+    try:
+        app.show_timers(session.add(count, STEADY_DURATION))
+        app.start_all_timers()
+        # Let the first tick wave pass before measuring
+        pump(session.root, 1.0)
+
+        updates = app.display_time.count
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        threads = 0
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            pump(session.root, 0.25)
+            threads = max(threads, threading.active_count())
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+
+        # One full frame: every row on screen redrawn at once
+        for timer in [display['timer'] for display in app.timer_displays.values()]:
+            app.mark_dirty(timer)
+        frame = time.perf_counter()
+        app.flush_display_updates()
+        frame = time.perf_counter() - frame
+
+        # Minimized: no redraws and no engine ticks until restored
+        app.set_window_visible(False)
+        pump(session.root, 1.0)
+        hidden_cpu = time.process_time()
+        hidden_wall = time.perf_counter()
+        pump(session.root, seconds)
+        hidden_cpu = time.process_time() - hidden_cpu
+        hidden_wall = time.perf_counter() - hidden_wall
+        restore = time.perf_counter()
+        app.set_window_visible(True)
+        restore = time.perf_counter() - restore
+
+        return {
+            'cpu_percent': 100 * cpu / wall,
+            'threads': threads,
+            'row_updates_per_second': (app.display_time.count - updates) / wall,
+            'row_update_us': app.display_time.mean() * 1e6,
+            'row_update_p99_us': app.display_time.quantile(0.99) * 1e6,
+            'frame_ms': frame * 1000,
+            'hidden_cpu_percent': 100 * hidden_cpu / hidden_wall,
+            'restore_ms': restore * 1000,
+            'rows_built': len(app.timer_displays),
+            'mainloop_latency_p99_ms': app.mainloop_latency.quantile(0.99) * 1000,
+        }
+    finally:
+        session.close()
+
+def bench_churn(count, classic):
+    """Add and delete timers through the window, as a day of short-lived timers would"""
+    session = _Session(classic)
+    app = session.app
+    try:
+        app.show_timers(session.add(count, STEADY_DURATION))
+        # Let the row pool fill up in idle time first
+        pump(session.root, 0.1)
+        built = app.rows_built
+        start = time.perf_counter()
+        for i in range(CHURN_CYCLES):
+            app.task_name_var.set(f"临时 {i}")
+            app.seconds_var.set("30")
+            app.add_timer()
+            app.delete_timer(next(reversed(app.timers.values())))
+        elapsed = time.perf_counter() - start
+    finally:
+        session.close()
+    return {
+        'churn_rate': 2 * CHURN_CYCLES / elapsed,
+        'churn_rows_built': app.rows_built - built,
+    }
+
+def _save_session(directory, count):
+    """Persist count timers, every other one running, as a snapshot in directory"""
+    from timer_engine import TimerEngine, TimerTask
+    from timer_journal import TimerJournal
+
+    engine = TimerEngine()
+    journal = TimerJournal(directory)
+    journal.attach(engine)
+    timers = engine.add_many(TimerTask(f"计时器 {i}", 0, 0, STEADY_DURATION) for i in range(count))
+    for timer in timers[::2]:
+        engine.start(timer.id)
+    journal.close()
+    engine.close()
+    # Attaching again folds the journal into a snapshot
+    journal = TimerJournal(directory)
+    journal.load()
+    journal.attach(TimerEngine())
+    journal.close()
+
+def bench_cold(count, classic):
+    import tkinter as tk
+    from countdown_timer import CountdownTimer
+    from timer_engine import TimerEngine
+    from timer_journal import TimerJournal
+
+    with tempfile.TemporaryDirectory() as directory:
+        _save_session(directory, count)
+        start = time.perf_counter()
+        engine = TimerEngine()
+        root = tk.Tk()
+        app = CountdownTimer(root, virtual_list=not classic, engine=engine)
+        steps = []
+        load_step = app.load_step
+        def timed_step():
+            load_step()
+            steps.append(time.perf_counter())
+        app.load_step = timed_step
+
+        journal = TimerJournal(directory)
+        app.load_timers_incrementally(journal.recover_batches(engine))
+        journal.attach(engine)
+        try:
+            while app.pending_batches is not None or app.pending_rows:
+                pump(root, 0.001)
+        finally:
+            journal.close()
+            engine.close()
+            root.destroy()
+    return {
+        'interactive_ms': (steps[0] - start) * 1000,
+        'loaded_ms': (steps[-1] - start) * 1000,
+        'restored': len(engine.timers),
+    }
+
+def bench_fire(count, classic, period, cycles):
+    """Recurring timers whose first fires are spread over one period"""
+    from timer_schedule import Interval
+
+    session = _Session(classic)
+    app = session.app
+    engine = session.engine
+    # Timer ids -> (end of the first cycle, end of the latest cycle, cycles seen)
+    fires = {}
+    engine_lateness = []
+    ui_lateness = []
+    lock = threading.Lock()
+
+    def on_event(event, timer):
+        if event != 'completed':
+            return
+        now = time.monotonic()
+        end = timer.end_time()
+        with lock:
+            first, _, seen = fires.get(timer.id, (end, end, 0))
+            fires[timer.id] = (first, end, seen + 1)
+            engine_lateness.append(now - end)
+
+    timer_completed = app.timer_completed
+    def on_completed(timer):
+        # By now a recurring timer has started its next cycle
+        with lock:
+            ui_lateness.append(time.monotonic() - fires[timer.id][1])
+        timer_completed(timer)
+
+    try:
+        # Whole seconds only: offsets of up to one period, so durations of 1 or 2
+        timers = session.add(count, lambda i: period + (i % 2), Interval(period))
+        app.show_timers(timers)
+        engine.subscribe(on_event)
+        app.timer_completed = on_completed
+        app.start_all_timers()
+        pump(session.root, (cycles + 1) * period + 0.5)
+    finally:
+        engine.unsubscribe(on_event)
+        session.close()
+
+    # Drift: where the last seen cycle ended against where the schedule says it should
+    drift = [
+        abs(last - (first + (seen - 1) * period))
+        for first, last, seen in fires.values()
+    ]
+    return {
+        'fires': len(engine_lateness),
+        'fire_lateness_p50_ms': _percentile(engine_lateness, 0.5) * 1000,
+        'fire_lateness_p99_ms': _percentile(engine_lateness, 0.99) * 1000,
+        'fire_lateness_max_ms': max(engine_lateness, default=0.0) * 1000,
+        'ui_lateness_p50_ms': _percentile(ui_lateness, 0.5) * 1000,
+        'ui_lateness_p99_ms': _percentile(ui_lateness, 0.99) * 1000,
+        'drift_max_ms': max(drift, default=0.0) * 1000,
+        'cycles_min': min((seen for _, _, seen in fires.values()), default=0),
+    }
+
+def bench_sim(count):
+    """Timers spread over a day, fast-forwarded on a virtual clock"""
+    from timer_clock import VirtualClock
+    from timer_engine import TimerEngine, TimerStore, TimerTask
+    from timer_schedule import Interval
+
+    clock = VirtualClock()
+    store = TimerStore(clock)
+    engine = TimerEngine(tick_events=False, clock=clock)
+    timers = []
+    for i in range(count):
+        # Deterministic spread over the whole span
+        timer = TimerTask(f"sim {i}", 0, 0, 1 + (i * 7919) % SIM_SECONDS, store=store)
+        if i % SIM_REPEAT_EVERY == 0:
+            timer.recurrence = Interval(3600)
+        timers.append(timer)
+    completed = []
+
+    def on_event(event, timer):
+        if event == 'completed':
+            completed.append(clock.now)
+
+    try:
+        engine.add_many(timers)
+        engine.subscribe(on_event)
+        engine.start_all()
+        start = time.perf_counter()
+        clock.advance(SIM_SECONDS)
+        elapsed = time.perf_counter() - start
+    finally:
+        engine.close()
+    return {
+        'sim_ms': elapsed * 1000,
+        'sim_completions': len(completed),
+        'sim_in_order': completed == sorted(completed),
+    }
+
+def bench_dag(count):
+    """A pipeline of count timers in layers, fast-forwarded on a virtual clock"""
+    from timer_clock import VirtualClock
+    from timer_engine import TimerEngine, TimerStore, TimerTask
+
+    clock = VirtualClock()
+    store = TimerStore(clock)
+    engine = TimerEngine(tick_events=False, clock=clock)
+    timers = []
+    for i in range(count):
+        timer = TimerTask(f"dag {i}", 0, 0, 1 + i % 60, task_id=f"dag{i}", store=store)
+        layer = i // DAG_WIDTH
+        if layer:
+            # Deterministic, spread over the previous layer
+            first = (layer - 1) * DAG_WIDTH
+            timer.after = [f"dag{first + (i * 31 + k * 17) % DAG_WIDTH}" for k in range(DAG_FAN_IN)]
+        timers.append(timer)
+    completed = []
+
+    def on_event(event, timer):
+        if event == 'completed':
+            completed.append(timer.id)
+
+    try:
+        start = time.perf_counter()
+        engine.add_many(timers)
+        added = time.perf_counter()
+        engine.subscribe(on_event)
+        engine.start_all()
+        clock.advance(60 * (count // DAG_WIDTH + 1))
+        finished = time.perf_counter()
+    finally:
+        engine.close()
+    return {
+        'dag_add_ms': (added - start) * 1000,
+        'dag_run_ms': (finished - added) * 1000,
+        'dag_completions': len(completed),
+    }
+
+def run(sizes, classic, steady_seconds, cycles):
+    results = []
+    for count in sizes:
+        result = {'timers': count}
+        for name, bench in (
+            ('create', lambda: bench_create(count, classic)),
+            ('memory', lambda: bench_memory(count, classic)),
+            ('steady', lambda: bench_steady(count, classic, steady_seconds)),
+            ('churn', lambda: bench_churn(count, classic)),
+            ('cold', lambda: bench_cold(count, classic)),
+            ('fire', lambda: bench_fire(count, classic, FIRE_PERIOD, cycles)),
+            ('sim', lambda: bench_sim(count)),
+            ('dag', lambda: bench_dag(count)),
+        ):
+            print(f"  {count} timers: {name}", file=sys.stderr, flush=True)
+            result.update(bench())
+        results.append(result)
+    return results
+
+def print_table(results):
+    columns = (
+        ('timers', 'timers', '{:>7}'),
+        ('create/s', 'create_rate', '{:>10.0f}'),
+        ('show/s', 'show_rate', '{:>10.0f}'),
+        ('B/timer', 'bytes_per_timer', '{:>8.0f}'),
+        ('cpu %', 'cpu_percent', '{:>6.1f}'),
+        ('threads', 'threads', '{:>7}'),
+        ('row us', 'row_update_us', '{:>7.1f}'),
+        ('frame ms', 'frame_ms', '{:>8.2f}'),
+        ('hidden %', 'hidden_cpu_percent', '{:>8.1f}'),
+        ('churn/s', 'churn_rate', '{:>8.0f}'),
+        ('tti ms', 'interactive_ms', '{:>7.1f}'),
+        ('fire p99', 'fire_lateness_p99_ms', '{:>8.2f}'),
+        ('ui p99', 'ui_lateness_p99_ms', '{:>7.1f}'),
+        ('drift ms', 'drift_max_ms', '{:>8.3f}'),
+        ('sim ms', 'sim_ms', '{:>7.1f}'),
+        ('dag ms', 'dag_run_ms', '{:>7.1f}'),
+    )
+    print(' '.join(f"{title:>{len(fmt.format(0))}}" for title, _, fmt in columns))
+    for result in results:
+        print(' '.join(fmt.format(result[key]) for _, key, fmt in columns))
+
+def compare(baseline_path, current_path, tolerance):
+    """Print metrics that got worse by more than tolerance; True if none did"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r['timers']: r for r in json.load(f)['results']}
+    with open(current_path, encoding='utf-8') as f:
+        current = {r['timers']: r for r in json.load(f)['results']}
+
+    ok = True
+    for count in sorted(baseline.keys() & current.keys()):
+        for key, old in baseline[count].items():
+            new = current[count].get(key)
+            if key == 'timers' or not isinstance(old, (int, float)) or new is None or not old:
+                continue
+            change = (new - old) / abs(old)
+            if key in HIGHER_IS_BETTER:
+                change = -change
+            if change > tolerance:
+                ok = False
+                print(f"{count:>7} {key:<26} {old:>12.3f} -> {new:>12.3f} ({change:+.0%})")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the countdown window at scale")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    parser.add_argument(
+        '--tk',
+        choices=('mock', 'real'),
+        default='mock',
+        help="mocked Tk (default) or the real one, e.g. under xvfb-run"
+    )
+    parser.add_argument(
+        '--classic-list',
+        action='store_true',
+        help="build one row per timer instead of the virtual list"
+    )
+    parser.add_argument('--steady-seconds', type=float, default=STEADY_SECONDS)
+    parser.add_argument('--cycles', type=int, default=FIRE_CYCLES)
+    parser.add_argument('--json', metavar='PATH', help="also write the results as JSON")
+    parser.add_argument(
+        '--compare',
+        nargs=2,
+        metavar=('BASELINE', 'CURRENT'),
+        help="compare two JSON result files instead of running; exit 1 on regressions"
+    )
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(0 if compare(*args.compare, args.tolerance) else 1)
+
+    if args.tk == 'mock':
+        mock_tkinter()
+    results = run(args.sizes, args.classic_list, args.steady_seconds, args.cycles)
+    print_table(results)
+
+    if args.json:
+        report = {
+            'tk': args.tk,
+            'list': 'classic' if args.classic_list else 'virtual',
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'results': results,
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
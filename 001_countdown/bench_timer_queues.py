@@ -0,0 +1,108 @@
+"""Benchmark the engine's timer storage: binary heap vs hierarchical timing wheel
+
+Times start (push), cancel, reset (cancel + push) and the expiry pass for N
+timers spread over a day, on the bare queues with a synthetic clock so the
+numbers do not depend on the scheduler thread. The engine rows repeat start
+and reset through a TimerEngine with tick events off.
+
+    python bench_timer_queues.py --sizes 10000 100000 1000000 --json out.json
+"""
+import argparse
+import json
+import random
+import time
+
+from timer_engine import HeapTimerQueue, TimerEngine, TimerTask
+from timer_wheel import TimingWheel
+
+class _Timer:
+    __slots__ = ('id',)
+
+    def __init__(self, timer_id):
+        self.id = timer_id
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+def bench_queue(factory, count, seed=0):
+    """Per-operation costs for one queue type, in microseconds"""
+    rng = random.Random(seed)
+    origin = 0.0
+    timers = [_Timer(i) for i in range(count)]
+    # Mostly idle population: deadlines anywhere in the next 24 hours
+    deadlines = [origin + rng.uniform(1.0, 86400.0) for _ in range(count)]
+    sample = rng.sample(timers, max(1, count // 10))
+
+    queue = factory(origin)
+    results = {}
+    results['start'] = _timed(lambda: [queue.push(t, d) for t, d in zip(timers, deadlines)]) / count
+    results['cancel'] = _timed(lambda: [queue.cancel(t) for t in sample]) / len(sample)
+    results['reset'] = _timed(
+        lambda: [queue.push(t, origin + rng.uniform(1.0, 86400.0)) for t in sample]
+    ) / len(sample)
+
+    # Expire the first minute in 10 ms steps, the way the scheduler would wake
+    expired = []
+    def expire():
+        now = origin
+        while now < origin + 60.0:
+            now += 0.01
+            expired.extend(queue.pop_due(now))
+    step_time = _timed(expire)
+    results['expire_step'] = step_time / 6000
+    results['expired'] = len(expired)
+    results['expire_per_timer'] = step_time / max(1, len(expired))
+
+    return {key: value * 1e6 if key != 'expired' else value for key, value in results.items()}
+
+def bench_engine(factory, count, seed=0):
+    """Start and reset cost through TimerEngine, in microseconds per timer"""
+    rng = random.Random(seed)
+    engine = TimerEngine(timer_queue=factory(time.monotonic()), tick_events=False)
+    try:
+        timers = [engine.add(TimerTask(f"t{i}", 0, 0, rng.randint(60, 86400))) for i in range(count)]
+        results = {}
+        results['start'] = _timed(lambda: [engine.start(t.id) for t in timers]) / count
+        results['reset'] = _timed(lambda: [engine.reset(t.id) for t in timers]) / count
+    finally:
+        engine.close()
+    return {key: value * 1e6 for key, value in results.items()}
+
+QUEUES = {
+    'heap': lambda origin: HeapTimerQueue(),
+    'wheel': lambda origin: TimingWheel(origin=origin),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark timer queue storage")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--json', metavar='PATH', help="also write the results as JSON")
+    args = parser.parse_args()
+
+    report = []
+    print(f"{'queue':<6} {'timers':>9} {'start us':>9} {'cancel us':>10} {'reset us':>9} "
+          f"{'step us':>9} {'expired':>8}")
+    for count in args.sizes:
+        for name, factory in QUEUES.items():
+            result = bench_queue(factory, count)
+            result.update(queue=name, timers=count)
+            report.append(result)
+            print(f"{name:<6} {count:>9} {result['start']:>9.2f} {result['cancel']:>10.2f} "
+                  f"{result['reset']:>9.2f} {result['expire_step']:>9.2f} {result['expired']:>8}")
+
+    print(f"\n{'engine':<6} {'timers':>9} {'start us':>9} {'reset us':>9}")
+    for count in args.sizes:
+        for name, factory in QUEUES.items():
+            result = bench_engine(factory, count)
+            result.update(queue=name, timers=count, engine=True)
+            report.append(result)
+            print(f"{name:<6} {count:>9} {result['start']:>9.2f} {result['reset']:>9.2f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,73 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+import os
+import math
+import queue
 import threading
 import time
-import uuid
-from datetime import datetime
-
-class TimerTask:
-    """Individual timer task class"""
-    def __init__(self, name, hours, minutes, seconds, task_id=None):
-        self.id = task_id or str(uuid.uuid4())[:8]
-        self.name = name
-        self.total_seconds = hours * 3600 + minutes * 60 + seconds
-        self.remaining_seconds = self.total_seconds
-        self.is_running = False
-        self.is_paused = False
-        self.is_completed = False
-        self.created_time = datetime.now()
-        self.thread = None
+import argparse
+import collections
+
+import timer_io
+from timer_async import AsyncEngineBridge
+from timer_daemon import SOCKET_FILE, RemoteEngine
+from timer_engine import (
+    MODE_DEADLINE, MODE_PRECISE, STATE_COMPLETED, STATE_IDLE, STATE_PAUSED, STATE_RUNNING,
+    TimerEngine, TimerTask
+)
+from timer_hooks import DEFAULT_TIMEOUT, DEFAULT_WORKERS, HookRunner, parse_hook
+from timer_index import TimerIndex
+from timer_journal import TimerJournal
+from timer_list import VirtualTimerList
+from timer_metrics import UPDATE_BUCKETS, Gauge, Histogram, MetricsRegistry, MetricsServer, write_metrics_file
+from timer_panel import CompletionPanel, StatsPanel
+from timer_schedule import CronSchedule, Interval
+from timer_wheel import TimingWheel
+
+# Batched display refresh interval (about one frame at 60 Hz)
+FRAME_INTERVAL_MS = 16
+
+# Poll period of the queue of engine events from other threads: a frame
+# while they keep coming, longer once it runs dry
+ENGINE_POLL_IDLE_MS = 50
+
+# Precise timers this close to zero repaint every frame while they have a
+# row; all other rows follow the engine's once-a-second ticks
+FAST_REDRAW_SECONDS = 10
+
+# Completions this close together share one notification
+COMPLETION_GROUP_MS = 200
+
+# Flash of a completed timer: alternating colours, 200 ms apart
+FLASH_STEPS = 6
+FLASH_INTERVAL_MS = 200
+
+# Sampling period of the runtime metrics (pending callbacks, stats panel, metrics file)
+METRICS_INTERVAL_MS = 1000
+
+# Classic list rows built per idle callback while a restore is loading
+ROWS_PER_IDLE = 20
+
+# Classic list rows of deleted timers kept for reuse, and how many are built ahead
+ROW_POOL_SIZE = 200
+ROW_POOL_PREBUILD = 20
+
+TIMER_FILE_TYPES = [("CSV", "*.csv"), ("JSON Lines", "*.jsonl *.ndjson")]
+
+# Filter box state choices
+FILTER_STATES = {
+    "全部": None,
+    "未开始": STATE_IDLE,
+    "运行中": STATE_RUNNING,
+    "已暂停": STATE_PAUSED,
+    "已完成": STATE_COMPLETED,
+}
 
 class CountdownTimer:
-    def __init__(self, root):
+    def __init__(self, root, virtual_list=False, engine=None, metrics_file=None, hook_runner=None,
+                 allow_command_hooks=False):
         self.root = root
+        self.virtual_list = virtual_list
         self.root.title("多任务倒计时工具")
         self.root.geometry("800x700")
         self.root.resizable(True, True)
@@ -28,13 +75,130 @@ class CountdownTimer:
         # Set window icon and styling
         self.root.configure(bg='#2c3e50')
 
-        # Timer management
-        self.timers = {}
-        self.active_timers = set()
+        # Timer management lives in the headless engine; this class is a view
+        self.engine = engine or TimerEngine()
+        self.timers = self.engine.timers
+        self.active_timers = self.engine.active
+        self.engine.subscribe(self.on_engine_event)
+        # Groups are a TimerEngine feature; the asyncio bridge has none
+        self.has_groups = hasattr(self.engine, 'start_group')
+        self.has_bulk_ops = hasattr(self.engine, 'start_all')
+        self.has_dependencies = hasattr(self.engine, 'set_dependencies')
+        # A daemon's timers are shared with other clients: rows follow its events
+        self.shared = getattr(self.engine, 'shared', False)
+        # State and name lookups for the filter box and bulk actions
+        self.index = TimerIndex(self.engine)
+
+        # Events the engine emits on its own thread, handed over to this one.
+        # Those listeners never call Tcl: the thread that emits them may be
+        # the one this thread is blocked on
+        self.tk_thread = threading.get_ident()
+        self.engine_events = queue.SimpleQueue()
+
+        # Timers and groups whose display changed, drained once per frame
+        self.dirty_timers = set()
+        self.dirty_controls = set()
+        self.dirty_groups = {}
+        self.frame_pending = False
+        self.coalesced_updates = 0
+
+        # Shown precise timers close to expiry, redrawn every frame
+        self.fast_timers = set()
+        self.fast_pending = False
+
+        # Rows are only redrawn while the window is mapped and they are in view
+        self.window_visible = True
+        self.visibility_pending = False
+        self.can_pause_ticks = hasattr(self.engine, 'set_tick_events')
+
+        # Completed timers waiting for the UI, and the running flash animation
+        self.completed_queue = []
+        self.completion_pending = False
+        self.flashing = {}
+        self.flash_pending = False
+        self.completion_panel = CompletionPanel(self.root)
+
+        # Restored batches still to load at startup, and classic rows still to build
+        self.pending_batches = None
+        self.pending_rows = collections.deque()
+
+        # Unbound classic list rows, reused before any new row is built
+        self.row_pool = []
+        self.pool_fill_pending = False
+        self.rows_built = 0
+
+        # Timers added or deleted by other clients of a shared engine
+        self.structure_changes = []
+        self.structure_pending = False
+
+        # Runs completion hooks off this thread; None when a daemon runs them
+        self.hook_runner = hook_runner
+        # Whether imported files may bring 'cmd:' hooks; typed ones always can
+        self.allow_command_hooks = allow_command_hooks
+
+        # Runtime metrics, sampled on the Tk thread
+        self.display_time = Histogram(
+            'countdown_display_update_seconds',
+            "Time spent in one update_timer_display call",
+            UPDATE_BUCKETS
+        )
+        self.mainloop_latency = Histogram(
+            'countdown_mainloop_latency_seconds',
+            "Delay between a metrics sample's due time and the mainloop running it"
+        )
+        self.pending_callbacks = 0
+        self.metrics = self.create_metrics()
+        self.metrics_file = metrics_file
+        self.stats_panel = StatsPanel(self.root)
 
         # Create GUI elements
         self.create_widgets()
 
+        # <Map>/<Unmap> bound on the root fire for every child widget too; a
+        # tag only the root carries limits them to the window itself
+        self.root.bindtags(self.root.bindtags() + ('CountdownWindow',))
+        self.root.bind_class('CountdownWindow', '<Map>', lambda e: self.set_window_visible(True))
+        self.root.bind_class('CountdownWindow', '<Unmap>', lambda e: self.set_window_visible(False))
+
+        self.metrics_due = time.monotonic() + METRICS_INTERVAL_MS / 1000
+        self.root.after(METRICS_INTERVAL_MS, self.sample_metrics)
+        self.root.after(FRAME_INTERVAL_MS, self.drain_engine_events)
+        if not self.virtual_list:
+            self.schedule_row_pool_fill()
+
+    def create_metrics(self):
+        """Registry of the engine's and this window's metrics"""
+        registry = MetricsRegistry()
+        # Remote engines fire their timers in the daemon, which exports its own
+        lateness = getattr(self.engine, 'lateness', None)
+        if lateness is not None:
+            registry.add(lateness)
+        registry.add(self.display_time)
+        registry.add(self.mainloop_latency)
+        registry.add(Gauge(
+            'countdown_timers',
+            "Timers by state",
+            self.index.counts,
+            label='state'
+        ))
+        registry.add(Gauge(
+            'countdown_pending_after_callbacks',
+            "Tk after callbacks waiting to run",
+            lambda: self.pending_callbacks
+        ))
+        registry.add(Gauge(
+            'countdown_coalesced_updates_total',
+            "Display refreshes merged into an already scheduled frame",
+            lambda: self.coalesced_updates,
+            kind='counter'
+        ))
+        registry.add(Gauge('countdown_threads', "Live threads", threading.active_count))
+        registry.add(Gauge('countdown_row_pool', "Idle timer rows kept for reuse", lambda: len(self.row_pool)))
+        registry.add(Gauge('countdown_rows_built_total', "Timer rows built so far", lambda: self.rows_built, kind='counter'))
+        if self.hook_runner is not None:
+            self.hook_runner.register(registry)
+        return registry
+
     def create_widgets(self):
         # Main container with paned window
         main_paned = ttk.PanedWindow(self.root, orient=tk.VERTICAL)
@@ -85,6 +249,42 @@ class CountdownTimer:
         )
         self.task_name_entry.pack(side=tk.LEFT, padx=5)
 
+        # Optional group name; timers with the same one are started together
+        self.new_group_var = tk.StringVar()
+        if self.has_groups:
+            tk.Label(
+                name_frame,
+                text="分组：",
+                font=("Arial", 12),
+                fg='#ecf0f1',
+                bg='#34495e'
+            ).pack(side=tk.LEFT, padx=5)
+
+            tk.Entry(
+                name_frame,
+                textvariable=self.new_group_var,
+                font=("Arial", 12),
+                width=12
+            ).pack(side=tk.LEFT, padx=5)
+
+        # Names of the timers this one waits for; it starts when they have all completed
+        self.after_var = tk.StringVar()
+        if self.has_dependencies:
+            tk.Label(
+                name_frame,
+                text="前置任务：",
+                font=("Arial", 12),
+                fg='#ecf0f1',
+                bg='#34495e'
+            ).pack(side=tk.LEFT, padx=5)
+
+            tk.Entry(
+                name_frame,
+                textvariable=self.after_var,
+                font=("Arial", 12),
+                width=16
+            ).pack(side=tk.LEFT, padx=5)
+
         # Time input frame
         time_input_frame = tk.Frame(add_timer_frame, bg='#34495e')
         time_input_frame.pack(pady=5, padx=10, fill='x')
@@ -149,6 +349,27 @@ class CountdownTimer:
         )
         seconds_spinbox.grid(row=1, column=2, padx=10)
 
+        # Milliseconds; any value makes a precise timer
+        tk.Label(
+            time_input_frame,
+            text="毫秒",
+            font=("Arial", 12),
+            fg='#ecf0f1',
+            bg='#34495e'
+        ).grid(row=0, column=3, padx=10)
+        self.milliseconds_var = tk.StringVar(value="0")
+        milliseconds_spinbox = tk.Spinbox(
+            time_input_frame,
+            from_=0,
+            to=999,
+            increment=100,
+            width=5,
+            textvariable=self.milliseconds_var,
+            font=("Arial", 16),
+            justify='center'
+        )
+        milliseconds_spinbox.grid(row=1, column=3, padx=10)
+
         # Add button
         self.add_button = tk.Button(
             time_input_frame,
@@ -160,7 +381,67 @@ class CountdownTimer:
             width=12,
             height=2
         )
-        self.add_button.grid(row=1, column=3, padx=20)
+        self.add_button.grid(row=1, column=4, padx=20)
+
+        # Repetition: back to back, or on a cron schedule
+        repeat_frame = tk.Frame(add_timer_frame, bg='#34495e')
+        repeat_frame.pack(pady=5, padx=10, fill='x')
+
+        # Millisecond display for whole-second durations too
+        self.precise_var = tk.BooleanVar()
+        tk.Checkbutton(
+            repeat_frame,
+            text="毫秒精度",
+            variable=self.precise_var,
+            font=("Arial", 11),
+            fg='#ecf0f1',
+            bg='#34495e',
+            selectcolor='#2c3e50'
+        ).pack(side=tk.LEFT, padx=5)
+
+        self.repeat_var = tk.BooleanVar()
+        tk.Checkbutton(
+            repeat_frame,
+            text="循环",
+            variable=self.repeat_var,
+            font=("Arial", 11),
+            fg='#ecf0f1',
+            bg='#34495e',
+            selectcolor='#2c3e50'
+        ).pack(side=tk.LEFT, padx=5)
+
+        tk.Label(
+            repeat_frame,
+            text="Cron（分 时 日 月 周）：",
+            font=("Arial", 11),
+            fg='#ecf0f1',
+            bg='#34495e'
+        ).pack(side=tk.LEFT, padx=5)
+
+        self.cron_var = tk.StringVar()
+        tk.Entry(
+            repeat_frame,
+            textvariable=self.cron_var,
+            font=("Arial", 11),
+            width=20
+        ).pack(side=tk.LEFT, padx=5)
+
+        # Completion hook spec, e.g. cmd:notify-send {name}
+        tk.Label(
+            repeat_frame,
+            text="完成动作：",
+            font=("Arial", 11),
+            fg='#ecf0f1',
+            bg='#34495e'
+        ).pack(side=tk.LEFT, padx=5)
+
+        self.hook_var = tk.StringVar()
+        tk.Entry(
+            repeat_frame,
+            textvariable=self.hook_var,
+            font=("Arial", 11),
+            width=24
+        ).pack(side=tk.LEFT, padx=5)
 
         # Quick set buttons
         quick_frame = tk.Frame(add_timer_frame, bg='#34495e')
@@ -214,6 +495,8 @@ class CountdownTimer:
         )
         list_frame.pack(pady=10, padx=10, fill='both', expand=True)
 
+        self.create_filter_bar(list_frame)
+
         # Create scrollable frame for timers
         self.create_timer_list(list_frame)
 
@@ -265,8 +548,187 @@ class CountdownTimer:
         )
         self.clear_completed_button.pack(side=tk.LEFT, padx=5)
 
+        self.import_button = tk.Button(
+            control_frame,
+            text="导入",
+            command=self.import_timers_from_file,
+            font=("Arial", 12),
+            bg='#16a085',
+            fg='white',
+            width=8
+        )
+        self.import_button.pack(side=tk.LEFT, padx=5)
+
+        self.export_button = tk.Button(
+            control_frame,
+            text="导出",
+            command=self.export_timers_to_file,
+            font=("Arial", 12),
+            bg='#16a085',
+            fg='white',
+            width=8
+        )
+        self.export_button.pack(side=tk.LEFT, padx=5)
+
+        self.stats_button = tk.Button(
+            control_frame,
+            text="统计",
+            command=self.show_stats,
+            font=("Arial", 12),
+            bg='#7f8c8d',
+            fg='white',
+            width=8
+        )
+        self.stats_button.pack(side=tk.LEFT, padx=5)
+
+        self.refresh_stats_label = tk.Label(
+            control_frame,
+            text="合并刷新：0",
+            font=("Arial", 9),
+            fg='#95a5a6',
+            bg='#2c3e50'
+        )
+        self.refresh_stats_label.pack(side=tk.LEFT, padx=5)
+
+        if self.has_groups:
+            self.create_group_controls(bottom_frame)
+
+    def create_group_controls(self, parent):
+        """Row of buttons acting on one group of timers at a time"""
+        group_frame = tk.Frame(parent, bg='#2c3e50')
+        group_frame.pack(pady=(0, 10))
+
+        tk.Label(
+            group_frame,
+            text="分组：",
+            font=("Arial", 12),
+            fg='#ecf0f1',
+            bg='#2c3e50'
+        ).pack(side=tk.LEFT, padx=5)
+
+        self.group_var = tk.StringVar()
+        self.group_combo = ttk.Combobox(
+            group_frame,
+            textvariable=self.group_var,
+            values=sorted(self.engine.groups),
+            state='readonly',
+            width=15
+        )
+        self.group_combo.pack(side=tk.LEFT, padx=5)
+
+        group_actions = [
+            ("开始", self.engine.start_group, '#27ae60'),
+            ("暂停", self.engine.pause_group, '#f39c12'),
+            ("继续", self.engine.resume_group, '#2980b9'),
+            ("重置", self.engine.reset_group, '#e74c3c'),
+        ]
+        for text, action, color in group_actions:
+            tk.Button(
+                group_frame,
+                text=text,
+                command=lambda action=action: self.run_group_action(action),
+                font=("Arial", 11),
+                bg=color,
+                fg='white',
+                width=8
+            ).pack(side=tk.LEFT, padx=2)
+
+    def refresh_group_choices(self):
+        """Offer every group the engine knows in the group selector"""
+        if self.has_groups:
+            self.group_combo.config(values=sorted(self.engine.groups))
+
+    def run_group_action(self, action):
+        """Apply a group operation to the selected group
+
+        The engine announces it with one group event; the rows of its
+        members are refreshed on the next frame.
+        """
+        name = self.group_var.get()
+        if name not in self.engine.groups:
+            messagebox.showwarning("警告", "请选择一个分组！")
+            return
+        action(name)
+
+    def create_filter_bar(self, parent):
+        """Name filter and state selector above the list, applied as the user types"""
+        filter_frame = tk.Frame(parent, bg='#2c3e50')
+        filter_frame.pack(fill='x', padx=10, pady=(5, 0))
+
+        tk.Label(
+            filter_frame,
+            text="筛选：",
+            font=("Arial", 11),
+            fg='#ecf0f1',
+            bg='#2c3e50'
+        ).pack(side=tk.LEFT, padx=5)
+
+        self.filter_var = tk.StringVar()
+        tk.Entry(
+            filter_frame,
+            textvariable=self.filter_var,
+            font=("Arial", 11),
+            width=20
+        ).pack(side=tk.LEFT, padx=5)
+
+        self.filter_state_var = tk.StringVar(value="全部")
+        ttk.Combobox(
+            filter_frame,
+            textvariable=self.filter_state_var,
+            values=list(FILTER_STATES),
+            state='readonly',
+            width=8
+        ).pack(side=tk.LEFT, padx=5)
+
+        self.filter_count_label = tk.Label(
+            filter_frame,
+            text="",
+            font=("Arial", 9),
+            fg='#95a5a6',
+            bg='#2c3e50'
+        )
+        self.filter_count_label.pack(side=tk.LEFT, padx=5)
+
+        self.filter_var.trace_add('write', lambda *args: self.apply_filter())
+        self.filter_state_var.trace_add('write', lambda *args: self.apply_filter())
+
+    def filter_active(self):
+        return bool(self.filter_var.get().strip()) or FILTER_STATES[self.filter_state_var.get()] is not None
+
+    def apply_filter(self):
+        """Show only the timers matching the filter box, in the order they were added"""
+        text = self.filter_var.get().strip()
+        state = FILTER_STATES[self.filter_state_var.get()]
+        if text or state is not None:
+            timers = self.timers
+            shown = [timer for timer in map(timers.get, self.index.query(text, state)) if timer is not None]
+            self.filter_count_label.config(text=f"{len(shown)} / {len(timers)}")
+        else:
+            shown = list(self.timers.values())
+            self.filter_count_label.config(text="")
+
+        if self.virtual_list:
+            self.timer_list.set_items(shown)
+            return
+
+        # Classic list: every timer has a row; repack the matching ones in order
+        for display in self.timer_displays.values():
+            display['frame'].pack_forget()
+        for timer in shown:
+            display = self.timer_displays.get(timer.id)
+            if display is not None:
+                display['frame'].pack(pady=5, padx=10, fill='x')
+
     def create_timer_list(self, parent):
         """Create scrollable frame for timer list"""
+        # Timer display containers
+        self.timer_displays = {}
+
+        if self.virtual_list:
+            # Only the visible rows get widgets; they are rebound while scrolling
+            self.timer_list = VirtualTimerList(parent, self)
+            return
+
         # Canvas and scrollbar
         canvas = tk.Canvas(parent, bg='#2c3e50', highlightthickness=0)
         scrollbar = ttk.Scrollbar(parent, orient="vertical", command=canvas.yview)
@@ -278,19 +740,56 @@ class CountdownTimer:
         )
 
         canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
+        canvas.configure(yscrollcommand=self.on_list_scroll)
+        self.list_canvas = canvas
+        self.list_scrollbar = scrollbar
 
         canvas.pack(side="left", fill="both", expand=True, padx=10, pady=10)
         scrollbar.pack(side="right", fill="y")
 
-        # Timer display containers
-        self.timer_displays = {}
+    def on_list_scroll(self, first, last):
+        """Classic list view moved or resized: update the scrollbar, then row visibility"""
+        self.list_scrollbar.set(first, last)
+        if not self.visibility_pending:
+            self.visibility_pending = True
+            self.root.after_idle(self.update_row_visibility)
+
+    def update_row_visibility(self):
+        """Mark the classic list rows inside the viewport; rows coming into view catch up"""
+        self.visibility_pending = False
+        canvas = self.list_canvas
+        top = canvas.canvasy(0)
+        bottom = top + canvas.winfo_height()
+        for display in list(self.timer_displays.values()):
+            frame = display['frame']
+            y = frame.winfo_y()
+            visible = bool(frame.winfo_ismapped()) and y + frame.winfo_height() > top and y < bottom
+            if visible and not display['visible']:
+                display['visible'] = True
+                self.update_timer_display(display['timer'])
+            else:
+                display['visible'] = visible
+
+    def set_window_visible(self, visible):
+        """Suspend redraws while the window is iconified; catch up in one pass on restore
+
+        Hidden, the engine is also asked to stop ticking, so the scheduler
+        only wakes for completions.
+        """
+        if visible == self.window_visible:
+            return
+        self.window_visible = visible
+        if self.can_pause_ticks:
+            self.engine.set_tick_events(visible)
+        if visible:
+            self.refresh_bound_rows()
 
     def set_quick_time(self, hours, minutes, seconds):
         """Set time from quick buttons"""
         self.hours_var.set(hours)
         self.minutes_var.set(minutes)
         self.seconds_var.set(seconds)
+        self.milliseconds_var.set(0)
 
     def add_timer(self):
         """Add a new timer task"""
@@ -298,38 +797,218 @@ class CountdownTimer:
             hours = int(self.hours_var.get())
             minutes = int(self.minutes_var.get())
             seconds = int(self.seconds_var.get())
+            milliseconds = int(self.milliseconds_var.get() or 0)
             name = self.task_name_var.get().strip()
+            group = self.new_group_var.get().strip() or None
+            cron = self.cron_var.get().strip()
 
             if not name:
                 messagebox.showwarning("警告", "请输入任务名称！")
                 return
-
+            if not 0 <= milliseconds <= 999:
+                messagebox.showwarning("警告", "毫秒应在 0 到 999 之间！")
+                return
+            precise = milliseconds > 0 or self.precise_var.get()
+
+            rule = None
+            if cron:
+                try:
+                    rule = CronSchedule(cron)
+                except ValueError:
+                    messagebox.showwarning("警告", "Cron 表达式无效！")
+                    return
+                # The duration fields do not apply; count down to the next match
+                hours, minutes, seconds = 0, 0, math.ceil(rule.first_duration(time.time()))
+                milliseconds = 0
+
+            seconds += milliseconds / 1000
             total_seconds = hours * 3600 + minutes * 60 + seconds
             if total_seconds <= 0:
                 messagebox.showwarning("警告", "请设置有效的倒计时时间！")
                 return
+            if rule is None and self.repeat_var.get():
+                rule = Interval(total_seconds)
+
+            hooks = []
+            hook_spec = self.hook_var.get().strip()
+            if hook_spec:
+                try:
+                    hooks.append(parse_hook(hook_spec, allow_commands=True))
+                except ValueError:
+                    messagebox.showwarning("警告", "完成动作应写作 cmd:命令、file:路径 或 socket:地址！")
+                    return
+
+            after = self.after_var.get().strip()
+            if after:
+                try:
+                    after = self.resolve_timer_names(after)
+                except LookupError as e:
+                    messagebox.showwarning("警告", str(e))
+                    return
 
             # Create new timer task
-            timer = TimerTask(name, hours, minutes, seconds)
-            self.timers[timer.id] = timer
-
-            # Create display for this timer
-            self.create_timer_display(timer)
+            timer = TimerTask(name, hours, minutes, seconds, mode=MODE_PRECISE if precise else MODE_DEADLINE)
+            timer.recurrence = rule
+            timer.hooks = hooks
+            timer.after = after
+            try:
+                if group is not None:
+                    self.engine.add(timer, group=group)
+                else:
+                    self.engine.add(timer)
+            except ValueError as e:
+                # Refused by the engine, e.g. a daemon that takes no cmd: hooks
+                timer.detach()
+                messagebox.showwarning("警告", f"无法添加计时器：{e}")
+                return
+            if group is not None:
+                self.refresh_group_choices()
+
+            # Create display for this timer; a shared engine's 'added' event does it
+            if not self.shared:
+                if self.virtual_list:
+                    self.timer_list.append(timer)
+                else:
+                    self.create_timer_display(timer)
+                if self.filter_active():
+                    self.apply_filter()
 
             # Reset input fields
             self.hours_var.set("0")
             self.minutes_var.set("0")
             self.seconds_var.set("0")
+            self.milliseconds_var.set("0")
+            self.cron_var.set("")
+            self.hook_var.set("")
+            self.after_var.set("")
             self.task_name_var.set(f"任务 {len(self.timers) + 1}")
 
         except ValueError:
             messagebox.showerror("错误", "请输入有效的数字！")
 
+    def resolve_timer_names(self, text):
+        """Ids of the timers named in a comma-separated list; raises LookupError with a message to show"""
+        timer_ids = []
+        for name in text.replace('，', ',').split(','):
+            name = name.strip()
+            if not name:
+                continue
+            if name in self.timers:
+                timer_ids.append(name)
+                continue
+            folded = name.casefold()
+            matches = [
+                timer_id for timer_id in self.index.with_prefix(name)
+                if timer_id in self.timers and self.timers[timer_id].name.casefold() == folded
+            ]
+            if not matches:
+                raise LookupError(f"没有名为「{name}」的计时器！")
+            if len(matches) > 1:
+                raise LookupError(f"有 {len(matches)} 个计时器名为「{name}」，请改用 ID。")
+            timer_ids.append(matches[0])
+        return timer_ids
+
+    def show_timers(self, timers):
+        """Create displays for timers that are already in the engine"""
+        if self.virtual_list:
+            self.timer_list.extend(timers)
+        else:
+            for timer in timers:
+                self.create_timer_display(timer)
+        self.task_name_var.set(f"任务 {len(self.timers) + 1}")
+        self.refresh_group_choices()
+        if self.filter_active():
+            self.apply_filter()
+
+    def load_timers_incrementally(self, batches):
+        """Show timers from an iterator of restored batches without blocking the window
+
+        One batch is taken per idle callback, so the window is up and takes
+        input from the first one on. Batches come in list order and the
+        viewport shows the top of the list, so visible rows come first; the
+        classic list then builds ROWS_PER_IDLE rows per callback.
+        """
+        self.pending_batches = iter(batches)
+        self.root.title("多任务倒计时工具（正在加载…）")
+        self.root.after_idle(self.load_step)
+
+    def load_step(self):
+        """Take the next restored batch and build the next few classic rows"""
+        if self.pending_batches is not None:
+            batch = next(self.pending_batches, None)
+            if batch is None:
+                self.pending_batches = None
+            elif self.virtual_list:
+                self.show_timers(batch)
+            else:
+                self.pending_rows.extend(batch)
+
+        if self.pending_rows:
+            rows = []
+            for _ in range(min(ROWS_PER_IDLE, len(self.pending_rows))):
+                timer = self.pending_rows.popleft()
+                # Deleted while it waited for its row
+                if timer.id in self.timers:
+                    rows.append(timer)
+            self.show_timers(rows)
+
+        if self.pending_batches is not None or self.pending_rows:
+            self.root.after_idle(self.load_step)
+        else:
+            self.root.title("多任务倒计时工具")
+
     def create_timer_display(self, timer):
-        """Create display for a single timer"""
+        """Show a timer in the classic list, on a pooled row when one is free"""
+        if self.row_pool:
+            display = self.row_pool.pop()
+            display['visible'] = True
+        else:
+            display = self.build_timer_row(self.scrollable_frame)
+        display['frame'].pack(pady=5, padx=10, fill='x')
+        self.bind_timer_row(display, timer)
+        self.schedule_row_pool_fill()
+
+    def release_timer_display(self, timer_id):
+        """Take a timer's row out of the classic list; it goes back to the pool when there is room"""
+        display = self.timer_displays.get(timer_id)
+        if display is None:
+            return
+        display['frame'].pack_forget()
+        self.bind_timer_row(display, None)
+        if len(self.row_pool) < ROW_POOL_SIZE:
+            self.row_pool.append(display)
+        else:
+            display['frame'].destroy()
+
+    def schedule_row_pool_fill(self):
+        """Top the row pool up to ROW_POOL_PREBUILD in idle time, if it is short"""
+        if not self.pool_fill_pending and len(self.row_pool) < ROW_POOL_PREBUILD:
+            self.pool_fill_pending = True
+            self.root.after_idle(self.fill_row_pool)
+
+    def fill_row_pool(self):
+        """Build rows ahead of need, a few per idle callback"""
+        if self.pending_batches is not None or self.pending_rows:
+            # A restore is building rows; top the pool up once it is done
+            self.root.after(FRAME_INTERVAL_MS, self.fill_row_pool)
+            return
+        self.pool_fill_pending = False
+        for _ in range(min(ROWS_PER_IDLE, ROW_POOL_PREBUILD - len(self.row_pool))):
+            self.row_pool.append(self.build_timer_row(self.scrollable_frame))
+        self.schedule_row_pool_fill()
+
+    def build_timer_row(self, parent):
+        """Build the widgets of one timer row, not yet bound to a timer"""
+        self.rows_built += 1
+        # Last values pushed to the widgets, so unchanged ones are skipped
+        display = {
+            'timer': None, 'shown_text': None, 'shown_fg': None, 'shown_progress': None,
+            # Inside the list viewport; virtual list rows only exist while they are
+            'visible': True,
+        }
+
         # Timer frame
-        timer_frame = tk.Frame(self.scrollable_frame, bg='#34495e', relief=tk.RAISED, bd=2)
-        timer_frame.pack(pady=5, padx=10, fill='x')
+        timer_frame = tk.Frame(parent, bg='#34495e', relief=tk.RAISED, bd=2)
 
         # Timer info
         info_frame = tk.Frame(timer_frame, bg='#34495e')
@@ -338,7 +1017,7 @@ class CountdownTimer:
         # Timer name
         name_label = tk.Label(
             info_frame,
-            text=f"🔸 {timer.name}",
+            text="",
             font=("Arial", 14, "bold"),
             fg='#ecf0f1',
             bg='#34495e'
@@ -348,7 +1027,7 @@ class CountdownTimer:
         # Timer ID (small)
         id_label = tk.Label(
             info_frame,
-            text=f"ID: {timer.id}",
+            text="",
             font=("Arial", 9),
             fg='#95a5a6',
             bg='#34495e'
@@ -385,7 +1064,7 @@ class CountdownTimer:
         start_btn = tk.Button(
             control_frame,
             text="开始",
-            command=lambda t=timer: self.start_single_timer(t),
+            command=lambda: self.start_single_timer(display['timer']),
             font=("Arial", 10),
             bg='#27ae60',
             fg='white',
@@ -396,7 +1075,7 @@ class CountdownTimer:
         pause_btn = tk.Button(
             control_frame,
             text="暂停",
-            command=lambda t=timer: self.pause_single_timer(t),
+            command=lambda: self.pause_single_timer(display['timer']),
             font=("Arial", 10),
             bg='#f39c12',
             fg='white',
@@ -408,7 +1087,7 @@ class CountdownTimer:
         reset_btn = tk.Button(
             control_frame,
             text="重置",
-            command=lambda t=timer: self.reset_single_timer(t),
+            command=lambda: self.reset_single_timer(display['timer']),
             font=("Arial", 10),
             bg='#e74c3c',
             fg='white',
@@ -419,7 +1098,7 @@ class CountdownTimer:
         delete_btn = tk.Button(
             control_frame,
             text="删除",
-            command=lambda t=timer: self.delete_timer(t),
+            command=lambda: self.delete_timer(display['timer']),
             font=("Arial", 10),
             bg='#c0392b',
             fg='white',
@@ -428,8 +1107,10 @@ class CountdownTimer:
         delete_btn.pack(side=tk.LEFT, padx=2)
 
         # Store display elements
-        self.timer_displays[timer.id] = {
+        display.update({
             'frame': timer_frame,
+            'name_label': name_label,
+            'id_label': id_label,
             'time_label': time_label,
             'progress_var': progress_var,
             'progress_bar': progress_bar,
@@ -437,182 +1118,679 @@ class CountdownTimer:
             'pause_btn': pause_btn,
             'reset_btn': reset_btn,
             'delete_btn': delete_btn
-        }
+        })
+        return display
 
-    def start_single_timer(self, timer):
-        """Start a single timer"""
-        if timer.is_completed:
-            timer.is_completed = False
-            timer.remaining_seconds = timer.total_seconds
+    def bind_timer_row(self, display, timer):
+        """Point a row at a timer and bring all of its widgets up to date"""
+        previous = display['timer']
+        if previous is not None and self.timer_displays.get(previous.id) is display:
+            del self.timer_displays[previous.id]
+
+        display['timer'] = timer
+        if timer is None:
+            return
 
-        timer.is_running = True
-        timer.is_paused = False
-        self.active_timers.add(timer.id)
+        self.timer_displays[timer.id] = display
+        marker = "🔁" if timer.recurrence is not None else "🔸"
+        display['name_label'].config(text=f"{marker} {timer.name}")
+        self.update_timer_details(timer)
+        self.update_timer_display(timer)
+        self.update_timer_controls(timer)
 
-        # Update button states
-        display = self.timer_displays[timer.id]
-        display['start_btn'].config(state=tk.DISABLED)
-        display['pause_btn'].config(state=tk.NORMAL, text="暂停")
-        display['delete_btn'].config(state=tk.DISABLED)
+    def update_timer_details(self, timer):
+        """Show a timer's id, group and predecessors under its name"""
+        display = self.timer_displays.get(timer.id)
+        if display is None:
+            return
+        details = f"ID: {timer.id}"
+        group = timer.group
+        if group is not None:
+            details += f" · 组: {group.name}"
+        if timer.after:
+            details += f" · 前置: {', '.join(timer.after)}"
+        display['id_label'].config(text=details)
+
+    def update_timer_controls(self, timer):
+        """Set the row buttons to match the timer state"""
+        display = self.timer_displays.get(timer.id)
+        if display is None:
+            return
+
+        if timer.is_running:
+            display['start_btn'].config(state=tk.DISABLED)
+            if timer.is_paused or timer.frozen:
+                display['pause_btn'].config(state=tk.NORMAL, text="继续", bg='#27ae60')
+            else:
+                display['pause_btn'].config(state=tk.NORMAL, text="暂停", bg='#f39c12')
+            display['delete_btn'].config(state=tk.DISABLED)
+        else:
+            start_text = "重新开始" if timer.is_completed else "开始"
+            display['start_btn'].config(state=tk.NORMAL, text=start_text)
+            display['pause_btn'].config(state=tk.DISABLED, text="暂停", bg='#f39c12')
+            display['delete_btn'].config(state=tk.NORMAL)
+
+    def start_single_timer(self, timer):
+        """Start a single timer"""
+        self.engine.start(timer.id)
 
-        # Start timer thread
-        timer.thread = threading.Thread(target=self.run_timer, args=(timer,))
-        timer.thread.daemon = True
-        timer.thread.start()
+        # Update button states and show the starting value
+        self.update_timer_controls(timer)
+        self.update_timer_display(timer)
 
     def pause_single_timer(self, timer):
         """Pause/resume a single timer"""
         if timer.is_running:
-            timer.is_paused = not timer.is_paused
-            display = self.timer_displays[timer.id]
-
-            if timer.is_paused:
-                display['pause_btn'].config(text="继续", bg='#27ae60')
+            if timer.frozen:
+                # Held by its paused group; resuming the group releases it
+                self.engine.resume_group(timer.group.name)
+            elif timer.is_paused:
+                self.engine.resume(timer.id)
             else:
-                display['pause_btn'].config(text="暂停", bg='#f39c12')
+                self.engine.pause(timer.id)
+
+            self.update_timer_controls(timer)
 
     def reset_single_timer(self, timer):
         """Reset a single timer"""
-        timer.is_running = False
-        timer.is_paused = False
-        timer.is_completed = False
-        timer.remaining_seconds = timer.total_seconds
-        self.active_timers.discard(timer.id)
+        self.engine.reset(timer.id)
 
         # Update display
         self.update_timer_display(timer)
 
         # Update button states
-        display = self.timer_displays[timer.id]
-        display['start_btn'].config(state=tk.NORMAL)
-        display['pause_btn'].config(state=tk.DISABLED, text="暂停", bg='#f39c12')
-        display['delete_btn'].config(state=tk.NORMAL)
+        self.update_timer_controls(timer)
 
     def delete_timer(self, timer):
         """Delete a timer"""
         if timer.is_running:
-            if messagebox.askyesno("确认", "计时器正在运行，确定要删除吗？"):
-                timer.is_running = False
-                self.active_timers.discard(timer.id)
+            if not messagebox.askyesno("确认", "计时器正在运行，确定要删除吗？"):
+                return
         else:
             if not messagebox.askyesno("确认", f"确定要删除计时器 '{timer.name}' 吗？"):
                 return
 
-        # Remove display
-        display = self.timer_displays[timer.id]
-        display['frame'].destroy()
-        del self.timer_displays[timer.id]
+        # Remove display; a shared engine's 'deleted' event does it
+        if not self.shared:
+            if self.virtual_list:
+                self.timer_list.remove(timer)
+            else:
+                self.release_timer_display(timer.id)
 
         # Remove timer
-        del self.timers[timer.id]
+        self.engine.delete(timer.id)
 
     def start_all_timers(self):
         """Start all non-completed timers"""
-        for timer in self.timers.values():
-            if not timer.is_completed and not timer.is_running:
-                self.start_single_timer(timer)
+        if not self.has_bulk_ops:
+            for timer in list(self.timers.values()):
+                if not timer.is_completed and not timer.is_running:
+                    self.start_single_timer(timer)
+            return
+        self.engine.start_all()
+        self.refresh_bound_rows()
 
     def pause_all_timers(self):
-        """Pause/resume all running timers"""
-        for timer in self.timers.values():
-            if timer.is_running:
-                self.pause_single_timer(timer)
+        """Pause all running timers, or resume them all if none was running"""
+        if not self.has_bulk_ops:
+            running = [t for t in self.timers.values() if t.is_running and not t.is_paused]
+            if running:
+                for timer in running:
+                    self.engine.pause(timer.id)
+            else:
+                for timer in list(self.timers.values()):
+                    if timer.is_running and timer.is_paused:
+                        self.engine.resume(timer.id)
+        elif not self.engine.pause_all():
+            self.engine.resume_all()
+        self.refresh_bound_rows()
 
     def reset_all_timers(self):
         """Reset all timers"""
-        for timer in self.timers.values():
-            self.reset_single_timer(timer)
+        if not self.has_bulk_ops:
+            for timer in self.timers.values():
+                self.reset_single_timer(timer)
+            return
+        self.engine.reset_all()
+        self.refresh_bound_rows()
+
+    def refresh_bound_rows(self):
+        """Bring every row that has widgets up to date with its timer"""
+        for display in list(self.timer_displays.values()):
+            timer = display['timer']
+            self.update_timer_display(timer)
+            self.update_timer_controls(timer)
 
     def clear_completed_timers(self):
         """Clear all completed timers"""
-        completed_timers = [t for t in self.timers.values() if t.is_completed]
+        timers = self.timers
+        completed_timers = [timers[i] for i in self.index.by_state(STATE_COMPLETED) if i in timers]
 
         if not completed_timers:
             messagebox.showinfo("提示", "没有已完成的计时器")
             return
 
-        if messagebox.askyesno("确认", f"确定要清除 {len(completed_timers)} 个已完成的计时器吗？"):
-            for timer in completed_timers:
-                self.delete_timer(timer)
-
-    def run_timer(self, timer):
-        """Run a timer in a separate thread"""
-        while timer.is_running and timer.remaining_seconds > 0:
-            if not timer.is_paused:
-                # Update display
-                self.root.after(0, self.update_timer_display, timer)
+        if not messagebox.askyesno("确认", f"确定要清除 {len(completed_timers)} 个已完成的计时器吗？"):
+            return
 
-                # Decrement time
-                timer.remaining_seconds -= 1
-                time.sleep(1)
+        # Confirmed once for all of them; remove the rows in one pass
+        if not self.shared:
+            if self.virtual_list:
+                self.timer_list.remove_many(completed_timers)
             else:
-                time.sleep(0.1)
+                for timer in completed_timers:
+                    # Rows still waiting in pending_rows are skipped when built
+                    self.release_timer_display(timer.id)
+        for timer in completed_timers:
+            self.engine.delete(timer.id)
+
+    def import_timers_from_file(self):
+        """Bulk-import timers from a CSV or JSON Lines file"""
+        path = filedialog.askopenfilename(title="导入计时器", filetypes=TIMER_FILE_TYPES)
+        if not path:
+            return
+
+        try:
+            timers = timer_io.import_timers(self.engine, path, allow_commands=self.allow_command_hooks)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"导入失败：{e}")
+            return
+
+        # The whole import is shown with one rebuild instead of one per timer
+        if not self.shared:
+            self.show_timers(timers)
+        messagebox.showinfo("提示", f"已导入 {len(timers)} 个计时器")
+
+    def export_timers_to_file(self):
+        """Export all timers to a CSV or JSON Lines file"""
+        path = filedialog.asksaveasfilename(
+            title="导出计时器",
+            filetypes=TIMER_FILE_TYPES,
+            defaultextension='.csv'
+        )
+        if not path:
+            return
 
-        # Timer completed
-        if timer.remaining_seconds <= 0:
-            self.root.after(0, self.timer_completed, timer)
+        try:
+            count = timer_io.export_timers(list(self.timers.values()), path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"导出失败：{e}")
+            return
+        messagebox.showinfo("提示", f"已导出 {count} 个计时器")
 
     def update_timer_display(self, timer):
-        """Update the display for a specific timer"""
+        """Update the display for a specific timer
+
+        Reads the timer's live columns one by one, not through
+        engine.snapshot(): a read that overlaps a write of the scheduler
+        thread may mix old and new values, but every such write is followed
+        by an event for that timer or its group, which redraws the row
+        within a frame. Waiting out the write would stall the mainloop for
+        the length of a whole tick batch.
+        """
         if timer.id not in self.timer_displays:
             return
 
+        started = time.perf_counter()
         display = self.timer_displays[timer.id]
+        if not (self.window_visible and display['visible']):
+            # Caught up by set_window_visible() or update_row_visibility()
+            return
+        remaining = timer.remaining_seconds
+
+        if timer.mode == MODE_PRECISE:
+            remaining_ms = timer.remaining_ms
+            seconds, milliseconds = divmod(remaining_ms, 1000)
+            hours, seconds = divmod(seconds, 3600)
+            minutes, seconds = divmod(seconds, 60)
+            time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+            if (remaining_ms <= FAST_REDRAW_SECONDS * 1000 and timer not in self.fast_timers
+                    and timer.state == STATE_RUNNING and not timer.frozen):
+                self.start_fast_redraw(timer)
+        else:
+            hours = remaining // 3600
+            minutes = (remaining % 3600) // 60
+            seconds = remaining % 60
+            time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
 
-        hours = timer.remaining_seconds // 3600
-        minutes = (timer.remaining_seconds % 3600) // 60
-        seconds = timer.remaining_seconds % 60
-
-        time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-        display['time_label'].config(text=time_str)
+        # Change color when less than 10 seconds
+        if remaining <= 10 and remaining > 0:
+            fg = '#e74c3c'
+        elif timer.is_paused or timer.frozen:
+            fg = '#f39c12'
+        elif timer.is_running:
+            fg = '#3498db'
+        else:
+            fg = '#27ae60'
+        self.configure_time_label(display, text=time_str, fg=fg)
 
         # Update progress bar
         if timer.total_seconds > 0:
-            progress = ((timer.total_seconds - timer.remaining_seconds) / timer.total_seconds) * 100
-            display['progress_var'].set(progress)
+            progress = ((timer.total_seconds - remaining) / timer.total_seconds) * 100
+            if progress != display['shown_progress']:
+                display['progress_var'].set(progress)
+                display['shown_progress'] = progress
+
+        self.display_time.observe(time.perf_counter() - started)
+
+    def configure_time_label(self, display, text=None, fg=None):
+        """Reconfigure the time label only for values that actually changed"""
+        changes = {}
+        if text is not None and text != display['shown_text']:
+            changes['text'] = display['shown_text'] = text
+        if fg is not None and fg != display['shown_fg']:
+            changes['fg'] = display['shown_fg'] = fg
+        if changes:
+            display['time_label'].config(**changes)
+
+    def start_fast_redraw(self, timer):
+        """Repaint a shown precise timer every frame until it stops or loses its row"""
+        self.fast_timers.add(timer)
+        if not self.fast_pending:
+            self.fast_pending = True
+            self.root.after(FRAME_INTERVAL_MS, self.redraw_fast_timers)
+
+    def redraw_fast_timers(self):
+        """One frame of the fast redraw loop; ends when no timer needs it"""
+        displays = self.timer_displays
+        for timer in list(self.fast_timers):
+            display = displays.get(timer.id)
+            if (display is None or display['timer'] is not timer or not display['visible']
+                    or not self.window_visible or timer.state != STATE_RUNNING or timer.frozen):
+                self.fast_timers.discard(timer)
+            else:
+                self.update_timer_display(timer)
 
-        # Change color when less than 10 seconds
-        if timer.remaining_seconds <= 10 and timer.remaining_seconds > 0:
-            display['time_label'].config(fg='#e74c3c')
-        elif timer.is_paused:
-            display['time_label'].config(fg='#f39c12')
-        elif timer.is_running:
-            display['time_label'].config(fg='#3498db')
+        if self.fast_timers:
+            self.root.after(FRAME_INTERVAL_MS, self.redraw_fast_timers)
+        else:
+            self.fast_pending = False
+
+    def mark_dirty(self, timer, controls=False):
+        """Queue a display refresh for a timer; Tk thread only
+
+        controls also refreshes the row buttons, for state changes made
+        elsewhere (another client of a shared engine).
+        """
+        self.dirty_timers.add(timer)
+        if controls:
+            self.dirty_controls.add(timer)
+        self.schedule_frame()
+
+    def mark_group_dirty(self, group, controls):
+        """Queue a refresh of a group's rows; Tk thread only
+
+        Group operations and group ticks arrive as one event per group, so
+        only the members that currently have a row are touched, once per
+        frame. controls also refreshes their buttons.
+        """
+        self.dirty_groups[group] = self.dirty_groups.get(group, False) or controls
+        self.schedule_frame()
+
+    def schedule_frame(self):
+        if self.frame_pending:
+            self.coalesced_updates += 1
+            return
+        self.frame_pending = True
+        self.root.after(FRAME_INTERVAL_MS, self.flush_display_updates)
+
+    def flush_display_updates(self):
+        """Apply every queued display refresh in a single mainloop callback"""
+        dirty = self.dirty_timers
+        self.dirty_timers = set()
+        dirty_controls = self.dirty_controls
+        self.dirty_controls = set()
+        dirty_groups = self.dirty_groups
+        self.dirty_groups = {}
+        self.frame_pending = False
+
+        for timer in dirty:
+            self.update_timer_display(timer)
+        for timer in dirty_controls:
+            self.update_timer_controls(timer)
+
+        if dirty_groups:
+            for display in list(self.timer_displays.values()):
+                timer = display['timer']
+                controls = dirty_groups.get(timer.group)
+                if controls is not None:
+                    self.update_timer_display(timer)
+                    if controls:
+                        self.update_timer_controls(timer)
+
+        self.refresh_stats_label.config(text=f"合并刷新：{self.coalesced_updates}")
+
+    def on_engine_event(self, event, timer):
+        """Engine listener; events from any other thread wait for drain_engine_events()
+
+        Ticks and completions come from the engine's scheduler or loop
+        thread, which may be the thread this one is waiting on for a
+        command, so they are only queued there.
+        """
+        if threading.get_ident() != self.tk_thread:
+            self.engine_events.put((event, timer))
         else:
-            display['time_label'].config(fg='#27ae60')
+            self.handle_engine_event(event, timer)
+
+    def drain_engine_events(self):
+        """Poll loop on the Tk thread: handle the events queued by other threads"""
+        events = self.engine_events
+        handled = 0
+        try:
+            while True:
+                self.handle_engine_event(*events.get_nowait())
+                handled += 1
+        except queue.Empty:
+            pass
+        self.root.after(FRAME_INTERVAL_MS if handled else ENGINE_POLL_IDLE_MS, self.drain_engine_events)
+
+    def handle_engine_event(self, event, timer):
+        if event == 'tick':
+            # Rows out of view catch up when they come back
+            display = self.timer_displays.get(timer.id)
+            if display is not None and display['visible'] and self.window_visible:
+                self.mark_dirty(timer)
+        elif event == 'completed':
+            self.queue_completion(timer)
+        elif event.startswith('group_'):
+            # timer is the TimerGroup here
+            self.mark_group_dirty(timer, controls=event != 'group_tick')
+        elif event == 'started':
+            # Also the engine starting a timer whose predecessors completed
+            self.mark_dirty(timer, controls=True)
+        elif event == 'linked':
+            self.update_timer_details(timer)
+            self.mark_dirty(timer, controls=True)
+        elif self.shared:
+            if event in ('added', 'deleted'):
+                self.queue_structure_change(event, timer)
+            elif event in ('paused', 'resumed', 'reset'):
+                self.mark_dirty(timer, controls=True)
+
+    def queue_structure_change(self, event, timer):
+        """Queue a row to add or remove for a shared engine; Tk thread only"""
+        self.structure_changes.append((event, timer))
+        if not self.structure_pending:
+            self.structure_pending = True
+            self.root.after(0, self.apply_structure_changes)
+
+    def apply_structure_changes(self):
+        """Add and remove the rows of every queued change in one pass"""
+        changes = self.structure_changes
+        self.structure_changes = []
+        self.structure_pending = False
+
+        # Net effect per timer; one added and deleted in between needs no row
+        net = {}
+        for event, timer in changes:
+            if event == 'deleted' and timer.id in net and net[timer.id][0] == 'added':
+                del net[timer.id]
+            else:
+                net[timer.id] = (event, timer)
+
+        added = [timer for event, timer in net.values() if event == 'added']
+        deleted = [timer for event, timer in net.values() if event == 'deleted']
+        if deleted:
+            if self.virtual_list:
+                self.timer_list.remove_many(deleted)
+            else:
+                for timer in deleted:
+                    self.release_timer_display(timer.id)
+        if added:
+            self.show_timers(added)
+        elif deleted and self.filter_active():
+            self.apply_filter()
+
+    def queue_completion(self, timer):
+        """Queue a finished timer; Tk thread only
+
+        Completions arriving within COMPLETION_GROUP_MS are handled by one
+        mainloop callback and announced together.
+        """
+        self.completed_queue.append(timer)
+        if not self.completion_pending:
+            self.completion_pending = True
+            self.root.after(COMPLETION_GROUP_MS, self.process_completions)
+
+    def process_completions(self):
+        """Update every queued completion and show them in one notification"""
+        completed = self.completed_queue
+        self.completed_queue = []
+        self.completion_pending = False
+
+        finished = [timer for timer in completed if timer.id in self.timers]
+        for timer in finished:
+            self.timer_completed(timer)
+        self.completion_panel.add(finished)
+
+        if self.flashing and not self.flash_pending:
+            self.flash_pending = True
+            self.root.after(0, self.flash_step)
 
     def timer_completed(self, timer):
         """Handle timer completion"""
-        timer.is_running = False
-        timer.is_completed = True
-        self.active_timers.discard(timer.id)
-
         # Update display
         self.update_timer_display(timer)
 
         # Update button states
-        display = self.timer_displays[timer.id]
-        display['start_btn'].config(state=tk.NORMAL, text="重新开始")
-        display['pause_btn'].config(state=tk.DISABLED, text="暂停", bg='#f39c12')
-        display['delete_btn'].config(state=tk.NORMAL)
-
-        # Show completion message with name
-        self.root.after(0, lambda: messagebox.showinfo("时间到！", f"任务 '{timer.name}' 已完成！"))
-
-        # Flash the display
-        for _ in range(3):
-            if timer.id in self.timer_displays:
-                self.timer_displays[timer.id]['time_label'].config(fg='#ffffff')
-                self.root.update()
-                time.sleep(0.2)
-                self.timer_displays[timer.id]['time_label'].config(fg='#e74c3c')
-                self.root.update()
-                time.sleep(0.2)
+        self.update_timer_controls(timer)
+
+        # Flash the display; flash_step animates all flashing timers together
+        self.flashing[timer] = FLASH_STEPS
+
+    def flash_step(self):
+        """Advance the flash animation of every completed timer by one step"""
+        for timer, steps in list(self.flashing.items()):
+            display = self.timer_displays.get(timer.id)
+            if steps <= 0 or not timer.is_completed:
+                del self.flashing[timer]
+                continue
+            if display is not None:
+                self.configure_time_label(display, fg='#ffffff' if steps % 2 == 0 else '#e74c3c')
+            self.flashing[timer] = steps - 1
+
+        if self.flashing:
+            self.root.after(FLASH_INTERVAL_MS, self.flash_step)
+        else:
+            self.flash_pending = False
+
+    def count_pending_callbacks(self):
+        """Number of Tk after callbacks queued, including this sampler's own"""
+        try:
+            return len(self.root.tk.splitlist(self.root.tk.call('after', 'info')))
+        except (AttributeError, tk.TclError):
+            return 0
+
+    def sample_metrics(self):
+        """Periodic metrics sample; also measures how late the mainloop runs callbacks"""
+        now = time.monotonic()
+        self.mainloop_latency.observe(max(0.0, now - self.metrics_due))
+        self.pending_callbacks = self.count_pending_callbacks()
+
+        if self.metrics_file:
+            try:
+                write_metrics_file(self.metrics, self.metrics_file)
+            except OSError:
+                # A full disk or a vanished directory must not stop the sampler
+                pass
+        if self.stats_panel.visible:
+            self.stats_panel.update(self.stats_text())
+
+        self.metrics_due = now + METRICS_INTERVAL_MS / 1000
+        self.root.after(METRICS_INTERVAL_MS, self.sample_metrics)
+
+    def stats_text(self):
+        """Human-readable summary of the metrics for the stats panel"""
+        counts = self.index.counts()
+        lines = [
+            f"线程数：{threading.active_count()}",
+            "计时器：" + " · ".join(
+                f"{label} {counts[state]}" for label, state in FILTER_STATES.items() if state is not None
+            ),
+            f"待执行 after 回调：{self.pending_callbacks}",
+        ]
+        lateness = getattr(self.engine, 'lateness', None)
+        if lateness is not None:
+            lines.append(
+                f"触发延迟：p50 {lateness.quantile(0.5) * 1000:.1f} ms · "
+                f"p99 {lateness.quantile(0.99) * 1000:.1f} ms · "
+                f"最大 {lateness.max * 1000:.1f} ms（{lateness.count} 次）"
+            )
+        display_time = self.display_time
+        lines.append(
+            f"行刷新耗时：平均 {display_time.mean() * 1e6:.0f} µs · "
+            f"p99 {display_time.quantile(0.99) * 1e6:.0f} µs（{display_time.count} 次）"
+        )
+        mainloop = self.mainloop_latency
+        lines.append(
+            f"主循环延迟：p99 {mainloop.quantile(0.99) * 1000:.1f} ms · 最大 {mainloop.max * 1000:.1f} ms"
+        )
+        lines.append(f"合并刷新：{self.coalesced_updates}")
+        if self.hook_runner is not None:
+            lines.append(f"完成动作：{self.hook_runner.pending} 个排队或执行中")
+            for name, succeeded, failed, timed_out, rejected, duration in self.hook_runner.stats():
+                line = f"  {name}：成功 {succeeded} · 失败 {failed} · 超时 {timed_out} · 拒绝 {rejected}"
+                if duration is not None:
+                    line += f" · p99 {duration.quantile(0.99) * 1000:.0f} ms"
+                lines.append(line)
+                error = self.hook_runner.last_errors.get(name)
+                if error:
+                    lines.append(f"    最近错误：{error}")
+        return "\n".join(lines)
+
+    def show_stats(self):
+        self.pending_callbacks = self.count_pending_callbacks()
+        self.stats_panel.show(self.stats_text())
 
 def main():
+    parser = argparse.ArgumentParser(description="多任务倒计时工具")
+    parser.add_argument(
+        '--virtual-list',
+        action='store_true',
+        help="only build widgets for visible rows (for thousands of timers)"
+    )
+    parser.add_argument(
+        '--asyncio',
+        action='store_true',
+        help="run the timers on the asyncio backend instead of the scheduler thread"
+    )
+    parser.add_argument(
+        '--timing-wheel',
+        action='store_true',
+        help="keep scheduled timers in a hierarchical timing wheel instead of a heap"
+    )
+    parser.add_argument(
+        '--data-dir',
+        default=os.path.join(os.path.expanduser('~'), '.countdown_timer'),
+        help="directory for the timer journal and snapshots"
+    )
+    parser.add_argument(
+        '--no-journal',
+        action='store_true',
+        help="keep timers in memory only"
+    )
+    parser.add_argument(
+        '--connect',
+        action='store_true',
+        help="attach to a running timer daemon instead of running the timers in this window"
+    )
+    parser.add_argument(
+        '--socket',
+        help=f"daemon socket for --connect (default: DATA_DIR/{SOCKET_FILE})"
+    )
+    parser.add_argument(
+        '--metrics-file',
+        metavar='PATH',
+        help="rewrite runtime metrics in the Prometheus text format to PATH every second"
+    )
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        metavar='PORT',
+        help="serve runtime metrics on http://127.0.0.1:PORT/metrics"
+    )
+    parser.add_argument(
+        '--hook-workers',
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="completion hooks run at most this many at a time"
+    )
+    parser.add_argument(
+        '--hook-timeout',
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="seconds before a completion hook is killed"
+    )
+    parser.add_argument(
+        '--import',
+        dest='import_path',
+        metavar='PATH',
+        help="bulk-import timers from a CSV or JSON Lines file at startup"
+    )
+    parser.add_argument(
+        '--allow-command-hooks',
+        action='store_true',
+        help="accept cmd: hooks from imported files, which run shell commands as this user"
+    )
+    args = parser.parse_args()
+
+    if args.connect:
+        # The daemon owns the timers and their journal
+        engine = RemoteEngine(args.socket or os.path.join(args.data_dir, SOCKET_FILE))
+    elif args.asyncio:
+        engine = AsyncEngineBridge()
+    elif args.timing_wheel:
+        engine = TimerEngine(timer_queue=TimingWheel())
+    else:
+        engine = TimerEngine()
+
+    # A daemon runs the hooks of its own timers; here they are subscribed before
+    # recovery so timers that ran out while the window was closed run theirs
+    hook_runner = None
+    if not args.connect:
+        hook_runner = HookRunner(engine, workers=args.hook_workers, timeout=args.hook_timeout)
+
+    # The window comes up first; the previous session's timers load in idle callbacks
     root = tk.Tk()
-    app = CountdownTimer(root)
+    app = CountdownTimer(
+        root,
+        virtual_list=args.virtual_list,
+        engine=engine,
+        metrics_file=args.metrics_file,
+        hook_runner=hook_runner,
+        allow_command_hooks=args.allow_command_hooks
+    )
+
+    journal = None
+    batches = []
+    if args.connect:
+        batches = [list(engine.timers.values())]
+    elif not args.no_journal:
+        journal = TimerJournal(args.data_dir)
+        # Reads the persisted state now; changes made while loading are journaled
+        batches = journal.recover_batches(engine)
+        journal.attach(engine)
+
+    def startup_batches():
+        yield from batches
+        if args.import_path:
+            try:
+                yield timer_io.import_timers(engine, args.import_path, allow_commands=args.allow_command_hooks)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("错误", f"导入失败：{e}")
+
+    app.load_timers_incrementally(startup_batches())
+    metrics_server = MetricsServer(app.metrics, args.metrics_port) if args.metrics_port else None
     root.mainloop()
 
+    if metrics_server is not None:
+        metrics_server.close()
+    if hook_runner is not None:
+        hook_runner.close()
+    if journal is not None:
+        journal.close()
+    if args.connect:
+        engine.close()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
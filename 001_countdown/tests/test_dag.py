@@ -0,0 +1,107 @@
+"""Dependency pipelines, driven by a VirtualClock"""
+import asyncio
+
+import pytest
+
+from timer_clock import VirtualClock
+from timer_dag import DependencyGraph
+from timer_engine import STATE_IDLE, STATE_RUNNING, TimerEngine, TimerStore, TimerTask
+
+@pytest.fixture
+def diamond():
+    """A (5 s) before B (3 s) and C (2 s), both before D (1 s)"""
+    clock = VirtualClock()
+    store = TimerStore(clock)
+    engine = TimerEngine(tick_events=False, clock=clock)
+    a = TimerTask('A', 0, 0, 5, task_id='a', store=store)
+    b = TimerTask('B', 0, 0, 3, task_id='b', store=store)
+    c = TimerTask('C', 0, 0, 2, task_id='c', store=store)
+    d = TimerTask('D', 0, 0, 1, task_id='d', store=store)
+    b.after = ['a']
+    c.after = ['a']
+    d.after = ['b', 'c']
+    engine.add_many([a, b, c, d])
+    events = []
+    engine.subscribe(lambda event, timer: events.append((clock.now, event, timer.id)))
+    yield clock, engine, events
+    engine.close()
+
+def test_diamond_runs_in_dependency_order(diamond):
+    clock, engine, events = diamond
+    engine.start_all()
+    # Only the timer without predecessors starts
+    assert [engine.timers[i].state for i in 'abcd'] == [STATE_RUNNING, STATE_IDLE, STATE_IDLE, STATE_IDLE]
+
+    clock.advance(20)
+    completed = [(moment, timer_id) for moment, event, timer_id in events if event == 'completed']
+    assert completed == [(5, 'a'), (7, 'c'), (8, 'b'), (9, 'd')]
+    started = [(moment, timer_id) for moment, event, timer_id in events if event == 'started']
+    assert started == [(0, 'a'), (5, 'b'), (5, 'c'), (8, 'd')]
+
+def test_restarting_a_predecessor_rearms_its_successors(diamond):
+    clock, engine, events = diamond
+    engine.start_all()
+    clock.advance(20)
+    del events[:]
+
+    # B waits for A again; C and D keep what they had
+    engine.start('a')
+    assert not engine.dependencies.ready('b')
+    clock.advance(20)
+    completed = [(moment, timer_id) for moment, event, timer_id in events if event == 'completed']
+    assert completed == [(25, 'a'), (27, 'c'), (28, 'b'), (29, 'd')]
+
+def test_cycles_are_rejected(diamond):
+    clock, engine, events = diamond
+    with pytest.raises(ValueError):
+        engine.set_dependencies('a', ['d'])
+    assert engine.timers['a'].after == ()
+
+def test_deleting_a_predecessor_releases_without_starting(diamond):
+    clock, engine, events = diamond
+    engine.delete('a')
+    assert engine.dependencies.ready('b') and engine.dependencies.ready('c')
+    assert not engine.dependencies.ready('d')
+    clock.advance(10)
+    assert engine.timers['b'].state == STATE_IDLE
+
+def test_graph_counts_only_uncompleted_predecessors():
+    graph = DependencyGraph()
+    graph.link('d', ('b', 'c'), lambda timer_id: timer_id == 'c')
+    assert graph.waiting['d'] == 1
+    assert graph.completed('b') == ['d']
+    graph.rearm('b')
+    assert not graph.ready('d')
+
+def test_group_start_leaves_waiting_members_to_the_engine():
+    clock = VirtualClock()
+    store = TimerStore(clock)
+    engine = TimerEngine(tick_events=False, clock=clock)
+    completed = []
+    engine.subscribe(lambda event, timer: event == 'completed' and completed.append((clock.now, timer.id)))
+    try:
+        first = TimerTask('first', 0, 0, 5, task_id='first', store=store)
+        second = TimerTask('second', 0, 0, 5, task_id='second', store=store)
+        second.after = ['first']
+        other = TimerTask('other', 0, 0, 7, task_id='other', store=store)
+        engine.add_many([first, second, other], group='g')
+        engine.start_all()
+        assert [timer.state for timer in (first, second, other)] == [STATE_RUNNING, STATE_IDLE, STATE_RUNNING]
+        clock.advance(20)
+        assert completed == [(5, 'first'), (7, 'other'), (10, 'second')]
+    finally:
+        engine.close()
+
+def test_asyncio_engine_refuses_dependencies():
+    from timer_async import AsyncTimerEngine
+    engine = AsyncTimerEngine()
+    timer = TimerTask('B', 0, 0, 3)
+    timer.after = ['a']
+    with pytest.raises(ValueError):
+        asyncio.run(engine.add(timer))
+    with pytest.raises(ValueError):
+        asyncio.run(engine.add_many([timer]))
+    assert engine.timers == {}
+    with pytest.warns(RuntimeWarning):
+        asyncio.run(engine.restore([timer]))
+    assert timer.after == ()
@@ -0,0 +1,157 @@
+"""Scheduling on a VirtualClock: timer queues and groups"""
+import asyncio
+import threading
+
+import pytest
+
+from timer_clock import VirtualClock
+from timer_engine import (
+    MODE_PRECISE, STATE_COMPLETED, STATE_PAUSED, STATE_RUNNING, TimerEngine, TimerStore, TimerTask
+)
+from timer_index import TimerIndex
+from timer_schedule import Interval
+from timer_wheel import TimingWheel
+
+DAY = 86400
+
+@pytest.fixture
+def clock():
+    return VirtualClock()
+
+def simulate(clock, timer_queue, count=300):
+    """(completion time, timer name) of a day of spread-out timers, some recurring"""
+    store = TimerStore(clock)
+    engine = TimerEngine(timer_queue=timer_queue, tick_events=False, clock=clock)
+    timers = []
+    for i in range(count):
+        # Distinct durations within an hour, 7919 being prime to 3600; every
+        # third timer precise, a fraction of a second off the whole seconds
+        if i % 3:
+            timer = TimerTask(f"t{i}", 0, 0, 1 + (i * 7919) % 3600, store=store)
+        else:
+            timer = TimerTask(f"t{i}", 0, 0, 1.125 + (i * 7919) % 3600, mode=MODE_PRECISE, store=store)
+        if i % 10 == 0:
+            timer.recurrence = Interval(3600 + i)
+        timers.append(timer)
+    completed = []
+    engine.subscribe(lambda event, timer: event == 'completed' and completed.append((clock.now, timer.name)))
+    try:
+        engine.add_many(timers)
+        engine.start_all()
+        clock.advance(DAY)
+    finally:
+        engine.close()
+    return completed
+
+def test_heap_and_wheel_fire_the_same_schedule():
+    heap_clock = VirtualClock()
+    wheel_clock = VirtualClock()
+    heap = simulate(heap_clock, None)
+    wheel = simulate(wheel_clock, TimingWheel(origin=wheel_clock.monotonic()))
+    assert heap == wheel
+    times = [moment for moment, _ in heap]
+    assert times == sorted(times)
+    # Every one-shot timer once, plus the later cycles of the recurring ones
+    assert len(heap) > 300
+
+def test_deadlines_are_met_exactly(clock):
+    store = TimerStore(clock)
+    engine = TimerEngine(tick_events=False, clock=clock)
+    try:
+        timer = engine.add(TimerTask('tea', 0, 3, 0, store=store))
+        engine.start(timer.id)
+        clock.advance(179.5)
+        assert timer.state == STATE_RUNNING
+        assert timer.remaining_time() == pytest.approx(0.5)
+        clock.advance(0.5)
+        assert timer.state == STATE_COMPLETED
+    finally:
+        engine.close()
+
+def test_group_pause_holds_every_member(clock):
+    store = TimerStore(clock)
+    engine = TimerEngine(tick_events=False, clock=clock)
+    completed = {}
+    engine.subscribe(lambda event, timer: event == 'completed' and completed.setdefault(timer.name, clock.now))
+    try:
+        timers = engine.add_many([TimerTask(f"m{i}", 0, 0, 10 * (i + 1), store=store) for i in range(3)], group='g')
+        engine.start_group('g')
+        clock.advance(5)
+        engine.pause_group('g')
+        clock.advance(100)
+        assert [engine.snapshot(timer.id).state for timer in timers] == [STATE_PAUSED] * 3
+        assert [timer.remaining_seconds for timer in timers] == [5, 15, 25]
+        assert completed == {}
+
+        engine.resume_group('g')
+        assert [timer.state for timer in timers] == [STATE_RUNNING] * 3
+        clock.advance(30)
+        # The 100 paused seconds are added to every deadline
+        assert completed == {'m0': 110, 'm1': 120, 'm2': 130}
+    finally:
+        engine.close()
+
+def test_group_reset_stops_members(clock):
+    store = TimerStore(clock)
+    engine = TimerEngine(tick_events=False, clock=clock)
+    try:
+        timers = engine.add_many([TimerTask(f"m{i}", 0, 0, 60, store=store) for i in range(2)], group='g')
+        engine.start_group('g')
+        clock.advance(20)
+        engine.reset_group('g')
+        clock.advance(100)
+        assert [timer.remaining_seconds for timer in timers] == [60, 60]
+        assert not any(timer.is_running or timer.is_completed for timer in timers)
+    finally:
+        engine.close()
+
+def test_index_reads_groups_while_members_move(clock):
+    store = TimerStore(clock)
+    engine = TimerEngine(tick_events=False, clock=clock)
+    index = TimerIndex(engine)
+    try:
+        ids = [timer.id for timer in engine.add_many([TimerTask(f"m{i}", 0, 0, 60, store=store) for i in range(2000)], group='g')]
+        moved = ids[1000:]
+
+        def churn():
+            for i in range(40):
+                engine.set_group(moved, None if i % 2 == 0 else 'g')
+
+        thread = threading.Thread(target=churn)
+        thread.start()
+        while thread.is_alive():
+            # Each group event leaves the group to be reclassified by the next lookup
+            engine.start_group('g')
+            index.counts()
+            index.by_group('g')
+            engine.reset_group('g')
+        thread.join()
+
+        engine.start_group('g')
+        assert index.counts()[STATE_RUNNING] == 2000
+        assert index.by_group('g') == set(ids)
+    finally:
+        engine.close()
+
+def test_asyncio_engine_runs_on_a_virtual_clock(clock):
+    from timer_async import AsyncTimerEngine
+
+    store = TimerStore(clock)
+    engine = AsyncTimerEngine(clock=clock)
+    completed = []
+    engine.subscribe(lambda event, timer: event == 'completed' and completed.append((clock.now, timer.name)))
+
+    async def run():
+        laps = TimerTask('laps', 0, 0, 40, store=store)
+        laps.recurrence = Interval(40)
+        await engine.add_many([TimerTask('tea', 0, 3, 0, store=store), laps])
+        await engine.start(laps.id)
+        for timer_id in list(engine.timers):
+            await engine.start(timer_id)
+        clock.advance(200)
+        with pytest.raises(ValueError):
+            # Counts on the real clock
+            await engine.add(TimerTask('real', 0, 0, 5))
+
+    asyncio.run(run())
+    assert completed == [(40, 'laps'), (80, 'laps'), (120, 'laps'), (160, 'laps'), (180, 'tea'), (200, 'laps')]
@@ -0,0 +1,201 @@
+"""Journal recovery and timer file round trips"""
+import json
+import os
+
+import pytest
+
+import timer_io
+from timer_clock import VirtualClock
+from timer_engine import (
+    MODE_PRECISE, STATE_COMPLETED, STATE_IDLE, STATE_PAUSED, STATE_RUNNING, TimerEngine, TimerStore, TimerTask
+)
+from timer_hooks import FileHook, hook_specs
+from timer_journal import SNAPSHOT_COLUMNS, SNAPSHOT_FILE, SNAPSHOT_VERSION, TimerJournal
+from timer_schedule import CronSchedule, Interval
+
+def build(store, log_path):
+    """Timers covering every persisted column, not yet added"""
+    done = TimerTask('done', 0, 0, 5, task_id='done', store=store)
+    held = TimerTask('held', 0, 1, 0, task_id='held', store=store)
+    held.on_complete(FileHook(log_path))
+    daily = TimerTask('daily', 0, 0, 60, task_id='daily', store=store)
+    daily.recurrence = CronSchedule('30 9 * * 1-5')
+    laps = TimerTask('laps', 0, 0, 2.5, task_id='laps', mode=MODE_PRECISE, store=store)
+    laps.recurrence = Interval(2.5)
+    after = TimerTask('after', 0, 0, 30, task_id='after', store=store)
+    after.after = ['done', 'held']
+    return [done, held, daily, laps, after]
+
+def state_of(engine):
+    """Everything persisted about the engine's timers, by id"""
+    return {
+        timer.id: (
+            engine.snapshot(timer.id),
+            timer.mode,
+            timer.recurrence.spec if timer.recurrence is not None else None,
+            hook_specs(timer),
+            timer.after,
+        )
+        for timer in engine.timers.values()
+    }
+
+@pytest.fixture
+def recorded(tmp_path):
+    """A journal directory holding a session, its final state and its final wall time"""
+    # Whole seconds: the journal keeps wall times to the millisecond
+    clock = VirtualClock(wall=1800000000)
+    store = TimerStore(clock)
+    engine = TimerEngine(tick_events=False, clock=clock)
+    journal = TimerJournal(str(tmp_path / 'data'), fsync_interval=0, clock=clock)
+    journal.attach(engine)
+    try:
+        engine.add_many(build(store, str(tmp_path / 'hooks.log')))
+        engine.add(TimerTask('runs', 0, 5, 0, task_id='runs', store=store))
+        engine.add_many([TimerTask(f"m{i}", 0, 0, 40, task_id=f"m{i}", store=store) for i in range(2)], group='grp')
+        engine.start('done')
+        engine.start('held')
+        engine.start('runs')
+        clock.advance(10)
+        engine.pause('held')
+        engine.start_group('grp')
+        clock.advance(10)
+        engine.pause_group('grp')
+        expected = state_of(engine)
+        wall = clock.time()
+    finally:
+        engine.close()
+        journal.close()
+    return str(tmp_path / 'data'), expected, wall
+
+def recover(directory, wall):
+    """An engine holding the recovered timers, on a clock at wall time wall"""
+    clock = VirtualClock(wall=wall)
+    engine = TimerEngine(tick_events=False, clock=clock)
+    journal = TimerJournal(directory, fsync_interval=0, clock=clock)
+    journal.recover(engine)
+    # Attaching folds the replayed journal into a snapshot
+    journal.attach(engine)
+    journal.close()
+    return engine
+
+def test_journal_recovers_every_column(recorded):
+    directory, expected, wall = recorded
+    states = {timer_id: (entry[0].state, entry[0].remaining_seconds) for timer_id, entry in expected.items()}
+    assert states['done'] == (STATE_COMPLETED, 0)
+    assert states['held'] == (STATE_PAUSED, 50)
+    assert states['runs'] == (STATE_RUNNING, 280)
+    assert states['m0'] == (STATE_PAUSED, 30)
+
+    engine = recover(directory, wall)
+    try:
+        assert state_of(engine) == expected
+        # The completed predecessor still counts; the paused one does not
+        assert engine.dependencies.waiting['after'] == 1
+        assert engine.groups['grp'].frozen
+    finally:
+        engine.close()
+
+def test_recovery_takes_off_the_time_spent_down(recorded):
+    directory, expected, wall = recorded
+    engine = recover(directory, wall + 100)
+    try:
+        # Running timers lost the downtime; paused ones, alone or in a group, did not
+        assert engine.snapshot('runs').remaining_seconds == 180
+        assert engine.snapshot('held').remaining_seconds == 50
+        assert engine.snapshot('m0') == expected['m0'][0]
+    finally:
+        engine.close()
+
+def test_snapshot_is_current_version_and_recovers(recorded):
+    directory, expected, wall = recorded
+    recover(directory, wall).close()
+
+    with open(os.path.join(directory, SNAPSHOT_FILE), encoding='utf-8') as f:
+        snapshot = json.load(f)
+    assert snapshot['version'] == SNAPSHOT_VERSION == 5
+    assert set(SNAPSHOT_COLUMNS) <= set(snapshot)
+    assert snapshot['after'][snapshot['id'].index('after')] == ['done', 'held']
+    assert snapshot['paused_groups'].keys() == {'grp'}
+
+    # From the snapshot alone, the journal having been truncated
+    engine = recover(directory, wall)
+    try:
+        assert state_of(engine) == expected
+    finally:
+        engine.close()
+
+def test_recovered_group_start_keeps_waiting_members_idle(tmp_path):
+    directory = str(tmp_path / 'data')
+    clock = VirtualClock(wall=1800000000)
+    store = TimerStore(clock)
+    engine = TimerEngine(tick_events=False, clock=clock)
+    journal = TimerJournal(directory, fsync_interval=0, clock=clock)
+    journal.attach(engine)
+    try:
+        a = TimerTask('A', 0, 0, 50, task_id='a', store=store)
+        b = TimerTask('B', 0, 0, 30, task_id='b', store=store)
+        b.after = ['a']
+        engine.add_many([a, b], group='g')
+        engine.start_group('g')
+        clock.advance(10)
+        wall = clock.time()
+    finally:
+        engine.close()
+        journal.close()
+
+    engine = recover(directory, wall)
+    events = []
+    engine.subscribe(lambda event, timer: events.append((event, timer.id)))
+    try:
+        assert engine.snapshot('a').state == STATE_RUNNING
+        assert engine.snapshot('b').state == STATE_IDLE
+        assert engine.dependencies.waiting['b'] == 1
+        # B starts when A completes, not on its own
+        engine.clock.advance(40)
+        assert events == [('completed', 'a'), ('started', 'b')]
+        engine.clock.advance(30)
+        assert events[-1] == ('completed', 'b')
+    finally:
+        engine.close()
+
+@pytest.mark.parametrize('name', ['timers.csv', 'timers.jsonl'])
+def test_export_import_round_trip(tmp_path, name):
+    clock = VirtualClock()
+    store = TimerStore(clock)
+    source = TimerEngine(tick_events=False, clock=clock)
+    target = TimerEngine(tick_events=False)
+    path = str(tmp_path / name)
+    try:
+        timers = source.add_many(build(store, str(tmp_path / 'hooks.log')))
+        source.set_group(['daily', 'laps'], 'work')
+        source.start('held')
+        clock.advance(12)
+        source.pause('held')
+        assert timer_io.export_timers(timers, path) == len(timers)
+
+        imported = timer_io.import_timers(target, path)
+        assert [timer.id for timer in imported] == [timer.id for timer in timers]
+        for old, new in zip(timers, imported):
+            assert (new.name, new.total_seconds, new.mode, new.after) == (old.name, old.total_seconds, old.mode, old.after)
+            assert (new.group.name if new.group else None) == (old.group.name if old.group else None)
+            assert hook_specs(new) == hook_specs(old)
+            assert (new.recurrence and new.recurrence.spec) == (old.recurrence and old.recurrence.spec)
+        # Imported timers come in stopped, keeping what was left
+        assert target.timers['held'].remaining_seconds == 48
+        assert target.dependencies.predecessors['after'] == ('done', 'held')
+    finally:
+        source.close()
+        target.close()
+
+def test_import_refuses_command_hooks_unless_allowed(tmp_path):
+    path = tmp_path / 'timers.jsonl'
+    path.write_text(json.dumps({'name': 'x', 'seconds': 5, 'hooks': ['cmd:true']}) + '\n', encoding='utf-8')
+    engine = TimerEngine(tick_events=False)
+    try:
+        with pytest.raises(ValueError, match='record 1'):
+            timer_io.import_timers(engine, str(path))
+        assert engine.timers == {}
+        [timer] = timer_io.import_timers(engine, str(path), allow_commands=True)
+        assert hook_specs(timer) == ['cmd:true']
+    finally:
+        engine.close()
@@ -0,0 +1,56 @@
+"""Recurrence rules"""
+from datetime import datetime
+
+import pytest
+
+from timer_clock import VirtualClock
+from timer_engine import TimerEngine, TimerStore, TimerTask
+from timer_schedule import CronSchedule, Interval, parse_recurrence
+
+def wall(*fields):
+    """Local wall time; the dates below are clear of daylight saving changes"""
+    return datetime(*fields).timestamp()
+
+@pytest.mark.parametrize('expression, now, expected', [
+    # Later the same day
+    ('30 9 * * *', (2026, 6, 10, 8, 0, 0), 90 * 60),
+    # Strictly after: a matching minute that has started counts as past
+    ('30 9 * * *', (2026, 6, 10, 9, 30, 0), 24 * 3600),
+    ('30 9 * * *', (2026, 6, 10, 9, 30, 20), 24 * 3600 - 20),
+    # Friday evening to Monday morning; 2026-06-12 is a Friday
+    ('0 9 * * 1-5', (2026, 6, 12, 18, 0, 0), 2 * 24 * 3600 + 15 * 3600),
+    ('*/15 * * * *', (2026, 6, 10, 10, 7, 30), 7 * 60 + 30),
+    # Either restricted day field matches: the 1st, or a Sunday (2026-06-14)
+    ('0 0 1 * 0', (2026, 6, 10, 12, 0, 0), 3 * 24 * 3600 + 12 * 3600),
+    ('@monthly', (2026, 6, 30, 23, 0, 0), 3600),
+])
+def test_cron_first_duration(expression, now, expected):
+    assert CronSchedule(expression).first_duration(wall(*now)) == pytest.approx(expected)
+
+def test_cron_rejects_bad_expressions():
+    with pytest.raises(ValueError):
+        CronSchedule('61 * * * *')
+    with pytest.raises(ValueError):
+        CronSchedule('* * *')
+
+def test_text_forms_round_trip():
+    for spec in ('every:300', 'every:2.5', 'cron:*/15 9-17 * * 1-5'):
+        assert parse_recurrence(spec).spec == spec
+    assert Interval(0.5).first_duration(0) is None
+
+def test_cron_timer_counts_down_to_the_next_match():
+    clock = VirtualClock(wall=wall(2026, 6, 10, 8, 59, 0))
+    store = TimerStore(clock)
+    engine = TimerEngine(tick_events=False, clock=clock)
+    completed = []
+    engine.subscribe(lambda event, timer: event == 'completed' and completed.append(clock.now))
+    try:
+        timer = TimerTask('standup', 0, 0, 60, store=store)
+        timer.recurrence = CronSchedule('0 9 * * *')
+        engine.add(timer)
+        engine.start(timer.id)
+        clock.advance(2 * 24 * 3600)
+        # 09:00 on the first day, then each following day
+        assert completed == [60, 60 + 24 * 3600]
+    finally:
+        engine.close()
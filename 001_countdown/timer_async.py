@@ -0,0 +1,410 @@
+"""asyncio backend for the countdown engine
+
+AsyncTimerEngine keeps every running timer in one deadline heap and arms a
+single loop.call_at handle for the earliest entry, so any number of timers
+costs one pending loop callback. AsyncEngineBridge runs it on a private
+loop thread behind the synchronous TimerEngine API for the tkinter view.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import warnings
+
+from timer_clock import default_clock
+from timer_engine import MODE_TICK
+from timer_metrics import Histogram
+
+class AsyncTimerEngine:
+    """Countdown engine whose operations are coroutines on one event loop
+
+    By default only completion deadlines are scheduled. With tick_events
+    enabled it also emits a 'tick' at every displayed-second change, which
+    is what a GUI needs but a service usually does not. There are no
+    groups or dependencies: timers with an after list are refused.
+
+    Time comes from clock, as for TimerEngine. The loop arms its call_at
+    handle on the real clock only; with a VirtualClock nothing fires until
+    the clock is advanced on the loop's thread.
+    """
+    def __init__(self, tick_events=False, clock=None):
+        self.clock = default_clock if clock is None else clock
+        self.timers = {}
+        self.active = set()
+        self.tick_events = tick_events
+        self._listeners = []
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._loop = None
+        self._handle = None
+        self._waiters = {}
+        self._streams = set()
+        # How late the loop runs deadlines; written on the loop thread only
+        self.lateness = Histogram(
+            'countdown_fire_lateness_seconds',
+            "Delay between a queued deadline and the scheduler firing it"
+        )
+        if self.clock.virtual:
+            self.clock.attach(self)
+
+    # Events
+
+    def subscribe(self, callback):
+        """Register callback(event, timer); called on the loop thread"""
+        self._listeners.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._listeners.remove(callback)
+
+    def _emit(self, event, timer):
+        for callback in self._listeners:
+            callback(event, timer)
+
+    async def wait(self, timer_id):
+        """Wait until a timer completes; returns at once if it already has"""
+        timer = self.timers[timer_id]
+        if timer.is_completed:
+            return timer
+        future = self._now_loop().create_future()
+        self._waiters.setdefault(timer_id, []).append(future)
+        return await future
+
+    async def completions(self):
+        """Async iterator over completed timers, in completion order"""
+        queue = asyncio.Queue()
+        self._streams.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._streams.discard(queue)
+
+    # Timer operations
+
+    async def add(self, timer):
+        """Register a TimerTask with the engine"""
+        if timer.id in self.timers:
+            raise ValueError(f"duplicate timer id: {timer.id}")
+        self._check_timers([timer])
+        self.timers[timer.id] = timer
+        self._emit('added', timer)
+        return timer
+
+    async def add_many(self, timers):
+        """Register a batch of new timers; rejected whole on any duplicate id"""
+        timers = list(timers)
+        ids = {timer.id for timer in timers}
+        if len(ids) != len(timers) or not ids.isdisjoint(self.timers):
+            raise ValueError("duplicate timer id in batch")
+        self._check_timers(timers)
+        for timer in timers:
+            self.timers[timer.id] = timer
+        for timer in timers:
+            self._emit('added', timer)
+        return timers
+
+    async def restore(self, timers):
+        """Register timers that already carry their state, e.g. from a journal
+
+        A journal written by a TimerEngine may hold dependencies; those
+        timers are kept, without them, and a RuntimeWarning says so.
+        """
+        timers = list(timers)
+        now = self._now()
+        self._check_clock(timers)
+        linked = [timer for timer in timers if timer.after]
+        if linked:
+            warnings.warn(
+                f"the asyncio engine has no dependencies; {len(linked)} timers will not start on their own",
+                RuntimeWarning
+            )
+            for timer in linked:
+                timer.after = ()
+        for timer in timers:
+            if timer.id in self.timers:
+                raise ValueError(f"duplicate timer id: {timer.id}")
+            self.timers[timer.id] = timer
+            if timer.is_running:
+                self.active.add(timer.id)
+                if not timer.is_paused:
+                    seq = next(self._counter)
+                    self._entries[timer.id] = seq
+                    self._heap.append((self._next_fire(timer, now), seq, timer))
+        heapq.heapify(self._heap)
+        self._arm()
+
+        for timer in timers:
+            self._emit('restored', timer)
+        return timers
+
+    async def start(self, timer_id):
+        """Start an idle or completed timer; completed ones restart from full"""
+        timer = self.timers[timer_id]
+        if timer.is_running:
+            return timer
+        if timer.is_completed:
+            timer.is_completed = False
+            timer.remaining_seconds = timer.total_seconds
+
+        rule = timer.recurrence
+        duration = rule.first_duration(self.clock.time()) if rule is not None else None
+        if duration is not None:
+            # Calendar schedules count down to their next matching time
+            timer.begin_cycle(self._now(), duration)
+        else:
+            timer.start(self._now())
+        self.active.add(timer.id)
+        self._schedule(timer)
+        self._emit('started', timer)
+        return timer
+
+    async def pause(self, timer_id):
+        """Pause a running timer; paused timers leave the heap entirely"""
+        timer = self.timers[timer_id]
+        if timer.is_running and not timer.is_paused:
+            timer.pause(self._now())
+            self._cancel(timer)
+            self._emit('paused', timer)
+        return timer
+
+    async def resume(self, timer_id):
+        """Continue a paused timer"""
+        timer = self.timers[timer_id]
+        if timer.is_running and timer.is_paused:
+            timer.resume(self._now())
+            self._schedule(timer)
+            self._emit('resumed', timer)
+        return timer
+
+    async def reset(self, timer_id):
+        """Stop a timer and restore its full duration"""
+        timer = self.timers[timer_id]
+        timer.is_running = False
+        timer.is_paused = False
+        timer.is_completed = False
+        timer.remaining_seconds = timer.total_seconds
+        self.active.discard(timer.id)
+        self._cancel(timer)
+        self._emit('reset', timer)
+        return timer
+
+    async def delete(self, timer_id):
+        """Stop and forget a timer; pending wait() calls are cancelled"""
+        timer = self.timers.pop(timer_id)
+        timer.is_running = False
+        self.active.discard(timer.id)
+        self._cancel(timer)
+        # The slot goes back to the store; the view keeps its last state
+        timer.detach()
+        for future in self._waiters.pop(timer_id, ()):
+            future.cancel()
+        self._emit('deleted', timer)
+        return timer
+
+    async def snapshot(self, timer_id=None):
+        """Immutable view of one timer, or a list of all of them"""
+        if timer_id is not None:
+            return self.timers[timer_id].snapshot()
+        return [timer.snapshot() for timer in self.timers.values()]
+
+    async def set_tick_events(self, enabled):
+        """Switch tick events on or off for the timers already running"""
+        if enabled == self.tick_events:
+            return
+        self.tick_events = enabled
+        if enabled:
+            for timer_id in self.active:
+                timer = self.timers[timer_id]
+                if timer.is_running and not timer.is_paused and timer.mode != MODE_TICK:
+                    self._schedule(timer)
+
+    # Scheduling
+
+    def _now_loop(self):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        return self._loop
+
+    def _now(self):
+        return self.clock.monotonic()
+
+    def _check_timers(self, timers):
+        self._check_clock(timers)
+        for timer in timers:
+            if timer.after:
+                raise ValueError(f"the asyncio engine cannot wait for predecessors (timer {timer.id})")
+
+    def _check_clock(self, timers):
+        clock = self.clock
+        for timer in timers:
+            if timer._store.clock is not clock:
+                raise ValueError(f"timer {timer.id} counts on another clock than the engine")
+
+    def _next_fire(self, timer, now):
+        if self.tick_events or timer.mode == MODE_TICK:
+            return timer.next_tick(now)
+        return timer.end_time()
+
+    def _schedule(self, timer):
+        """Push the next deadline of a timer, replacing any pending one"""
+        seq = next(self._counter)
+        self._entries[timer.id] = seq
+        heapq.heappush(self._heap, (self._next_fire(timer, self._now()), seq, timer))
+        self._arm()
+
+    def _cancel(self, timer):
+        """Drop the pending deadline of a timer; the heap entry is skipped lazily"""
+        self._entries.pop(timer.id, None)
+
+    def _arm(self):
+        """Point the single call_at handle at the earliest live deadline"""
+        heap = self._heap
+        while heap and self._entries.get(heap[0][2].id) != heap[0][1]:
+            heapq.heappop(heap)
+
+        if not heap or self.clock.virtual:
+            if self._handle is not None:
+                self._handle.cancel()
+                self._handle = None
+            return
+
+        # loop.time() is time.monotonic(), the real clock's
+        deadline = heap[0][0]
+        if self._handle is not None:
+            if self._handle.when() == deadline:
+                return
+            self._handle.cancel()
+        self._handle = self._now_loop().call_at(deadline, self._fire)
+
+    def run_until(self, target):
+        """Advance a VirtualClock to target, firing the deadlines on the way
+
+        Called by VirtualClock.advance() on the loop's thread, or with no
+        loop at all; the clock stops at each deadline in turn, as with
+        TimerEngine.run_until().
+        """
+        clock = self.clock
+        if not clock.virtual:
+            raise ValueError("only a virtual clock can be advanced")
+        heap = self._heap
+        while True:
+            self._arm()
+            if not heap or heap[0][0] > target:
+                break
+            clock.now = max(clock.now, heap[0][0])
+            self._fire()
+        clock.now = max(clock.now, target)
+
+    def _fire(self):
+        """Run every entry that is due, then re-arm for the next one"""
+        self._handle = None
+        now = self._now()
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            deadline, seq, timer = heapq.heappop(heap)
+            if self._entries.get(timer.id) != seq:
+                continue
+            self.lateness.observe(now - deadline)
+
+            next_deadline = timer.tick(deadline)
+            if next_deadline is None:
+                del self._entries[timer.id]
+                self._complete(timer)
+                continue
+            ticking = self.tick_events or timer.mode == MODE_TICK
+            seq = next(self._counter)
+            self._entries[timer.id] = seq
+            # Entries armed before tick events were switched off go straight to the end
+            heapq.heappush(heap, (next_deadline if ticking else timer.end_time(), seq, timer))
+            if ticking:
+                self._emit('tick', timer)
+        self._arm()
+
+    def _complete(self, timer):
+        timer.is_running = False
+        timer.is_paused = False
+        timer.is_completed = True
+        self.active.discard(timer.id)
+        self._emit('completed', timer)
+
+        for future in self._waiters.pop(timer.id, ()):
+            if not future.done():
+                future.set_result(timer)
+        for queue in self._streams:
+            queue.put_nowait(timer)
+
+        if timer.recurrence is not None:
+            self._repeat(timer)
+
+    def _repeat(self, timer):
+        """Start the next cycle of a recurring timer in place"""
+        now = self._now()
+        end = timer.end_time() if timer.mode != MODE_TICK else now
+        start, duration = timer.recurrence.next_cycle(end, now, self.clock.time())
+        timer.begin_cycle(start, duration)
+        self.active.add(timer.id)
+        self._schedule(timer)
+        self._emit('started', timer)
+
+class AsyncEngineBridge:
+    """Synchronous TimerEngine facade over an AsyncTimerEngine on its own loop thread
+
+    The tkinter view can use it in place of TimerEngine; every call is
+    submitted to the loop and waits for the result.
+    """
+    def __init__(self, engine=None):
+        self.engine = engine or AsyncTimerEngine(tick_events=True)
+        self.timers = self.engine.timers
+        self.active = self.engine.active
+        self.lateness = self.engine.lateness
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="timer-asyncio")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def subscribe(self, callback):
+        return self.engine.subscribe(callback)
+
+    def unsubscribe(self, callback):
+        self.engine.unsubscribe(callback)
+
+    def add(self, timer):
+        return self._call(self.engine.add(timer))
+
+    def add_many(self, timers):
+        return self._call(self.engine.add_many(timers))
+
+    def restore(self, timers):
+        return self._call(self.engine.restore(timers))
+
+    def start(self, timer_id):
+        return self._call(self.engine.start(timer_id))
+
+    def pause(self, timer_id):
+        return self._call(self.engine.pause(timer_id))
+
+    def resume(self, timer_id):
+        return self._call(self.engine.resume(timer_id))
+
+    def reset(self, timer_id):
+        return self._call(self.engine.reset(timer_id))
+
+    def delete(self, timer_id):
+        return self._call(self.engine.delete(timer_id))
+
+    def snapshot(self, timer_id=None):
+        return self._call(self.engine.snapshot(timer_id))
+
+    def set_tick_events(self, enabled):
+        return self._call(self.engine.set_tick_events(enabled))
+
+    def close(self):
+        """Stop the loop thread"""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
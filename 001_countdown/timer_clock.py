@@ -0,0 +1,88 @@
+"""Clocks for the countdown engine: real time, or virtual time for simulations
+
+The engine and its timers read time only through a clock object, whose
+monotonic() drives the countdowns and whose time() is the wall time that
+calendar schedules and creation stamps use. MonotonicClock is the real one
+and the default. A VirtualClock stands still until it is advanced:
+
+    clock = VirtualClock()
+    store = TimerStore(clock)
+    engine = TimerEngine(clock=clock, tick_events=False)
+    engine.add(TimerTask('report', 24, 0, 0, store=store))
+    engine.start_all()
+    clock.advance(86400)        # a day of timers in milliseconds
+
+advance() walks through the engine's deadlines in order, setting the clock
+to each one before it fires, so listeners see the same events in the same
+order as they would in real time, with every deadline met exactly.
+Timers due at the same instant fire in the order they were queued, where
+in real time microseconds between their starts would decide. A timing
+wheel used with a virtual clock needs its origin on that clock:
+TimingWheel(origin=clock.monotonic()). AsyncTimerEngine and TimerJournal
+take a clock too.
+"""
+import time
+
+class MonotonicClock:
+    """Real time: time.monotonic() for countdowns, time.time() for the calendar"""
+    virtual = False
+
+    monotonic = staticmethod(time.monotonic)
+    time = staticmethod(time.time)
+
+    def __repr__(self):
+        return "MonotonicClock()"
+
+# Stores, groups and engines that are not given a clock share this one
+default_clock = MonotonicClock()
+
+class VirtualClock:
+    """Clock that only moves when advanced, driving at most one engine
+
+    now starts at start (seconds, any origin) and wall time at wall, by
+    default the real wall time at creation. The engine's scheduler thread
+    is the only writer of now while an engine is attached.
+    """
+    virtual = True
+
+    def __init__(self, start=0.0, wall=None):
+        self.now = float(start)
+        self.start = self.now
+        self.wall = time.time() if wall is None else wall
+        self.engine = None
+        self._advancing = False
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.wall + (self.now - self.start)
+
+    def attach(self, engine):
+        """Called by TimerEngine; advance() then fires that engine's timers"""
+        if self.engine is not None and self.engine is not engine:
+            raise ValueError("a VirtualClock drives one engine")
+        self.engine = engine
+
+    def advance(self, seconds):
+        """Move the clock forward, firing every timer that comes due on the way"""
+        if seconds < 0:
+            raise ValueError("a clock cannot go back")
+        self.advance_to(self.now + seconds)
+
+    def advance_to(self, target):
+        """Move the clock to target, if it is later than now"""
+        if self._advancing:
+            # E.g. a listener reacting to a fired timer; the outer advance owns the clock
+            raise RuntimeError("advance() called while the clock is advancing")
+        if self.engine is None:
+            self.now = max(self.now, target)
+            return
+        self._advancing = True
+        try:
+            self.engine.run_until(target)
+        finally:
+            self._advancing = False
+
+    def __repr__(self):
+        return f"VirtualClock(now={self.now})"
@@ -0,0 +1,693 @@
+"""Timer daemon: the engine behind a Unix domain socket
+
+The daemon owns a TimerEngine (and the journal), so countdowns outlive any
+window. The tkinter view attaches as one client through RemoteEngine;
+scripts use TimerClient:
+
+    python timer_daemon.py                      # serve ~/.countdown_timer/timers.sock
+    python countdown_timer.py --connect         # GUI as a client
+
+    client = TimerClient(path)
+    row = client.call('add', 'tea', 180)
+    client.batch([('start', row[0]), ('get', row[0])])
+
+Protocol: one compact JSON value per line in each direction.
+
+    request     [id, op, arg, ...]
+    batch       [[id, op, arg, ...], ...]       answered with one list
+    response    [id, null, result] or [id, error_type, message]
+    push        [null, event, [row, ...]]       after 'subscribe'
+
+A timer travels as a row, ROW_FIELDS in order. Group events carry the
+rows of every member, except 'group_tick', which carries none: a client
+counts deadline timers down on its own clock and only needs a redraw.
+"""
+import argparse
+import collections
+import itertools
+import json
+import os
+import socket
+import socketserver
+import threading
+
+from timer_engine import (
+    MODE_DEADLINE, MODE_PRECISE, MODES, STATE_COMPLETED, STATE_PAUSED, STATE_RUNNING,
+    TimerEngine, TimerStore, TimerTask
+)
+from timer_hooks import DEFAULT_TIMEOUT, DEFAULT_WORKERS, HookRunner, hook_specs, parse_hook
+from timer_journal import TimerJournal
+from timer_metrics import Gauge, MetricsRegistry, MetricsServer
+from timer_schedule import parse_recurrence
+from timer_wheel import TimingWheel
+
+SOCKET_FILE = 'timers.sock'
+
+ROW_FIELDS = ('id', 'name', 'total_seconds', 'remaining', 'state', 'group', 'mode', 'repeat', 'after')
+
+# Unsent messages after which a client that stopped reading is disconnected
+MAX_BACKLOG = 200000
+
+# Group events as seen by a client that does not mirror groups
+MIRRORED_GROUP_EVENTS = {
+    'group_started': 'started',
+    'group_paused': 'paused',
+    'group_resumed': 'resumed',
+    'group_reset': 'reset',
+    'group_tick': 'tick',
+}
+
+def timer_row(timer):
+    """Wire form of a timer; remaining is exact, to the millisecond"""
+    group = timer.group
+    rule = timer.recurrence
+    return [
+        timer.id,
+        timer.name,
+        timer.total_seconds,
+        max(0.0, round(timer.remaining_time(), 3)),
+        STATE_PAUSED if timer.frozen else timer.state,
+        group.name if group is not None else None,
+        timer.mode,
+        rule.spec if rule is not None else None,
+        list(timer.after) or None,
+    ]
+
+def _encode(message):
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':'))
+
+class _Connection:
+    """Outgoing side of one client: a queue drained by a writer thread
+
+    Responses and pushed events share the queue, so a client sees them in
+    the order they happened. Everything queued by the time the writer
+    wakes goes out in one sendall.
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.events = None
+        self.closed = False
+        self._queue = collections.deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def send(self, line):
+        with self._cond:
+            if self.closed:
+                return
+            self._queue.append(line)
+            if len(self._queue) > MAX_BACKLOG:
+                # The client stopped reading; do not let it hold memory
+                self.closed = True
+                self._queue.clear()
+                try:
+                    self.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _write(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self.closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                lines = list(self._queue)
+                self._queue.clear()
+            try:
+                self.sock.sendall(('\n'.join(lines) + '\n').encode('utf-8'))
+            except OSError:
+                with self._cond:
+                    self.closed = True
+                    self._queue.clear()
+                return
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        connection = _Connection(self.request)
+        with server.connections_lock:
+            server.connections.add(connection)
+        try:
+            for line in self.rfile:
+                if connection.closed:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line)
+                except ValueError as e:
+                    connection.send(_encode([None, 'ValueError', f"bad message: {e}"]))
+                    continue
+                if message and isinstance(message[0], list):
+                    reply = [server.dispatch(connection, request) for request in message]
+                else:
+                    reply = server.dispatch(connection, message)
+                connection.send(_encode(reply))
+        finally:
+            with server.connections_lock:
+                server.connections.discard(connection)
+            connection.close()
+
+class TimerDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serve an engine on a Unix domain socket, one thread per client
+
+    Client threads call the engine directly; their calls queue as
+    commands for its scheduler thread. Events are encoded once on the
+    thread that emits them and queued to the subscribed clients, so the
+    scheduler thread never blocks on a socket.
+
+    The socket is open to its owner only. Clients' 'cmd:' hooks are
+    refused unless allow_commands is set.
+    """
+    daemon_threads = True
+
+    def __init__(self, engine, path, allow_commands=False):
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                # Left over from a daemon that did not shut down cleanly
+                os.unlink(path)
+            else:
+                probe.close()
+                raise OSError(f"a timer daemon is already listening on {path}")
+        self.engine = engine
+        self.path = path
+        # Clients may attach 'cmd:' hooks, which run as this process
+        self.allow_commands = allow_commands
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+        super().__init__(path, _Handler)
+        engine.subscribe(self.on_engine_event)
+
+        self.metrics = MetricsRegistry()
+        self.metrics.add(engine.lateness)
+        self.metrics.add(Gauge('countdown_timers', "Timers known to the engine", lambda: len(engine.timers)))
+        self.metrics.add(Gauge('countdown_active_timers', "Running or paused timers", lambda: len(engine.active)))
+        self.metrics.add(Gauge('countdown_daemon_clients', "Connected clients", lambda: len(self.connections)))
+        self.metrics.add(Gauge('countdown_threads', "Live threads", threading.active_count))
+
+        self.ops = {
+            'ping': lambda: 'pong',
+            'metrics': lambda: self.metrics.render(),
+            'add': self.op_add,
+            'add_many': self.op_add_many,
+            'get': lambda timer_id: timer_row(engine.timers[timer_id]),
+            'list': lambda: [timer_row(timer) for timer in list(engine.timers.values())],
+            'start': lambda timer_id: timer_row(engine.start(timer_id)),
+            'pause': lambda timer_id: timer_row(engine.pause(timer_id)),
+            'resume': lambda timer_id: timer_row(engine.resume(timer_id)),
+            'reset': lambda timer_id: timer_row(engine.reset(timer_id)),
+            'delete': lambda timer_id: engine.delete(timer_id).id,
+            'set_group': lambda timer_ids, name: len(engine.set_group(timer_ids, name)),
+            'set_dependencies': lambda timer_id, after: timer_row(engine.set_dependencies(timer_id, after)),
+            'start_group': lambda name: len(engine.start_group(name).members),
+            'pause_group': lambda name: len(engine.pause_group(name).members),
+            'resume_group': lambda name: len(engine.resume_group(name).members),
+            'reset_group': lambda name: len(engine.reset_group(name).members),
+            'start_all': lambda: engine.start_all(),
+            'pause_all': lambda: engine.pause_all(),
+            'resume_all': lambda: engine.resume_all(),
+            'reset_all': lambda: engine.reset_all(),
+        }
+
+    def server_bind(self):
+        # Owner only from the start: a client can run timers and hooks as this user
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+    def server_close(self):
+        super().server_close()
+        self.engine.unsubscribe(self.on_engine_event)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    # Requests
+
+    def dispatch(self, connection, request):
+        """Run one [id, op, args...] request and return its response"""
+        try:
+            request_id, op, *args = request
+        except (TypeError, ValueError):
+            return [None, 'ValueError', "request must be [id, op, args...]"]
+        try:
+            if op == 'subscribe':
+                connection.events = set(args[0]) if args and args[0] is not None else True
+                return [request_id, None, True]
+            if op == 'unsubscribe':
+                connection.events = None
+                return [request_id, None, True]
+            handler = self.ops.get(op)
+            if handler is None:
+                raise ValueError(f"unknown op {op!r}")
+            return [request_id, None, handler(*args)]
+        except KeyError as e:
+            return [request_id, 'KeyError', f"unknown timer or group: {e.args[0]}"]
+        except (TypeError, ValueError) as e:
+            return [request_id, type(e).__name__, str(e)]
+
+    def _build(self, spec):
+        """TimerTask from [name, seconds, group, repeat, mode, id, hooks, after]; trailing fields optional"""
+        name, seconds, group, repeat, mode, timer_id, hooks, after = (list(spec) + [None] * 6)[:8]
+        if not name or not isinstance(seconds, (int, float)) or seconds <= 0:
+            raise ValueError("a timer needs a name and a positive duration")
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"unknown mode {mode!r}")
+        if mode != MODE_PRECISE:
+            seconds = int(seconds)
+        timer = TimerTask(name, 0, 0, seconds, task_id=timer_id, mode=mode or MODE_DEADLINE)
+        if repeat:
+            timer.recurrence = parse_recurrence(repeat)
+        if hooks:
+            timer.hooks = [parse_hook(hook, allow_commands=self.allow_commands) for hook in hooks]
+        if after:
+            timer.after = after
+        return timer, group
+
+    def op_add(self, *spec):
+        return self.engine.call(self._add, spec)
+
+    def op_add_many(self, specs):
+        return self.engine.call(self._add_many, specs)
+
+    # Run as engine commands: a TimerTask takes its slot in the engine's
+    # store when it is built, which only the scheduler thread may write
+
+    def _add(self, spec):
+        timer, group = self._build(spec)
+        try:
+            self.engine.add(timer, group=group)
+        except ValueError:
+            timer.detach()
+            raise
+        return timer_row(timer)
+
+    def _add_many(self, specs):
+        built = []
+        try:
+            for spec in specs:
+                built.append(self._build(spec))
+            self.engine.add_many([timer for timer, _ in built])
+        except ValueError:
+            for timer, _ in built:
+                timer.detach()
+            raise
+        groups = {}
+        for timer, group in built:
+            if group is not None:
+                groups.setdefault(group, []).append(timer.id)
+        for name, timer_ids in groups.items():
+            self.engine.set_group(timer_ids, name)
+        return [timer_row(timer) for timer, _ in built]
+
+    # Push
+
+    def on_engine_event(self, event, timer):
+        """Engine listener: encode once, queue to every interested client"""
+        with self.connections_lock:
+            targets = [
+                connection for connection in self.connections
+                if connection.events is True or (connection.events and event in connection.events)
+            ]
+        if not targets:
+            return
+        if event == 'group_tick':
+            rows = []
+        elif event.startswith('group_'):
+            # timer is the TimerGroup here
+            rows = [timer_row(member) for member in list(timer.members.values())]
+        else:
+            rows = [timer_row(timer)]
+        line = _encode([None, event, rows] + ([timer.name] if event.startswith('group_') else []))
+        for connection in targets:
+            connection.send(line)
+
+class _Waiter:
+    """Collects the responses to one call or batch"""
+    def __init__(self, ids):
+        self.ids = ids
+        self.responses = {}
+        self.done = threading.Event()
+
+ERRORS = {'KeyError': KeyError, 'ValueError': ValueError, 'TypeError': TypeError}
+
+class TimerDaemonError(RuntimeError):
+    """An error reported by the daemon that has no local exception type"""
+
+class TimerClient:
+    """Synchronous client for a timer daemon
+
+    call() sends one request and waits for its answer. batch() sends many
+    in one message and one round trip; failed entries come back as
+    exception instances in place of their results. Pushed events go to
+    on_event(event, rows, group) on the reader thread.
+    """
+    def __init__(self, path, on_event=None, timeout=10.0):
+        self.on_event = on_event
+        self.timeout = timeout
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(path)
+        self._ids = itertools.count(1)
+        self._waiting = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._closed = False
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def call(self, op, *args):
+        result = self.batch([(op, *args)])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def batch(self, calls):
+        requests = [[next(self._ids), op, *args] for op, *args in calls]
+        if not requests:
+            return []
+        waiter = _Waiter([request[0] for request in requests])
+        with self._lock:
+            if self._closed:
+                raise ConnectionError("timer daemon connection is closed")
+            for request_id in waiter.ids:
+                self._waiting[request_id] = waiter
+        message = requests[0] if len(requests) == 1 else requests
+        with self._send_lock:
+            self._sock.sendall((_encode(message) + '\n').encode('utf-8'))
+        if not waiter.done.wait(self.timeout):
+            raise TimeoutError("no answer from the timer daemon")
+        if len(waiter.responses) < len(waiter.ids):
+            raise ConnectionError("timer daemon connection was lost")
+        return [self._result(waiter.responses[request_id]) for request_id in waiter.ids]
+
+    def _result(self, response):
+        _, error, value = response
+        if error is None:
+            return value
+        return ERRORS.get(error, TimerDaemonError)(value)
+
+    def close(self):
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        self._reader.join()
+
+    def _read(self):
+        try:
+            for line in self._sock.makefile('r', encoding='utf-8'):
+                message = json.loads(line)
+                if message and isinstance(message[0], list):
+                    for response in message:
+                        self._answer(response)
+                elif message[0] is None:
+                    # A push; an error without a request id has nobody to go to
+                    if isinstance(message[2], list) and self.on_event is not None:
+                        self.on_event(message[1], message[2], message[3] if len(message) > 3 else None)
+                else:
+                    self._answer(message)
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._lock:
+                self._closed = True
+                waiters = set(self._waiting.values())
+                self._waiting.clear()
+            for waiter in waiters:
+                waiter.done.set()
+
+    def _answer(self, response):
+        with self._lock:
+            waiter = self._waiting.pop(response[0], None)
+        if waiter is None:
+            return
+        waiter.responses[response[0]] = response
+        if len(waiter.responses) == len(waiter.ids):
+            waiter.done.set()
+
+class RemoteEngine:
+    """TimerEngine stand-in for a view attached to a daemon
+
+    Keeps a mirror TimerTask per daemon timer, updated from pushed rows, so
+    the view reads timers exactly as it does with a local engine; running
+    deadline timers count down on the local clock between messages. Every
+    daemon event is re-emitted to local listeners, including those caused
+    by this client, and shared is True: other clients change the same
+    timers, so a view must follow 'added' and 'deleted' too. Groups can be
+    driven by scripts but are not mirrored; members of a paused group show
+    as paused.
+    """
+    shared = True
+
+    def __init__(self, path):
+        self.timers = {}
+        self.active = set()
+        self._store = TimerStore()
+        self._members = {}
+        self._listeners = []
+        self._lock = threading.RLock()
+        self.client = TimerClient(path, on_event=self.on_daemon_event)
+        self.client.call('subscribe', None)
+        with self._lock:
+            for row in self.client.call('list'):
+                self._apply(row)
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        self._listeners.remove(callback)
+
+    def _emit(self, event, timer):
+        for callback in self._listeners:
+            callback(event, timer)
+
+    def on_daemon_event(self, event, rows, group):
+        """Apply pushed rows to the mirrors, then notify local listeners"""
+        with self._lock:
+            if event == 'deleted':
+                timers = [self._forget(row[0]) for row in rows]
+            else:
+                timers = [self._apply(row) for row in rows]
+            if event == 'group_tick':
+                timers = [self.timers[i] for i in self._members.get(group, ()) if i in self.timers]
+        event = MIRRORED_GROUP_EVENTS.get(event, event)
+        for timer in timers:
+            if timer is not None:
+                self._emit(event, timer)
+
+    def _apply(self, row):
+        """Bring the mirror of a row up to date; returns it"""
+        timer_id, name, total, remaining, state, group, mode, repeat, after = row
+        timer = self.timers.get(timer_id)
+        if timer is None:
+            timer = TimerTask(name, 0, 0, total, task_id=timer_id, mode=mode, store=self._store)
+            self.timers[timer_id] = timer
+        timer.name = name
+        timer.total_seconds = total
+        timer.recurrence = parse_recurrence(repeat) if repeat else None
+        timer.after = after or ()
+        self._set_group(timer_id, group)
+
+        timer.is_completed = state == STATE_COMPLETED
+        timer.remaining_seconds = 0 if state == STATE_COMPLETED else remaining
+        if state in (STATE_RUNNING, STATE_PAUSED):
+            timer.start()
+            if state == STATE_PAUSED:
+                timer.pause()
+            self.active.add(timer_id)
+        else:
+            timer.is_running = False
+            timer.is_paused = False
+            self.active.discard(timer_id)
+        return timer
+
+    def _set_group(self, timer_id, group):
+        for name, members in self._members.items():
+            if name != group:
+                members.discard(timer_id)
+        if group is not None:
+            self._members.setdefault(group, set()).add(timer_id)
+
+    def _forget(self, timer_id):
+        timer = self.timers.pop(timer_id, None)
+        if timer is not None:
+            self.active.discard(timer_id)
+            self._set_group(timer_id, None)
+        return timer
+
+    # TimerEngine API, as used by the view
+
+    def add(self, timer):
+        """Create a timer on the daemon from a local TimerTask, which becomes its mirror"""
+        rule = timer.recurrence
+        with self._lock:
+            # Registered first: the daemon's 'added' push can beat the response
+            self.timers[timer.id] = timer
+        try:
+            row = self.client.call(
+                'add', timer.name, timer.total_seconds, None,
+                rule.spec if rule is not None else None, timer.mode, timer.id, hook_specs(timer),
+                list(timer.after) or None
+            )
+        except Exception:
+            with self._lock:
+                self.timers.pop(timer.id, None)
+            raise
+        with self._lock:
+            return self._apply(row)
+
+    def add_many(self, timers):
+        timers = list(timers)
+        with self._lock:
+            for timer in timers:
+                self.timers[timer.id] = timer
+        specs = []
+        for timer in timers:
+            rule = timer.recurrence
+            specs.append([timer.name, timer.total_seconds, None,
+                          rule.spec if rule is not None else None, timer.mode, timer.id, hook_specs(timer),
+                          list(timer.after) or None])
+        try:
+            rows = self.client.call('add_many', specs)
+        except Exception:
+            with self._lock:
+                for timer in timers:
+                    self.timers.pop(timer.id, None)
+            raise
+        with self._lock:
+            return [self._apply(row) for row in rows]
+
+    def _timer_op(self, op, timer_id, *args):
+        row = self.client.call(op, timer_id, *args)
+        with self._lock:
+            return self._apply(row)
+
+    def start(self, timer_id):
+        return self._timer_op('start', timer_id)
+
+    def pause(self, timer_id):
+        return self._timer_op('pause', timer_id)
+
+    def resume(self, timer_id):
+        return self._timer_op('resume', timer_id)
+
+    def reset(self, timer_id):
+        return self._timer_op('reset', timer_id)
+
+    def delete(self, timer_id):
+        timer = self.timers[timer_id]
+        self.client.call('delete', timer_id)
+        with self._lock:
+            self._forget(timer_id)
+        return timer
+
+    def set_dependencies(self, timer_id, after):
+        after = list(dict.fromkeys(after))
+        return self._timer_op('set_dependencies', timer_id, after)
+
+    def start_all(self):
+        self.client.call('start_all')
+
+    def pause_all(self):
+        return self.client.call('pause_all')
+
+    def resume_all(self):
+        self.client.call('resume_all')
+
+    def reset_all(self):
+        self.client.call('reset_all')
+
+    def snapshot(self, timer_id=None):
+        if timer_id is not None:
+            return self.timers[timer_id].snapshot()
+        return [timer.snapshot() for timer in list(self.timers.values())]
+
+    def close(self):
+        self.client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="倒计时守护进程")
+    parser.add_argument(
+        '--data-dir',
+        default=os.path.join(os.path.expanduser('~'), '.countdown_timer'),
+        help="directory for the journal, snapshots and the socket"
+    )
+    parser.add_argument('--socket', help=f"socket path (default: DATA_DIR/{SOCKET_FILE})")
+    parser.add_argument('--no-journal', action='store_true', help="keep timers in memory only")
+    parser.add_argument(
+        '--allow-command-hooks',
+        action='store_true',
+        help="let clients attach cmd: hooks, which run shell commands as this user"
+    )
+    parser.add_argument(
+        '--timing-wheel',
+        action='store_true',
+        help="keep scheduled timers in a hierarchical timing wheel instead of a heap"
+    )
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics"
+    )
+    parser.add_argument(
+        '--hook-workers',
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="completion hooks run at most this many at a time"
+    )
+    parser.add_argument(
+        '--hook-timeout',
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="seconds before a completion hook is killed"
+    )
+    args = parser.parse_args()
+
+    engine = TimerEngine(timer_queue=TimingWheel() if args.timing_wheel else None)
+    # Completion hooks run here, whichever client added the timer; subscribed
+    # before recovery so timers that ran out while we were down run theirs
+    hooks = HookRunner(engine, workers=args.hook_workers, timeout=args.hook_timeout)
+    journal = None
+    if not args.no_journal:
+        journal = TimerJournal(args.data_dir)
+        journal.recover(engine)
+        journal.attach(engine)
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    daemon = TimerDaemon(
+        engine,
+        args.socket or os.path.join(args.data_dir, SOCKET_FILE),
+        allow_commands=args.allow_command_hooks
+    )
+    hooks.register(daemon.metrics)
+    metrics_server = MetricsServer(daemon.metrics, args.metrics_port) if args.metrics_port else None
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+        daemon.server_close()
+        hooks.close()
+        engine.close()
+        if journal is not None:
+            journal.close()
+
+if __name__ == '__main__':
+    main()
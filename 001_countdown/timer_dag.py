@@ -0,0 +1,163 @@
+"""Dependency edges between timers, for pipelines that start themselves
+
+A timer's after is the ids of the timers it waits for. When every one of
+them has completed, the engine starts it on the scheduler thread, in the
+same step as the completion that freed it:
+
+    a = TimerTask('A', 0, 5, 0)
+    b = TimerTask('B', 0, 3, 0); b.after = [a.id]
+    c = TimerTask('C', 0, 3, 0); c.after = [a.id]
+    d = TimerTask('D', 0, 1, 0); d.after = [b.id, c.id]
+    engine.add_many([a, b, c, d])
+    engine.start_all()          # starts A; B and C follow it, then D
+
+DependencyGraph keeps, per waiting timer, a counter of the predecessors
+that have not completed since it was armed, so a completion costs the
+out-degree of the finished timer whatever the size of the pipeline.
+Restarting or resetting a timer re-arms it, and its successors wait for
+it again. Edges are checked for cycles as they are added, over only the
+part of the graph the new edges can reach.
+"""
+import itertools
+
+class DependencyGraph:
+    """Predecessor and successor maps of the timers with edges, plus readiness counters
+
+    Keyed by timer id; ids without edges take no space. A predecessor the
+    engine does not know yet counts as not completed.
+    """
+    def __init__(self):
+        # Successor id -> tuple of predecessor ids
+        self.predecessors = {}
+        # Predecessor id -> dict of successor ids, an ordered set
+        self.successors = {}
+        # Successor id -> predecessors not completed since it was armed
+        self.waiting = {}
+        # Predecessors that completed and were not restarted since
+        self.done = set()
+
+    def __len__(self):
+        return len(self.predecessors)
+
+    def ready(self, timer_id):
+        """True unless the timer still waits for a predecessor"""
+        return not self.waiting.get(timer_id)
+
+    def check(self, links):
+        """Raise ValueError if setting {id: predecessor ids} would close a cycle
+
+        A new cycle has to pass through one of the changed timers, so only
+        what they reach is searched, depth first.
+        """
+        incoming = {}
+        for timer_id, after in links.items():
+            for predecessor in after:
+                incoming.setdefault(predecessor, []).append(timer_id)
+        successors = self.successors
+
+        def next_of(node):
+            new = incoming.get(node, ())
+            existing = successors.get(node)
+            if not existing:
+                return iter(new)
+            # Edges into a changed timer are replaced by its new predecessors
+            return itertools.chain([successor for successor in existing if successor not in links], new)
+
+        # 1 while on the search path, 2 once everything below it is searched
+        seen = {}
+        for root in links:
+            if root in seen:
+                continue
+            seen[root] = 1
+            stack = [(root, next_of(root))]
+            while stack:
+                node, children = stack[-1]
+                for child in children:
+                    mark = seen.get(child)
+                    if mark == 1:
+                        raise ValueError(f"dependency cycle through timer {child}")
+                    if mark is None:
+                        seen[child] = 1
+                        stack.append((child, next_of(child)))
+                        break
+                else:
+                    seen[node] = 2
+                    stack.pop()
+
+    def link(self, timer_id, after, is_completed):
+        """Make after the predecessors of timer_id, replacing any it had
+
+        is_completed(id) tells whether a predecessor with no other
+        successors has completed; one that has counts as done at once.
+        Linking never starts anything.
+        """
+        if timer_id in self.predecessors:
+            self._unlink(timer_id)
+        if not after:
+            return
+        self.predecessors[timer_id] = after
+        all_successors = self.successors
+        done = self.done
+        waiting = 0
+        for predecessor in after:
+            successors = all_successors.get(predecessor)
+            if successors is None:
+                successors = all_successors[predecessor] = {}
+                if is_completed(predecessor):
+                    done.add(predecessor)
+            successors[timer_id] = None
+            if predecessor not in done:
+                waiting += 1
+        self.waiting[timer_id] = waiting
+
+    def _unlink(self, timer_id):
+        for predecessor in self.predecessors.pop(timer_id, ()):
+            successors = self.successors[predecessor]
+            del successors[timer_id]
+            if not successors:
+                del self.successors[predecessor]
+                self.done.discard(predecessor)
+        self.waiting.pop(timer_id, None)
+
+    def forget(self, timer_id):
+        """Drop a deleted timer; returns the successors that no longer wait for it
+
+        Their counters drop with the edge, but nothing is started: a
+        deletion is not a completion.
+        """
+        self._unlink(timer_id)
+        successors = self.successors.pop(timer_id, {})
+        done = timer_id in self.done
+        self.done.discard(timer_id)
+        for successor in successors:
+            after = tuple(predecessor for predecessor in self.predecessors[successor] if predecessor != timer_id)
+            if after:
+                self.predecessors[successor] = after
+                if not done:
+                    self.waiting[successor] -= 1
+            else:
+                del self.predecessors[successor]
+                del self.waiting[successor]
+        return list(successors)
+
+    def completed(self, timer_id):
+        """Count a completion; returns the successors it made ready, in edge order"""
+        successors = self.successors.get(timer_id)
+        if successors is None or timer_id in self.done:
+            return ()
+        self.done.add(timer_id)
+        waiting = self.waiting
+        ready = []
+        for successor in successors:
+            waiting[successor] -= 1
+            if not waiting[successor]:
+                ready.append(successor)
+        return ready
+
+    def rearm(self, timer_id):
+        """A completed predecessor runs again; its successors wait for it anew"""
+        if timer_id in self.done:
+            self.done.discard(timer_id)
+            waiting = self.waiting
+            for successor in self.successors[timer_id]:
+                waiting[successor] += 1
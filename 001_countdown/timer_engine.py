@@ -0,0 +1,1588 @@
+"""Headless countdown engine: timer state, scheduling and completion events
+
+Nothing in this module touches tkinter, so the engine can be embedded in
+services, driven from scripts and benchmarked without a display.
+"""
+import functools
+import heapq
+import itertools
+import math
+import queue
+import threading
+import time
+import uuid
+from array import array
+from collections import namedtuple
+from datetime import datetime
+
+from timer_clock import default_clock
+from timer_dag import DependencyGraph
+from timer_metrics import Histogram
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Timing modes: 'tick' decrements once per scheduler tick, 'deadline'
+# derives the remaining time from an absolute monotonic end time, and
+# 'precise' is a deadline timer shown and stored to the millisecond
+MODE_TICK = 'tick'
+MODE_DEADLINE = 'deadline'
+MODE_PRECISE = 'precise'
+MODES = (MODE_DEADLINE, MODE_TICK, MODE_PRECISE)
+
+# Tolerance for float deadlines landing exactly on a second boundary
+_EPSILON = 1e-6
+
+STATE_IDLE = 'idle'
+STATE_RUNNING = 'running'
+STATE_PAUSED = 'paused'
+STATE_COMPLETED = 'completed'
+
+TimerSnapshot = namedtuple(
+    'TimerSnapshot',
+    ['id', 'name', 'total_seconds', 'remaining_seconds', 'state', 'group'],
+    defaults=(None,)
+)
+
+# Slot flags of TimerStore
+FLAG_LIVE = 1
+FLAG_RUNNING = 2
+FLAG_PAUSED = 4
+FLAG_COMPLETED = 8
+FLAG_TICK = 16
+FLAG_PRECISE = 32
+
+_NAN = float('nan')
+
+class TimerStore:
+    """Timer state in parallel typed arrays, one slot per timer
+
+    Deadlines, pause bookkeeping, remaining and total seconds, creation
+    time and state bitflags live in array columns; NaN stands for "not
+    set". Only ids, names and the TimerTask views are Python objects.
+    Slots of released timers are reused. The bulk queries run on NumPy when
+    it is installed and fall back to one pass over the columns otherwise;
+    members of a TimerGroup run on the group clock and are read through
+    their views. Every timer in a store counts down on the store's clock
+    (see timer_clock), the clock of the engine it is added to.
+
+    A TimerTask claims its slot when it is created, on whatever thread
+    creates it, so allocate() and release() hold a lock. The columns of a
+    claimed slot are written by the engine's scheduler thread only.
+    """
+    def __init__(self, clock=None):
+        self.clock = default_clock if clock is None else clock
+        self.deadline = array('d')
+        self.paused_at = array('d')
+        self.paused_total = array('d')
+        self.remaining = array('d')
+        # Seconds, whole except for precise timers (millisecond multiples)
+        self.total = array('d')
+        self.created = array('d')
+        self.flags = array('B')
+        # Group epoch a member last left the group's bulk state in; 0 = never
+        self.epochs = array('Q')
+        self.ids = []
+        self.names = []
+        self.views = []
+        self.groups = []
+        # Recurrence rule of repeating timers, None for one-shot ones
+        self.rules = []
+        # Tuple of completion hooks (see timer_hooks), None for most timers
+        self.hooks = []
+        # Tuple of predecessor ids (see timer_dag), None for most timers
+        self.after = []
+        self._free = []
+        # Taken while claiming or freeing a slot; see the class docstring
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids) - len(self._free)
+
+    def allocate(self, view, timer_id, name, total, flags):
+        """Claim a slot for a new timer and return its index"""
+        created = self.clock.time()
+        with self._lock:
+            if self._free:
+                slot = self._free.pop()
+                self.deadline[slot] = _NAN
+                self.paused_at[slot] = _NAN
+                self.paused_total[slot] = 0.0
+                self.remaining[slot] = total
+                self.total[slot] = total
+                self.created[slot] = created
+                self.flags[slot] = flags | FLAG_LIVE
+                self.epochs[slot] = 0
+                self.ids[slot] = timer_id
+                self.names[slot] = name
+                self.views[slot] = view
+                self.groups[slot] = None
+                self.rules[slot] = None
+                self.hooks[slot] = None
+                self.after[slot] = None
+                return slot
+
+            self.deadline.append(_NAN)
+            self.paused_at.append(_NAN)
+            self.paused_total.append(0.0)
+            self.remaining.append(total)
+            self.total.append(total)
+            self.created.append(created)
+            self.flags.append(flags | FLAG_LIVE)
+            self.epochs.append(0)
+            self.ids.append(timer_id)
+            self.names.append(name)
+            self.views.append(view)
+            self.groups.append(None)
+            self.rules.append(None)
+            self.hooks.append(None)
+            self.after.append(None)
+            return len(self.ids) - 1
+
+    def allocate_many(self, ids, names, totals, flags, remaining, deadline=None, paused_at=None,
+                      rules=None, hooks=None, after=None):
+        """Claim one new slot per id at the end of the store and return TimerTask views of them
+
+        Each argument is a sequence with a value per timer, in the columns'
+        own representation (NaN for "not set", tuples or None for hooks and
+        after); the optional ones default to unset. The columns are extended
+        in one call each, for bulk loads such as a journal recovery.
+        """
+        count = len(ids)
+        nan = array('d', [_NAN]) * count
+        unset = [None] * count
+        created = self.clock.time()
+        with self._lock:
+            first = len(self.ids)
+            self.deadline.extend(nan if deadline is None else deadline)
+            self.paused_at.extend(nan if paused_at is None else paused_at)
+            self.paused_total.extend(array('d', bytes(8 * count)))
+            self.remaining.extend(remaining)
+            self.total.extend(totals)
+            self.created.extend(array('d', [created]) * count)
+            self.flags.extend(flag | FLAG_LIVE for flag in flags)
+            self.epochs.extend(array('Q', bytes(8 * count)))
+            self.ids.extend(ids)
+            self.names.extend(names)
+            self.groups.extend(unset)
+            self.rules.extend(unset if rules is None else rules)
+            self.hooks.extend(unset if hooks is None else hooks)
+            self.after.extend(unset if after is None else after)
+            views = [TimerTask._view(self, slot) for slot in range(first, first + count)]
+            self.views.extend(views)
+        return views
+
+    def release(self, slot):
+        """Free a slot for reuse"""
+        with self._lock:
+            self.flags[slot] = 0
+            self.ids[slot] = None
+            self.names[slot] = None
+            self.views[slot] = None
+            self.groups[slot] = None
+            self.rules[slot] = None
+            self.hooks[slot] = None
+            self.after[slot] = None
+            self._free.append(slot)
+
+    def remaining_all(self, now=None):
+        """Exact seconds left for every slot, NaN for free slots"""
+        now = self.clock.monotonic() if now is None else now
+        if np is not None:
+            result = array('d', self._remaining_np(now).tobytes())
+        else:
+            result = self._remaining_columns(now)
+
+        if self.groups.count(None) != len(self.groups):
+            for slot, group in enumerate(self.groups):
+                if group is not None:
+                    result[slot] = self.views[slot].remaining_time(now)
+        return result
+
+    def _remaining_columns(self, now):
+        return array('d', [
+            _NAN if not flags & FLAG_LIVE
+            else remaining if flags & FLAG_TICK or deadline != deadline
+            else deadline + paused_total - (paused_at if paused_at == paused_at else now)
+            for deadline, paused_at, paused_total, remaining, flags in zip(
+                self.deadline, self.paused_at, self.paused_total, self.remaining, self.flags
+            )
+        ])
+
+    def expired(self, now=None):
+        """TimerTask views of the running, unpaused timers whose time is up by now"""
+        now = self.clock.monotonic() if now is None else now
+        wanted = FLAG_LIVE | FLAG_RUNNING
+        if np is not None:
+            flags = np.array(self.flags, dtype=np.uint8)
+            mask = (flags & (wanted | FLAG_PAUSED | FLAG_COMPLETED)) == wanted
+            mask &= self._remaining_np(now) <= _EPSILON
+            expired = [self.views[slot] for slot in np.flatnonzero(mask).tolist()]
+        else:
+            remaining = self._remaining_columns(now)
+            expired = [
+                self.views[slot]
+                for slot, flags in enumerate(self.flags)
+                if flags & (wanted | FLAG_PAUSED | FLAG_COMPLETED) == wanted
+                and remaining[slot] <= _EPSILON
+            ]
+
+        if self.groups.count(None) != len(self.groups):
+            # Group members follow their group's clock and bulk state
+            expired = [timer for timer in expired if timer.group is None]
+            for slot, group in enumerate(self.groups):
+                if group is None:
+                    continue
+                timer = self.views[slot]
+                if (timer.is_running and not timer.is_paused and not timer.is_completed
+                        and not group.frozen and timer.remaining_time(now) <= _EPSILON):
+                    expired.append(timer)
+        return expired
+
+    def _remaining_np(self, now):
+        # Copies, not frombuffer views: an exported buffer would stop the arrays from growing
+        flags = np.array(self.flags, dtype=np.uint8)
+        deadline = np.array(self.deadline, dtype=np.float64)
+        paused_at = np.array(self.paused_at, dtype=np.float64)
+        derived = (
+            deadline
+            + np.array(self.paused_total, dtype=np.float64)
+            - np.where(np.isnan(paused_at), now, paused_at)
+        )
+        stored = ((flags & FLAG_TICK) != 0) | np.isnan(deadline)
+        result = np.where(stored, np.array(self.remaining, dtype=np.float64), derived)
+        result[(flags & FLAG_LIVE) == 0] = np.nan
+        return result
+
+def _flag_property(flag, doc):
+    def getter(self):
+        return bool(self._columns()[0] & flag)
+
+    def setter(self, value):
+        flags = self._store.flags
+        if value:
+            flags[self._slot] |= flag
+        else:
+            flags[self._slot] &= ~flag & 0xFF
+
+    return property(getter, setter, doc=doc)
+
+def _column_property(column, index, doc):
+    # NaN in the column reads as None
+    def getter(self):
+        value = self._columns()[index]
+        return None if value != value else value
+
+    def setter(self, value):
+        getattr(self._store, column)[self._slot] = _NAN if value is None else value
+
+    return property(getter, setter, doc=doc)
+
+# Timers that are not given a store share this one
+default_store = TimerStore()
+
+class TimerTask:
+    """Individual timer task class
+
+    A lightweight view over one slot of a TimerStore; all state lives in the
+    store's arrays. deadline, paused_at and end_time() are on the timer's
+    clock: the store's clock for ungrouped timers, the group clock for
+    members of a TimerGroup. Methods taking now expect the store clock's
+    monotonic time, except the scheduler hooks next_tick() and tick().
+    """
+    __slots__ = ('_store', '_slot')
+
+    def __init__(self, name, hours, minutes, seconds, task_id=None, mode=MODE_DEADLINE, store=None):
+        total = hours * 3600 + minutes * 60 + seconds
+        if mode == MODE_PRECISE:
+            total = round(total, 3)
+        elif total != int(total):
+            raise ValueError(f"{mode} timers count whole seconds; use {MODE_PRECISE!r} mode")
+        self._store = default_store if store is None else store
+        # 48 random bits: short enough to display, no collisions at 100k+ timers
+        self._slot = self._store.allocate(
+            self,
+            task_id or uuid.uuid4().hex[:12],
+            name,
+            total,
+            FLAG_TICK if mode == MODE_TICK else FLAG_PRECISE if mode == MODE_PRECISE else 0
+        )
+
+    @classmethod
+    def _view(cls, store, slot):
+        """View over a slot that is already filled in; see TimerStore.allocate_many()"""
+        timer = cls.__new__(cls)
+        timer._store = store
+        timer._slot = slot
+        return timer
+
+    is_running = _flag_property(FLAG_RUNNING, "Counting down or paused")
+    is_paused = _flag_property(FLAG_PAUSED, "Frozen while running")
+    is_completed = _flag_property(FLAG_COMPLETED, "Reached zero")
+
+    # Deadline mode state: end time and time spent paused, on the timer's clock
+    deadline = _column_property('deadline', 1, "End time before pauses, or None")
+    paused_at = _column_property('paused_at', 2, "Time of the current pause, or None")
+
+    def _columns(self):
+        """(flags, deadline, paused_at, paused_total, remaining) as seen by readers
+
+        A group member that still follows its group's bulk state has nothing
+        of its own in the slot; its values are derived from the group.
+        """
+        store, slot = self._store, self._slot
+        group = store.groups[slot]
+        if group is None or store.epochs[slot] == group.epoch:
+            return (
+                store.flags[slot],
+                store.deadline[slot],
+                store.paused_at[slot],
+                store.paused_total[slot],
+                store.remaining[slot]
+            )
+        total = store.total[slot]
+        if group.bulk_start is None:
+            return FLAG_LIVE, _NAN, _NAN, 0.0, total
+        return FLAG_LIVE | FLAG_RUNNING, group.bulk_start + total, _NAN, 0.0, total
+
+    def _clock(self, now=None):
+        """Current time on this timer's clock"""
+        group = self._store.groups[self._slot]
+        if group is not None:
+            return group.clock(now)
+        return self._store.clock.monotonic() if now is None else now
+
+    def _rebase(self, group, now):
+        """Move the timer onto another clock, keeping its state and time left"""
+        remaining = 0 if self.is_completed else self.remaining_time(now)
+        running, paused = self.is_running, self.is_paused
+        self._store.groups[self._slot] = group
+        self.remaining_seconds = remaining
+        if running:
+            self.start(now)
+            if paused:
+                self.pause(now)
+
+    @property
+    def group(self):
+        """The TimerGroup this timer belongs to, or None"""
+        return self._store.groups[self._slot]
+
+    @property
+    def frozen(self):
+        """Running, but held by a paused group"""
+        group = self._store.groups[self._slot]
+        return group is not None and group.frozen_at is not None and self.is_running
+
+    @property
+    def id(self):
+        return self._store.ids[self._slot]
+
+    @property
+    def name(self):
+        return self._store.names[self._slot]
+
+    @name.setter
+    def name(self, value):
+        self._store.names[self._slot] = value
+
+    @property
+    def mode(self):
+        flags = self._store.flags[self._slot]
+        if flags & FLAG_TICK:
+            return MODE_TICK
+        return MODE_PRECISE if flags & FLAG_PRECISE else MODE_DEADLINE
+
+    @property
+    def total_seconds(self):
+        """Duration in seconds; an int unless the timer has a millisecond part"""
+        total = self._store.total[self._slot]
+        return int(total) if total.is_integer() else total
+
+    @total_seconds.setter
+    def total_seconds(self, value):
+        self._store.total[self._slot] = value
+
+    @property
+    def recurrence(self):
+        """Recurrence rule (see timer_schedule) of a repeating timer, or None"""
+        return self._store.rules[self._slot]
+
+    @recurrence.setter
+    def recurrence(self, rule):
+        self._store.rules[self._slot] = rule
+
+    @property
+    def hooks(self):
+        """Completion hooks, run by a timer_hooks.HookRunner each time the timer completes"""
+        return self._store.hooks[self._slot] or ()
+
+    @hooks.setter
+    def hooks(self, hooks):
+        self._store.hooks[self._slot] = tuple(hooks) or None
+
+    def on_complete(self, hook):
+        """Add a completion hook, a callable taking (snapshot, timeout); returns it"""
+        self.hooks = self.hooks + (hook,)
+        return hook
+
+    @property
+    def after(self):
+        """Ids of the timers that must complete before the engine starts this one"""
+        return self._store.after[self._slot] or ()
+
+    @after.setter
+    def after(self, timer_ids):
+        # Set before the timer is added; afterwards TimerEngine.set_dependencies().
+        # Repeats dropped, order kept
+        self._store.after[self._slot] = tuple(dict.fromkeys(timer_ids)) or None
+
+    @property
+    def created_time(self):
+        return datetime.fromtimestamp(self._store.created[self._slot])
+
+    @property
+    def paused_total(self):
+        return self._columns()[3]
+
+    @paused_total.setter
+    def paused_total(self, value):
+        self._store.paused_total[self._slot] = value
+
+    @property
+    def remaining_seconds(self):
+        """Whole seconds left, as shown on the display"""
+        flags, deadline, _, _, remaining = self._columns()
+        if flags & FLAG_TICK or deadline != deadline:
+            return math.ceil(remaining)
+        return max(0, math.ceil(self.remaining_time() - _EPSILON))
+
+    @property
+    def remaining_ms(self):
+        """Whole milliseconds left, as a precise timer shows them"""
+        return max(0, math.ceil((self.remaining_time() - _EPSILON) * 1000))
+
+    @remaining_seconds.setter
+    def remaining_seconds(self, value):
+        store, slot = self._store, self._slot
+        store.remaining[slot] = value
+        store.deadline[slot] = _NAN
+        store.paused_at[slot] = _NAN
+        store.paused_total[slot] = 0.0
+
+    @property
+    def state(self):
+        """One of 'idle', 'running', 'paused' or 'completed'; see also frozen"""
+        flags = self._columns()[0]
+        if flags & FLAG_COMPLETED:
+            return STATE_COMPLETED
+        if flags & FLAG_RUNNING:
+            return STATE_PAUSED if flags & FLAG_PAUSED else STATE_RUNNING
+        return STATE_IDLE
+
+    def detach(self):
+        """Move this timer into a private store and free its shared slot
+
+        Called when an engine deletes the timer, so views the UI still holds
+        stay readable while the slot is reused.
+        """
+        store, slot = self._store, self._slot
+        private = TimerStore(store.clock)
+        private_slot = private.allocate(self, store.ids[slot], store.names[slot], store.total[slot], 0)
+        for column in ('deadline', 'paused_at', 'paused_total', 'remaining', 'created', 'flags'):
+            getattr(private, column)[private_slot] = getattr(store, column)[slot]
+        private.rules[private_slot] = store.rules[slot]
+        private.hooks[private_slot] = store.hooks[slot]
+        private.after[private_slot] = store.after[slot]
+        store.release(slot)
+        self._store, self._slot = private, private_slot
+
+    def snapshot(self):
+        """Immutable copy of the values a view needs; a paused group shows as 'paused'"""
+        group = self.group
+        return TimerSnapshot(
+            self.id,
+            self.name,
+            self.total_seconds,
+            self.remaining_seconds,
+            STATE_PAUSED if self.frozen else self.state,
+            group.name if group is not None else None
+        )
+
+    def end_time(self):
+        """Time on the timer's clock at which the countdown reaches zero"""
+        _, deadline, _, paused_total, _ = self._columns()
+        return deadline + paused_total
+
+    def remaining_time(self, now=None):
+        """Exact time left in seconds"""
+        flags, deadline, paused_at, paused_total, remaining = self._columns()
+        if flags & FLAG_TICK or deadline != deadline:
+            return remaining
+        if paused_at == paused_at:
+            return deadline + paused_total - paused_at
+        return deadline + paused_total - self._clock(now)
+
+    def start(self, now=None):
+        """Start counting down from the current remaining time"""
+        now = self._clock(now)
+        self.is_running = True
+        self.is_paused = False
+        if self.mode != MODE_TICK:
+            self.deadline = now + self._store.remaining[self._slot]
+            self.paused_at = None
+            self.paused_total = 0.0
+
+    def begin_cycle(self, start, duration):
+        """Start a new countdown of duration seconds at start on the timer's clock
+
+        Used for recurring timers, whose cycles can differ in length (cron)
+        and start at the previous cycle's end rather than now (intervals).
+        """
+        store, slot = self._store, self._slot
+        whole = math.ceil(duration - _EPSILON)
+        store.total[slot] = round(duration, 3) if store.flags[slot] & FLAG_PRECISE else whole
+        store.paused_at[slot] = _NAN
+        store.paused_total[slot] = 0.0
+        if self.mode != MODE_TICK:
+            store.remaining[slot] = duration
+            store.deadline[slot] = start + duration
+        else:
+            # Tick mode counts whole seconds
+            store.remaining[slot] = whole
+            store.deadline[slot] = _NAN
+        store.flags[slot] = (store.flags[slot] | FLAG_RUNNING) & ~(FLAG_PAUSED | FLAG_COMPLETED) & 0xFF
+
+    def pause(self, now=None):
+        """Freeze the countdown"""
+        self.is_paused = True
+        if self.mode != MODE_TICK:
+            self.paused_at = self._clock(now)
+
+    def resume(self, now=None):
+        """Continue a paused countdown; the pause is added to paused_total"""
+        self.is_paused = False
+        if self.mode != MODE_TICK and self.paused_at is not None:
+            self.paused_total += self._clock(now) - self.paused_at
+            self.paused_at = None
+
+    def next_tick(self, now):
+        """Time of the next display change after now, both on the timer's clock"""
+        if self.mode == MODE_TICK:
+            return now + 1.0
+        left = math.ceil(self.end_time() - now - _EPSILON)
+        if left <= 0:
+            return now
+        return self.end_time() - (left - 1)
+
+    def tick(self, at):
+        """Advance the countdown at a scheduled tick; return the next tick or None when done"""
+        if self.mode == MODE_TICK:
+            remaining = self._store.remaining
+            remaining[self._slot] -= 1
+            return at + 1.0 if remaining[self._slot] > 0 else None
+        # Nothing to update: the remaining time is derived from the deadline
+        if self.end_time() - at <= _EPSILON:
+            return None
+        return self.next_tick(at)
+
+class HeapTimerQueue:
+    """Default timer storage: a binary heap with lazy cancellation"""
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, timer, deadline):
+        """Arm a timer at deadline, replacing any pending entry"""
+        seq = next(self._counter)
+        self._entries[timer.id] = seq
+        heapq.heappush(self._heap, (deadline, seq, timer))
+        # Cancelled entries are only skipped when they surface; rebuild if they pile up
+        if len(self._heap) > 2 * len(self._entries) + 1024:
+            self._heap = [entry for entry in self._heap if self._entries.get(entry[2].id) == entry[1]]
+            heapq.heapify(self._heap)
+
+    def push_many(self, entries):
+        """Arm many (timer, deadline) pairs with a single heapify"""
+        for timer, deadline in entries:
+            seq = next(self._counter)
+            self._entries[timer.id] = seq
+            self._heap.append((deadline, seq, timer))
+        heapq.heapify(self._heap)
+
+    def cancel(self, timer):
+        """Drop the pending entry of a timer; the heap entry is skipped lazily"""
+        self._entries.pop(timer.id, None)
+
+    def next_deadline(self):
+        """Earliest pending deadline, or None when empty"""
+        heap = self._heap
+        while heap and self._entries.get(heap[0][2].id) != heap[0][1]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_due(self, now):
+        """Remove and return the (deadline, timer) pairs due by now, in deadline order"""
+        heap = self._heap
+        due = []
+        while heap and heap[0][0] <= now:
+            deadline, seq, timer = heapq.heappop(heap)
+            if self._entries.get(timer.id) == seq:
+                del self._entries[timer.id]
+                due.append((deadline, timer))
+        return due
+
+class TimerGroup:
+    """Named set of timers sharing a clock, for constant-time bulk operations
+
+    Members keep their deadlines on the group clock, which runs at the
+    engine clock's monotonic() - offset and stands still while the group is paused,
+    so pausing or resuming the group touches no member. Reset bumps the
+    group epoch: every member whose slot epoch differs follows the group's
+    bulk state instead of its own, idle at full duration or running since
+    bulk_start. A member is only written back (materialized) when it is
+    changed on its own or its bulk deadline passes.
+
+    The engine keeps one entry per group in its timer queue. Materialized
+    running members wait in the group's own queue; bulk members complete
+    in order of duration through a cursor over the member list, which is
+    sorted at a bulk start only if membership changed since the last one.
+    """
+    def __init__(self, name, base_clock=None):
+        self.name = name
+        # Clock the group clock is offset from, the engine's
+        self.base_clock = default_clock if base_clock is None else base_clock
+        # Key of the group's entry in the engine queue; timer ids are plain hex
+        self.id = f"group:{name}"
+        self.members = {}
+        self.own = set()
+        self.epoch = 1
+        self.offset = 0.0
+        self.frozen_at = None
+        self.bulk_start = None
+        self.queue = HeapTimerQueue()
+        # Engine deadline the group entry is armed for, None when unarmed
+        self.armed_at = None
+        # Members sorted by duration for the bulk cursor, rebuilt at a bulk
+        # start when membership changed since; gone members are skipped
+        self._order = []
+        self._order_stale = False
+        self._cursor = 0
+        self._next_bulk_tick = None
+
+    @property
+    def frozen(self):
+        return self.frozen_at is not None
+
+    def clock(self, now=None):
+        """Current group time for a monotonic now on the base clock"""
+        if self.frozen_at is not None:
+            return self.frozen_at
+        return (self.base_clock.monotonic() if now is None else now) - self.offset
+
+    def freeze(self, now):
+        if self.frozen_at is None:
+            self.frozen_at = now - self.offset
+
+    def thaw(self, now):
+        if self.frozen_at is not None:
+            self.offset = now - self.frozen_at
+            self.frozen_at = None
+
+    # Membership
+
+    def add(self, timer, now):
+        """Put an ungrouped timer on the group clock, keeping its state"""
+        store, slot = timer._store, timer._slot
+        self.members[timer.id] = timer
+        self._order_stale = True
+        if (self.bulk_start is None
+                and not store.flags[slot] & (FLAG_RUNNING | FLAG_COMPLETED)
+                and store.remaining[slot] == store.total[slot]):
+            # Idle at full duration is exactly the bulk state; nothing to store
+            store.groups[slot] = self
+            store.epochs[slot] = 0
+            return
+        timer._rebase(self, now)
+        store.epochs[slot] = self.epoch
+        self.own.add(timer.id)
+
+    def remove(self, timer, now):
+        """Take a timer off the group clock, keeping its state"""
+        self.materialize(timer)
+        del self.members[timer.id]
+        self.own.discard(timer.id)
+        self.queue.cancel(timer)
+        self._order_stale = True
+        timer._rebase(None, now)
+
+    def materialize(self, timer):
+        """Write a bulk member's derived state into its slot; True if it was bulk"""
+        store, slot = timer._store, timer._slot
+        if store.epochs[slot] == self.epoch:
+            return False
+        flags, deadline, paused_at, paused_total, remaining = timer._columns()
+        tick = store.flags[slot] & FLAG_TICK
+        if tick and flags & FLAG_RUNNING:
+            # Tick mode counts whole seconds instead of keeping a deadline
+            remaining = max(0, math.ceil(deadline - self.clock() - _EPSILON))
+            deadline = _NAN
+        store.flags[slot] = flags | tick
+        store.deadline[slot] = deadline
+        store.paused_at[slot] = paused_at
+        store.paused_total[slot] = paused_total
+        store.remaining[slot] = remaining
+        store.epochs[slot] = self.epoch
+        self.own.add(timer.id)
+        return True
+
+    # Bulk state
+
+    def reset(self, now):
+        """Every member back to idle at full duration, in O(1)"""
+        self.epoch += 1
+        self.own = set()
+        self.queue = HeapTimerQueue()
+        self.bulk_start = None
+        self._next_bulk_tick = None
+        self.thaw(now)
+
+    def start(self, now):
+        """Start the bulk members together; returns the idle members started on their own"""
+        started = []
+        if self.bulk_start is None:
+            if self._order_stale:
+                self._order = sorted(self.members.values(), key=lambda timer: timer.total_seconds)
+                self._order_stale = False
+            self.bulk_start = self.clock(now)
+            self._cursor = 0
+            self._next_bulk_tick = self.bulk_start + 1.0
+        for timer_id in self.own:
+            timer = self.members[timer_id]
+            if not timer.is_running and not timer.is_completed:
+                started.append(timer)
+        return started
+
+    def _next_bulk(self):
+        """The bulk member that completes next, skipping ones gone or materialized"""
+        order = self._order
+        while self._cursor < len(order):
+            timer = order[self._cursor]
+            if self.members.get(timer.id) is timer and timer._store.epochs[timer._slot] != self.epoch:
+                return timer
+            self._cursor += 1
+        return None
+
+    def next_deadline(self, tick_events):
+        """Earliest group time anything in the group is due, or None"""
+        deadline = self.queue.next_deadline()
+        if self.bulk_start is not None:
+            timer = self._next_bulk()
+            if timer is not None:
+                due = self.bulk_start + timer.total_seconds
+                if tick_events:
+                    due = min(due, self._next_bulk_tick)
+                deadline = due if deadline is None else min(deadline, due)
+        return deadline
+
+    def pop_bulk_due(self, at):
+        """Materialize and return the bulk members whose time is up at group time at"""
+        done = []
+        if self.bulk_start is None:
+            return done
+        while True:
+            timer = self._next_bulk()
+            if timer is None or self.bulk_start + timer.total_seconds - at > _EPSILON:
+                return done
+            self.materialize(timer)
+            self._cursor += 1
+            done.append(timer)
+
+    def pop_bulk_tick(self, at):
+        """True once per displayed-second change of the bulk members"""
+        if self._next_bulk_tick is None or self._next_bulk_tick - at > _EPSILON:
+            return False
+        self._next_bulk_tick = self.bulk_start + math.floor(at - self.bulk_start + _EPSILON) + 1.0
+        return self._next_bulk() is not None
+
+# Lock-free snapshot() attempts before the read is run on the scheduler thread
+SNAPSHOT_RETRIES = 3
+
+_STOP = object()
+
+class _Command:
+    """One engine call waiting for the scheduler thread"""
+    __slots__ = ('method', 'args', 'kwargs', 'done', 'result', 'error', 'events')
+
+    def __init__(self, method, args, kwargs):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        # Held until the scheduler thread has run the call; lighter than an Event
+        self.done = threading.Lock()
+        self.done.acquire()
+        self.result = None
+        self.error = None
+        self.events = []
+
+def _command(method):
+    """Run an engine method on the scheduler thread, the only writer of timer state"""
+    @functools.wraps(method)
+    def call(self, *args, **kwargs):
+        if self._closed:
+            return method(self, *args, **kwargs)
+        if threading.current_thread() is self._thread:
+            # From a listener, which runs between writes; see _emit()
+            return self._write(method, args, kwargs)
+        return self._submit(method, args, kwargs)
+    return call
+
+class TimerEngine:
+    """Owns all TimerTask objects and drives them from one scheduler thread
+
+    Running timers sit in a timer queue keyed by their next deadline; the
+    thread sleeps until the earliest one. The queue is a HeapTimerQueue
+    unless another storage such as timer_wheel.TimingWheel is passed in.
+    With tick_events off only completions are scheduled, which is what
+    large headless populations want; set_tick_events() switches them while
+    timers run, e.g. while nobody can see the ticks. Timers can be put in named groups
+    (see TimerGroup) that start, pause, resume and reset in constant time.
+
+    Listeners registered with subscribe() receive (event, timer) for
+    'added', 'restored', 'grouped', 'linked', 'started', 'paused',
+    'resumed', 'reset', 'deleted', 'tick' and 'completed', and (event, group) for
+    'group_started', 'group_paused', 'group_resumed', 'group_reset' and
+    'group_tick'; group operations emit no per-timer events. Tick and
+    completion events, and 'started' for a timer whose predecessors have
+    just completed, are emitted from the scheduler thread, the others
+    from the calling thread.
+
+    Timer state has a single writer. Every change runs on the scheduler
+    thread: called from any other thread, the public methods queue a
+    command and wait for it, so no lock is held while the thread fires
+    timers, and commands run between its batches. snapshot() reads
+    without a lock or a round trip unless the thread was busy writing.
+    A TimerTask's own properties read the live columns one at a time.
+
+    Timers whose after lists other timers (see timer_dag) are started by
+    the engine once those have all completed; start_all() leaves them to
+    it.
+
+    Time comes from clock (see timer_clock), real monotonic time unless a
+    VirtualClock is passed in; then timers only come due when the clock is
+    advanced, and the timers added must live in a store on the same clock.
+    """
+    def __init__(self, timer_queue=None, tick_events=True, clock=None):
+        self.clock = default_clock if clock is None else clock
+        self.timers = {}
+        self.groups = {}
+        self.active = set()
+        self.dependencies = DependencyGraph()
+        self.tick_events = tick_events
+        self._listeners = []
+        self._queue = timer_queue if timer_queue is not None else HeapTimerQueue()
+        # Calls from other threads, run in order by the scheduler thread
+        self._commands = queue.SimpleQueue()
+        # Events of the running command, handed back to its caller
+        self._events = None
+        # Odd while the scheduler thread is changing state; see snapshot()
+        self._version = 0
+        self._closed = False
+        # How late the scheduler thread fires deadlines; written by that thread only
+        self.lateness = Histogram(
+            'countdown_fire_lateness_seconds',
+            "Delay between a queued deadline and the scheduler firing it"
+        )
+        self._thread = threading.Thread(target=self._run, name="timer-engine")
+        self._thread.daemon = True
+        if self.clock.virtual:
+            self.clock.attach(self)
+        self._thread.start()
+
+    # Events
+
+    def subscribe(self, callback):
+        """Register callback(event, timer) for every engine event
+
+        Callbacks on the scheduler thread run between writes, not inside
+        one, but must still not wait for another thread: it may be waiting
+        for a command. Hand such work over through a queue that thread
+        polls, as the tkinter view does.
+        """
+        self._listeners.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._listeners.remove(callback)
+
+    def _emit(self, event, timer):
+        if self._events is not None:
+            # Delivered on the caller's thread once its command is done
+            self._events.append((event, timer))
+            return
+        # On the scheduler thread, in the middle of firing timers. The write
+        # is closed while listeners run, so that one waiting for a thread
+        # that is reading, e.g. through snapshot(), cannot wait forever
+        writing = self._version & 1
+        self._version += writing
+        try:
+            for callback in self._listeners:
+                callback(event, timer)
+        finally:
+            self._version += writing
+
+    def _write(self, method, args, kwargs):
+        """Run a command inline on the scheduler thread, as one write"""
+        if self._version & 1:
+            return method(self, *args, **kwargs)
+        self._version += 1
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._version += 1
+
+    # Commands
+
+    def _submit(self, method, args, kwargs):
+        """Queue a call for the scheduler thread, wait for it and emit its events here"""
+        command = _Command(method, args, kwargs)
+        self._commands.put(command)
+        while not command.done.acquire(timeout=0.5):
+            if not self._thread.is_alive():
+                if command.done.acquire(blocking=False):
+                    break
+                # Queued behind close(); nothing else writes any more
+                return method(self, *args, **kwargs)
+        for event, timer in command.events:
+            self._emit(event, timer)
+        if command.error is not None:
+            raise command.error
+        return command.result
+
+    def _execute(self, command):
+        self._events = command.events
+        self._version += 1
+        try:
+            command.result = command.method(self, *command.args, **command.kwargs)
+        except BaseException as e:
+            command.error = e
+        finally:
+            self._version += 1
+            self._events = None
+            command.done.release()
+
+    def _run_commands(self):
+        """Run every queued command; False once close() was called"""
+        commands = self._commands
+        while True:
+            try:
+                command = commands.get_nowait()
+            except queue.Empty:
+                return True
+            if command is _STOP:
+                return False
+            self._execute(command)
+
+    @_command
+    def call(self, function, *args):
+        """Run function(*args) on the scheduler thread as one command and return its result
+
+        For work that must not interleave with the thread's writes, such as
+        creating TimerTasks in the store the engine's timers live in from
+        another thread (see timer_daemon). Engine methods it calls run inline.
+        """
+        return function(*args)
+
+    # Timer operations
+
+    @_command
+    def add(self, timer, group=None):
+        """Register a TimerTask with the engine, optionally in a named group"""
+        if timer.id in self.timers:
+            raise ValueError(f"duplicate timer id: {timer.id}")
+        self._check_clock((timer,))
+        links = self._check_links((timer,))
+        self.timers[timer.id] = timer
+        if group is not None:
+            self._group(group).add(timer, self.clock.monotonic())
+        self._link(links)
+        self._emit('added', timer)
+        return timer
+
+    @_command
+    def add_many(self, timers, group=None):
+        """Register a batch of new timers in one command on the scheduler thread
+
+        The whole batch is rejected with ValueError if any id is already
+        taken or repeated. Each timer still gets its own 'added' event.
+        """
+        timers = list(timers)
+        ids = {timer.id for timer in timers}
+        if len(ids) != len(timers) or not ids.isdisjoint(self.timers):
+            raise ValueError("duplicate timer id in batch")
+        self._check_clock(timers)
+        links = self._check_links(timers)
+        now = self.clock.monotonic()
+        target = self._group(group) if group is not None else None
+        for timer in timers:
+            self.timers[timer.id] = timer
+            if target is not None:
+                target.add(timer, now)
+        self._link(links)
+        for timer in timers:
+            self._emit('added', timer)
+        return timers
+
+    @_command
+    def restore(self, timers):
+        """Register timers that already carry their state, e.g. from a journal
+
+        Running timers are armed in one batch (a single heapify for the
+        default queue), and every timer is announced with a 'restored' event.
+        """
+        timers = list(timers)
+        self._check_clock(timers)
+        links = self._check_links(timers)
+        now = self.clock.monotonic()
+        registered = self.timers
+        armed = []
+        for timer in timers:
+            timer_id = timer.id
+            if timer_id in registered:
+                raise ValueError(f"duplicate timer id: {timer_id}")
+            registered[timer_id] = timer
+            flags = timer._columns()[0]
+            if flags & FLAG_RUNNING:
+                self.active.add(timer_id)
+                if not flags & FLAG_PAUSED:
+                    armed.append((timer, self._next_fire(timer, now)))
+        self._queue.push_many(armed)
+        self._link(links)
+        dependencies = self.dependencies
+        if dependencies.successors:
+            # Completed before the restart; what they started has its own state
+            for timer in timers:
+                if timer.is_completed:
+                    dependencies.completed(timer.id)
+
+        for timer in timers:
+            self._emit('restored', timer)
+        return timers
+
+    @_command
+    def start(self, timer_id):
+        """Start an idle or completed timer; completed ones restart from full"""
+        timer = self.timers[timer_id]
+        self._own(timer)
+        if timer.is_running:
+            return timer
+        if timer.is_completed:
+            timer.is_completed = False
+            timer.remaining_seconds = timer.total_seconds
+
+        rule = timer.recurrence
+        duration = rule.first_duration(self.clock.time()) if rule is not None else None
+        if duration is not None:
+            # Calendar schedules count down to their next matching time
+            timer.begin_cycle(timer._clock(), duration)
+        else:
+            timer.start()
+        self.active.add(timer.id)
+        self._schedule(timer)
+        self.dependencies.rearm(timer.id)
+        self._emit('started', timer)
+        return timer
+
+    @_command
+    def pause(self, timer_id):
+        """Pause a running timer; paused timers leave the timer queue entirely"""
+        timer = self.timers[timer_id]
+        self._own(timer)
+        if timer.is_running and not timer.is_paused:
+            timer.pause()
+            self._cancel(timer)
+            self._emit('paused', timer)
+        return timer
+
+    @_command
+    def resume(self, timer_id):
+        """Continue a paused timer"""
+        timer = self.timers[timer_id]
+        self._own(timer)
+        if timer.is_running and timer.is_paused:
+            timer.resume()
+            self._schedule(timer)
+            self._emit('resumed', timer)
+        return timer
+
+    @_command
+    def reset(self, timer_id):
+        """Stop a timer and restore its full duration"""
+        timer = self.timers[timer_id]
+        self._own(timer)
+        timer.is_running = False
+        timer.is_paused = False
+        timer.is_completed = False
+        timer.remaining_seconds = timer.total_seconds
+        self.active.discard(timer.id)
+        self._cancel(timer)
+        self.dependencies.rearm(timer.id)
+        self._emit('reset', timer)
+        return timer
+
+    @_command
+    def delete(self, timer_id):
+        """Stop and forget a timer"""
+        timer = self.timers.pop(timer_id)
+        group = timer.group
+        if group is not None:
+            group.remove(timer, self.clock.monotonic())
+        else:
+            self._cancel(timer)
+        timer.is_running = False
+        self.active.discard(timer.id)
+        # The slot goes back to the store; the view keeps its last state
+        timer.detach()
+        self._emit('deleted', timer)
+        for successor_id in self.dependencies.forget(timer_id):
+            successor = self.timers[successor_id]
+            successor.after = self.dependencies.predecessors.get(successor_id, ())
+            self._emit('linked', successor)
+        return timer
+
+    # Dependencies
+
+    def _check_links(self, timers):
+        """Validate the after of new timers; returns {id: after} for those with one"""
+        links = {}
+        for timer in timers:
+            after = timer._store.after[timer._slot]
+            if after:
+                links[timer.id] = after
+        if links:
+            self.dependencies.check(links)
+        return links
+
+    def _link(self, links):
+        is_completed = self._is_completed
+        for timer_id, after in links.items():
+            self.dependencies.link(timer_id, after, is_completed)
+
+    def _is_completed(self, timer_id):
+        timer = self.timers.get(timer_id)
+        return timer is not None and timer.is_completed
+
+    @_command
+    def set_dependencies(self, timer_id, after):
+        """Make a timer wait for the timers in after, replacing what it waited for
+
+        Raises KeyError for unknown ids and ValueError if the edges would
+        close a cycle. Predecessors that already completed count as done;
+        nothing is started here even if none is left to wait for.
+        """
+        timer = self.timers[timer_id]
+        after = tuple(dict.fromkeys(after))
+        for predecessor in after:
+            if predecessor not in self.timers:
+                raise KeyError(predecessor)
+        self.dependencies.check({timer_id: after})
+        timer.after = after
+        self.dependencies.link(timer_id, after, self._is_completed)
+        self._emit('linked', timer)
+        return timer
+
+    def _check_clock(self, timers):
+        clock = self.clock
+        for timer in timers:
+            if timer._store.clock is not clock:
+                raise ValueError(f"timer {timer.id} counts on another clock than the engine")
+
+    # Groups
+
+    def _group(self, name):
+        group = self.groups.get(name)
+        if group is None:
+            group = self.groups[name] = TimerGroup(name, self.clock)
+        return group
+
+    @_command
+    def set_group(self, timer_ids, name):
+        """Move timers into the named group, or out of any group with None
+
+        Running timers keep counting down; each moved timer gets a 'grouped'
+        event.
+        """
+        now = self.clock.monotonic()
+        target = self._group(name) if name is not None else None
+        moved = []
+        for timer_id in timer_ids:
+            timer = self.timers[timer_id]
+            current = timer.group
+            if current is target:
+                continue
+            if current is not None:
+                current.remove(timer, now)
+            else:
+                self._cancel(timer)
+            if target is not None:
+                target.add(timer, now)
+            if timer.is_running and not timer.is_paused:
+                self._schedule(timer)
+            moved.append(timer)
+        for timer in moved:
+            self._emit('grouped', timer)
+        return moved
+
+    @_command
+    def start_group(self, name):
+        """Start every idle member of a group not waiting for predecessors; bulk members start in O(1)"""
+        group = self.groups[name]
+        now = self.clock.monotonic()
+        group.thaw(now)
+        was_idle = group.bulk_start is None
+        dependencies = self.dependencies
+        if was_idle:
+            # Waiting members stay out of the bulk start, idle on their own;
+            # the engine starts them when their predecessors complete
+            members = group.members
+            for timer_id, waiting in dependencies.waiting.items():
+                if waiting and timer_id in members:
+                    group.materialize(members[timer_id])
+        ready = dependencies.ready
+        for timer in group.start(now):
+            if not ready(timer.id):
+                continue
+            timer.start(now)
+            self.active.add(timer.id)
+            self._schedule(timer)
+        if was_idle:
+            self.active.update(group.members.keys() - group.own)
+        self._arm_group(group)
+        self._emit('group_started', group)
+        return group
+
+    @_command
+    def pause_group(self, name):
+        """Stop the group clock; members keep their own state"""
+        group = self.groups[name]
+        if not group.frozen:
+            group.freeze(self.clock.monotonic())
+            self._arm_group(group)
+            self._emit('group_paused', group)
+        return group
+
+    @_command
+    def resume_group(self, name):
+        """Restart the group clock; individually paused members stay paused"""
+        group = self.groups[name]
+        if group.frozen:
+            group.thaw(self.clock.monotonic())
+            self._arm_group(group)
+            self._emit('group_resumed', group)
+        return group
+
+    @_command
+    def reset_group(self, name):
+        """Return every member to idle at full duration in O(1)"""
+        group = self.groups[name]
+        group.reset(self.clock.monotonic())
+        if group.armed_at is not None:
+            self._queue.cancel(group)
+            group.armed_at = None
+        self.active.difference_update(group.members)
+        dependencies = self.dependencies
+        for timer_id in [timer_id for timer_id in dependencies.done if timer_id in group.members]:
+            dependencies.rearm(timer_id)
+        self._emit('group_reset', group)
+        return group
+
+    # All timers: group operations for groups, per-timer ones for the rest
+
+    @_command
+    def start_all(self):
+        """Start every idle timer, except those waiting for predecessors"""
+        for name in list(self.groups):
+            self.start_group(name)
+        ready = self.dependencies.ready
+        for timer in list(self.timers.values()):
+            if (timer.group is None and not timer.is_running and not timer.is_completed
+                    and ready(timer.id)):
+                self.start(timer.id)
+
+    @_command
+    def pause_all(self):
+        """Pause everything that is counting down; returns True if anything was"""
+        paused = False
+        for group in list(self.groups.values()):
+            if not group.frozen and self._group_running(group):
+                self.pause_group(group.name)
+                paused = True
+        for timer in list(self.timers.values()):
+            if timer.group is None and timer.is_running and not timer.is_paused:
+                self.pause(timer.id)
+                paused = True
+        return paused
+
+    @_command
+    def resume_all(self):
+        """Resume every paused group and every individually paused timer"""
+        for group in list(self.groups.values()):
+            self.resume_group(group.name)
+            for timer_id in list(group.own):
+                timer = self.timers[timer_id]
+                if timer.is_running and timer.is_paused:
+                    self.resume(timer_id)
+        for timer in list(self.timers.values()):
+            if timer.group is None and timer.is_running and timer.is_paused:
+                self.resume(timer.id)
+
+    @_command
+    def reset_all(self):
+        """Reset every timer"""
+        for name in list(self.groups):
+            self.reset_group(name)
+        for timer in list(self.timers.values()):
+            if timer.group is None:
+                self.reset(timer.id)
+
+    def _group_running(self, group):
+        if len(group.queue):
+            return True
+        return group.bulk_start is not None and group._next_bulk() is not None
+
+    def snapshot(self, timer_id=None):
+        """Immutable view of one timer, or a list of all of them
+
+        Read without a lock: the view is kept only if no write started or
+        ended while it was taken, like a seqlock. After SNAPSHOT_RETRIES
+        overlapping writes it is taken on the scheduler thread instead.
+        """
+        if threading.current_thread() is self._thread or self._closed:
+            return self._read_snapshot(timer_id)
+        for _ in range(SNAPSHOT_RETRIES):
+            version = self._version
+            if version & 1:
+                time.sleep(0)
+                continue
+            try:
+                result = self._read_snapshot(timer_id)
+            except RuntimeError:
+                # self.timers changed size while being listed
+                continue
+            if self._version == version:
+                return result
+        return self._submit(TimerEngine._read_snapshot, (timer_id,), {})
+
+    def _read_snapshot(self, timer_id):
+        if timer_id is not None:
+            return self.timers[timer_id].snapshot()
+        return [timer.snapshot() for timer in list(self.timers.values())]
+
+    @_command
+    def set_tick_events(self, enabled):
+        """Switch tick events on or off for the timers already running
+
+        Switching off costs nothing now: each pending tick fires once more
+        and re-arms its timer at the end time. Switching on re-arms every
+        running timer and group at its next tick.
+        """
+        if enabled == self.tick_events:
+            return
+        self.tick_events = enabled
+        if not enabled:
+            return
+        entries = []
+        for timer_id in self.active:
+            timer = self.timers[timer_id]
+            if timer.is_running and not timer.is_paused and timer.mode != MODE_TICK:
+                if timer.group is not None:
+                    self._schedule(timer)
+                else:
+                    entries.append((timer, timer.next_tick(self.clock.monotonic())))
+        # One heapify instead of a push per timer
+        self._queue.push_many(entries)
+        for group in self.groups.values():
+            self._arm_group(group)
+
+    def close(self):
+        """Run the commands already queued, then stop the scheduler thread"""
+        self._commands.put(_STOP)
+        self._thread.join()
+
+    # Scheduling
+
+    def _next_fire(self, timer, now):
+        if self.tick_events or timer.mode == MODE_TICK:
+            return timer.next_tick(now)
+        return timer.end_time()
+
+    def _schedule(self, timer):
+        """Arm the next deadline of a timer, replacing any pending one"""
+        deadline = self._next_fire(timer, timer._clock())
+        group = timer.group
+        if group is not None:
+            group.queue.push(timer, deadline)
+            self._arm_group(group)
+            return
+        self._queue.push(timer, deadline)
+
+    def _cancel(self, timer):
+        group = timer.group
+        if group is not None:
+            group.queue.cancel(timer)
+        else:
+            self._queue.cancel(timer)
+
+    def _own(self, timer):
+        """Give a group member its own state before changing it individually"""
+        group = timer.group
+        if group is not None and group.materialize(timer) and timer.is_running and not timer.is_paused:
+            self._schedule(timer)
+
+    def _arm_group(self, group):
+        """Keep the group's single queue entry at its earliest due time"""
+        if group.frozen:
+            if group.armed_at is not None:
+                self._queue.cancel(group)
+                group.armed_at = None
+            return
+        deadline = group.next_deadline(self.tick_events)
+        if deadline is None:
+            return
+        deadline += group.offset
+        # An entry armed earlier just fires, finds nothing due and re-arms
+        if group.armed_at is None or deadline < group.armed_at:
+            self._queue.push(group, deadline)
+            group.armed_at = deadline
+
+    def _run_group(self, group, now):
+        """Fire everything due in one group, then re-arm it"""
+        group.armed_at = None
+        if group.frozen:
+            return
+        # Tolerance for the round trip through the group offset
+        at_now = group.clock(now) + _EPSILON
+        for at, timer in group.queue.pop_due(at_now):
+            next_deadline = timer.tick(at)
+            if next_deadline is None:
+                self._complete(timer)
+            elif self.tick_events or timer.mode == MODE_TICK:
+                group.queue.push(timer, next_deadline)
+                self._emit('tick', timer)
+            else:
+                group.queue.push(timer, timer.end_time())
+        for timer in group.pop_bulk_due(at_now):
+            self._complete(timer)
+        if self.tick_events and group.pop_bulk_tick(at_now):
+            self._emit('group_tick', group)
+        self._arm_group(group)
+
+    def _complete(self, timer):
+        timer.is_running = False
+        timer.is_paused = False
+        timer.is_completed = True
+        self.active.discard(timer.id)
+        self._emit('completed', timer)
+        ready = self.dependencies.completed(timer.id)
+        if timer.recurrence is not None:
+            self._repeat(timer)
+        # Successors start at this completion's now, like a listener starting them would
+        for timer_id in ready:
+            self.start(timer_id)
+
+    def _repeat(self, timer):
+        """Start the next cycle of a recurring timer on the scheduler thread
+
+        The TimerTask and its queue entry are reused; listeners see the
+        'completed' of the finished cycle followed by a 'started'.
+        """
+        now = timer._clock()
+        end = timer.end_time() if timer.mode != MODE_TICK else now
+        start, duration = timer.recurrence.next_cycle(end, now, self.clock.time())
+        timer.begin_cycle(start, duration)
+        self.active.add(timer.id)
+        self._schedule(timer)
+        self.dependencies.rearm(timer.id)
+        self._emit('started', timer)
+
+    def _fire_due(self, now):
+        """Fire every queued deadline up to now, in deadline order"""
+        observe = self.lateness.observe
+        for at, timer in self._queue.pop_due(now):
+            observe(now - at)
+            if isinstance(timer, TimerGroup):
+                self._run_group(timer, now)
+                continue
+            # Next tick is anchored to the scheduled deadline, not to now
+            next_deadline = timer.tick(at)
+            if next_deadline is None:
+                self._complete(timer)
+            elif self.tick_events or timer.mode == MODE_TICK:
+                self._queue.push(timer, next_deadline)
+                self._emit('tick', timer)
+            else:
+                # Armed before tick events were switched off
+                self._queue.push(timer, timer.end_time())
+
+    @_command
+    def run_until(self, target):
+        """Advance a VirtualClock to target, firing the deadlines on the way
+
+        Called by VirtualClock.advance(). The clock stops at each deadline
+        in turn, so timers started or re-armed by a firing, including the
+        next cycle of a recurring timer and anything a listener starts, fire
+        in the same run if they come due by target. Events reach listeners
+        as they happen, on the scheduler thread, as in real time.
+        """
+        clock = self.clock
+        if not clock.virtual:
+            raise ValueError("only a virtual clock can be advanced")
+        # Not handed back to the caller: listeners must see the clock at each deadline
+        events, self._events = self._events, None
+        try:
+            while True:
+                deadline = self._queue.next_deadline()
+                if deadline is None or deadline > target:
+                    break
+                clock.now = max(clock.now, deadline)
+                self._fire_due(clock.now)
+            clock.now = max(clock.now, target)
+        finally:
+            self._events = events
+
+    def _run(self):
+        """Run commands as they come; sleep until the earliest deadline, then fire every timer that is due"""
+        commands = self._commands
+        # A virtual clock only moves through run_until(), itself a command
+        virtual = self.clock.virtual
+        while True:
+            deadline = self._queue.next_deadline()
+            now = self.clock.monotonic()
+            if deadline is None or deadline > now:
+                # Any command may move the earliest deadline; look again after each
+                try:
+                    command = commands.get(timeout=None if deadline is None or virtual else deadline - now)
+                except queue.Empty:
+                    continue
+                if command is _STOP:
+                    break
+                self._execute(command)
+                continue
+
+            self._version += 1
+            self._fire_due(now)
+            self._version += 1
+
+            # With enough ticking timers the thread never catches up; callers
+            # waiting on commands get their turn between batches
+            if not self._run_commands():
+                break
+        self._closed = True
+        # Calls queued behind close() still get their answer
+        self._run_commands()
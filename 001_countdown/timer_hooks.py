@@ -0,0 +1,308 @@
+"""Completion hooks: actions run when a timer reaches zero
+
+A hook is a callable taking (snapshot, timeout), attached with
+TimerTask.on_complete(). HookRunner listens for completions and runs the
+hooks of every finished timer on a bounded worker pool, so neither the
+scheduler thread nor the Tk mainloop ever waits for one:
+
+    timer.on_complete(CommandHook('notify-send {name} 时间到'))
+    timer.on_complete(FileHook('/tmp/done.log'))
+    timer.on_complete(SocketHook('/run/user/1000/bell.sock'))
+    runner = HookRunner(engine, workers=4, max_pending=1000, timeout=10)
+
+The built-in hooks have a text form used by the journal, timer files and
+the daemon, like recurrence rules: 'cmd:COMMAND', 'file:PATH' and
+'socket:PATH' or 'socket:HOST:PORT'. {id}, {name}, {total_seconds} and
+{group} in a command are replaced by the finished timer's values, quoted
+for the shell; literal braces are written {{ and }}. A command hook runs
+anything, so parse_hook() only accepts one when asked to: text typed into
+the window and the journal's own files may, imported timer files and
+daemon clients only when the user opted in.
+
+At most max_pending runs are queued or running at once; a completion that
+finds the pool full drops its hooks and counts them as rejected instead
+of blocking the thread that reported it. Every hook has a latency
+histogram and run, failure, timeout and rejection counters.
+"""
+import collections
+import functools
+import json
+import os
+import shlex
+import signal
+import socket
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from timer_metrics import Gauge, Histogram, HistogramFamily
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_PENDING = 1000
+# Seconds a hook may run before it is killed or counted as timed out
+DEFAULT_TIMEOUT = 10.0
+
+# Seconds; a hook spawns a process or talks to a file or socket
+HOOK_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Outcomes of one hook run
+OUTCOME_OK = 'ok'
+OUTCOME_FAILED = 'failed'
+OUTCOME_TIMEOUT = 'timeout'
+OUTCOME_REJECTED = 'rejected'
+
+def _fields(snapshot):
+    return {
+        'id': snapshot.id,
+        'name': snapshot.name,
+        'total_seconds': snapshot.total_seconds,
+        'group': snapshot.group or '',
+    }
+
+class CommandHook:
+    """Run a shell command; its whole process group is killed at the timeout"""
+    def __init__(self, command):
+        if not command.strip():
+            raise ValueError("empty hook command")
+        self.command = command
+
+    @property
+    def spec(self):
+        return f"cmd:{self.command}"
+
+    def __call__(self, snapshot, timeout):
+        # Timer names are user input; never let them reach the shell unquoted
+        fields = {key: shlex.quote(str(value)) for key, value in _fields(snapshot).items()}
+        process = subprocess.Popen(
+            self.command.format_map(fields),
+            shell=True,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            start_new_session=True
+        )
+        try:
+            _, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            if hasattr(os, 'killpg'):
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+            process.communicate()
+            raise TimeoutError(f"command still running after {timeout} s") from None
+        if process.returncode:
+            message = stderr.decode(errors='replace').strip()[-200:]
+            raise RuntimeError(f"exit status {process.returncode}" + (f": {message}" if message else ""))
+
+class FileHook:
+    """Append one JSON line per completion to a file"""
+    def __init__(self, path):
+        if not path:
+            raise ValueError("empty hook path")
+        self.path = path
+
+    @property
+    def spec(self):
+        return f"file:{self.path}"
+
+    def __call__(self, snapshot, timeout):
+        line = json.dumps({'event': 'completed', **snapshot._asdict(), 'time': time.time()}, ensure_ascii=False)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+class SocketHook:
+    """Send one JSON line per completion to a Unix socket path or a TCP HOST:PORT"""
+    def __init__(self, address):
+        if not address:
+            raise ValueError("empty hook address")
+        host, _, port = address.rpartition(':')
+        if os.sep in address or not port.isdigit():
+            self.family, self.target = socket.AF_UNIX, address
+        else:
+            self.family, self.target = socket.AF_INET, (host or '127.0.0.1', int(port))
+        self.address = address
+
+    @property
+    def spec(self):
+        return f"socket:{self.address}"
+
+    def __call__(self, snapshot, timeout):
+        message = json.dumps({'event': 'completed', **snapshot._asdict()}, ensure_ascii=False) + '\n'
+        with socket.socket(self.family, socket.SOCK_STREAM) as sock:
+            # Connect and send share the budget; socket.timeout is a TimeoutError
+            sock.settimeout(timeout)
+            sock.connect(self.target)
+            sock.sendall(message.encode('utf-8'))
+
+HOOK_TYPES = {
+    'cmd': CommandHook,
+    'file': FileHook,
+    'socket': SocketHook,
+}
+
+@functools.lru_cache(maxsize=None)
+def parse_hook(spec, allow_commands=False):
+    """Hook for 'cmd:COMMAND', 'file:PATH' or 'socket:ADDRESS'; raises ValueError
+
+    'cmd:' is rejected unless allow_commands is true.
+    """
+    kind, _, value = spec.partition(':')
+    hook_type = HOOK_TYPES.get(kind)
+    if hook_type is None:
+        raise ValueError(f"unknown hook {spec!r}")
+    if hook_type is CommandHook and not allow_commands:
+        raise ValueError(f"command hooks are not allowed here: {spec!r}")
+    return hook_type(value)
+
+def hook_specs(timer):
+    """Text forms of a timer's hooks; plain callables have none and are not persisted"""
+    return [hook.spec for hook in timer.hooks if getattr(hook, 'spec', None)] or None
+
+def hook_name(hook):
+    """Label a hook's statistics are kept under"""
+    spec = getattr(hook, 'spec', None)
+    if spec:
+        return spec
+    return getattr(hook, '__qualname__', None) or type(hook).__name__
+
+def run_hook(hook, snapshot, timeout, queued_at):
+    """Run one hook in a worker; returns (queue delay, run time, outcome, error message)
+
+    Module level, so a process pool can pickle it. A hook that ignores its
+    timeout cannot be stopped, only counted as timed out once it returns.
+    """
+    started = time.monotonic()
+    try:
+        hook(snapshot, timeout)
+    except TimeoutError as e:
+        return started - queued_at, time.monotonic() - started, OUTCOME_TIMEOUT, str(e)
+    except Exception as e:
+        return started - queued_at, time.monotonic() - started, OUTCOME_FAILED, f"{type(e).__name__}: {e}"
+    elapsed = time.monotonic() - started
+    if elapsed > timeout:
+        return started - queued_at, elapsed, OUTCOME_TIMEOUT, f"took {elapsed:.1f} s"
+    return started - queued_at, elapsed, OUTCOME_OK, None
+
+class HookRunner:
+    """Run the completion hooks of finished timers on a bounded worker pool
+
+    Completions arrive on the scheduler thread; on_engine_event() only
+    takes a snapshot and hands the hooks to the pool. With processes the
+    pool is a ProcessPoolExecutor, for hooks that do CPU work in Python;
+    such hooks must be picklable, which the built-in ones are.
+    """
+    def __init__(self, engine, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 timeout=DEFAULT_TIMEOUT, processes=False):
+        self.engine = engine
+        self.timeout = timeout
+        self.max_pending = max_pending
+        if processes:
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='timer-hook')
+        # One slot per queued or running hook; full means back-pressure
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+
+        # Statistics, written under _lock by the pool's completion callbacks
+        self.duration = HistogramFamily(
+            'countdown_hook_duration_seconds',
+            "Run time of one completion hook",
+            'hook',
+            HOOK_BUCKETS
+        )
+        self.queue_delay = Histogram(
+            'countdown_hook_queue_seconds',
+            "Delay between a timer completing and its hook starting"
+        )
+        self.outcomes = {outcome: collections.Counter() for outcome in (
+            OUTCOME_OK, OUTCOME_FAILED, OUTCOME_TIMEOUT, OUTCOME_REJECTED
+        )}
+        # Hook name -> last error message, for the stats panel
+        self.last_errors = {}
+        engine.subscribe(self.on_engine_event)
+
+    def on_engine_event(self, event, timer):
+        """Engine listener: queue the hooks of a completed timer"""
+        if event != 'completed':
+            return
+        hooks = timer.hooks
+        if hooks:
+            snapshot = timer.snapshot()
+            for hook in hooks:
+                self.submit(hook, snapshot)
+
+    def submit(self, hook, snapshot):
+        """Queue one hook run; False if it was rejected because the pool is full"""
+        name = hook_name(hook)
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.outcomes[OUTCOME_REJECTED][name] += 1
+            return False
+        try:
+            future = self.executor.submit(run_hook, hook, snapshot, self.timeout, time.monotonic())
+        except RuntimeError:
+            # Shut down
+            self._slots.release()
+            return False
+        with self._lock:
+            self.pending += 1
+        future.add_done_callback(functools.partial(self._finished, name))
+        return True
+
+    def _finished(self, name, future):
+        self._slots.release()
+        try:
+            delay, elapsed, outcome, message = future.result()
+        except Exception as e:
+            # Not run: cancelled at shutdown, unpicklable, or a broken process pool
+            delay, elapsed, outcome, message = None, None, OUTCOME_FAILED, f"{type(e).__name__}: {e}"
+        with self._lock:
+            self.pending -= 1
+            self.outcomes[outcome][name] += 1
+            if elapsed is not None:
+                self.duration.get(name).observe(elapsed)
+                self.queue_delay.observe(delay)
+            if message is not None:
+                self.last_errors[name] = message
+
+    def stats(self):
+        """[(hook name, succeeded, failed, timed out, rejected, duration histogram or None)]"""
+        with self._lock:
+            names = set().union(*self.outcomes.values())
+            return [
+                (
+                    name,
+                    self.outcomes[OUTCOME_OK][name],
+                    self.outcomes[OUTCOME_FAILED][name],
+                    self.outcomes[OUTCOME_TIMEOUT][name],
+                    self.outcomes[OUTCOME_REJECTED][name],
+                    self.duration.histograms.get(name),
+                )
+                for name in sorted(names)
+            ]
+
+    def register(self, registry):
+        """Add the hook metrics to a MetricsRegistry"""
+        registry.add(self.duration)
+        registry.add(self.queue_delay)
+        registry.add(Gauge('countdown_hooks_pending', "Hook runs queued or running", lambda: self.pending))
+        for outcome, counter in self.outcomes.items():
+            registry.add(Gauge(
+                f'countdown_hooks_{outcome}_total',
+                f"Hook runs with outcome {outcome}",
+                functools.partial(self._counts, counter),
+                label='hook',
+                kind='counter'
+            ))
+
+    def _counts(self, counter):
+        with self._lock:
+            return dict(counter)
+
+    def close(self):
+        """Stop taking hooks; wait for running ones, drop the queued rest"""
+        self.engine.unsubscribe(self.on_engine_event)
+        self.executor.shutdown(wait=True, cancel_futures=True)
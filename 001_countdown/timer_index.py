@@ -0,0 +1,212 @@
+"""Secondary indexes over an engine's timers: state, group and name
+
+TimerIndex follows the engine's events, so state, group and prefix lookups
+never scan the whole timer collection:
+
+    index = TimerIndex(engine)
+    index.by_state(STATE_COMPLETED)      # ids of finished timers
+    index.with_prefix('deploy')          # ids whose name starts with it
+    index.query('tea', STATE_RUNNING)    # ids, in the order timers were added
+"""
+import bisect
+import threading
+
+from timer_engine import STATE_COMPLETED, STATE_IDLE, STATE_PAUSED, STATE_RUNNING
+
+STATES = (STATE_IDLE, STATE_RUNNING, STATE_PAUSED, STATE_COMPLETED)
+
+# Event -> state the timer is in afterwards
+EVENT_STATES = {
+    'added': None,
+    'restored': None,
+    'started': STATE_RUNNING,
+    'paused': STATE_PAUSED,
+    'resumed': STATE_RUNNING,
+    'reset': STATE_IDLE,
+    'completed': STATE_COMPLETED,
+    'grouped': None,
+}
+
+# Group events that change member states; 'group_tick' does not
+GROUP_EVENTS = ('group_started', 'group_paused', 'group_resumed', 'group_reset')
+
+def timer_state(timer):
+    """State as the UI shows it: members of a paused group count as paused"""
+    return STATE_PAUSED if timer.frozen else timer.state
+
+class TimerIndex:
+    """State sets, a sorted name list for prefixes and an incremental substring filter
+
+    Group operations are O(1) in the engine, so the index does not reclassify
+    members on every group event; the group is marked stale and its members
+    are reclassified by the next state lookup. Names are matched case-
+    insensitively. A substring query that extends the previous one (the user
+    typing on) only rechecks the previous matches.
+    """
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._states = {state: set() for state in STATES}
+        self._stale_groups = set()
+
+        # id -> folded name, in the order timers were added
+        self._names = {}
+        # Sorted (name, id) pairs; additions wait in _pending until a prefix query
+        self._sorted = []
+        self._pending = []
+        self._dead = 0
+
+        # Last substring query and its (id, name) matches, for narrowing
+        self._last_text = None
+        self._last_matches = None
+
+        engine.subscribe(self.on_engine_event)
+        with self._lock:
+            for timer in list(engine.timers.values()):
+                self._add(timer)
+
+    # Maintenance
+
+    def on_engine_event(self, event, timer):
+        """Engine listener; may run on the engine thread"""
+        if event in EVENT_STATES:
+            with self._lock:
+                if event in ('added', 'restored'):
+                    self._add(timer)
+                else:
+                    self._set_state(timer.id, EVENT_STATES[event] or timer_state(timer))
+        elif event == 'deleted':
+            with self._lock:
+                self._remove(timer.id)
+        elif event in GROUP_EVENTS:
+            with self._lock:
+                # timer is the TimerGroup here
+                self._stale_groups.add(timer)
+
+    def _add(self, timer):
+        timer_id = timer.id
+        if timer_id in self._names:
+            return
+        name = timer.name.casefold()
+        self._names[timer_id] = name
+        self._pending.append((name, timer_id))
+        self._states[timer_state(timer)].add(timer_id)
+        # New names can match the last query without having been in its matches
+        self._last_text = None
+
+    def _remove(self, timer_id):
+        if self._names.pop(timer_id, None) is None:
+            return
+        for ids in self._states.values():
+            ids.discard(timer_id)
+        # The sorted list is cleaned up lazily; lookups skip dead entries
+        self._dead += 1
+        self._last_text = None
+
+    def _set_state(self, timer_id, state):
+        if timer_id not in self._names:
+            return
+        for other, ids in self._states.items():
+            if other != state:
+                ids.discard(timer_id)
+        self._states[state].add(timer_id)
+
+    def _refresh_groups(self):
+        """Reclassify the members of groups that changed since the last lookup
+
+        Membership and member states are read on the engine's scheduler
+        thread, which changes them, in one command. The caller must not hold
+        the lock: listeners on that thread take it.
+        """
+        if self._stale_groups:
+            self.engine.call(self._reclassify_stale)
+
+    def _reclassify_stale(self):
+        with self._lock:
+            stale = self._stale_groups
+            self._stale_groups = set()
+            timers = self.engine.timers
+            for group in stale:
+                for timer_id in group.members:
+                    timer = timers.get(timer_id)
+                    if timer is not None:
+                        self._set_state(timer_id, timer_state(timer))
+
+    # Lookups
+
+    def by_state(self, state):
+        """Set of the ids of timers in a state"""
+        self._refresh_groups()
+        with self._lock:
+            return set(self._states[state])
+
+    def counts(self):
+        """{state: number of timers}"""
+        self._refresh_groups()
+        with self._lock:
+            return {state: len(ids) for state, ids in self._states.items()}
+
+    def by_group(self, name):
+        """Set of the ids of a group's members
+
+        The engine already keeps group membership, and copies it on its
+        scheduler thread; engines without groups return an empty set.
+        """
+        group = getattr(self.engine, 'groups', {}).get(name)
+        return self.engine.call(set, group.members) if group is not None else set()
+
+    def with_prefix(self, prefix):
+        """Ids of timers whose name starts with prefix, in name order"""
+        prefix = prefix.casefold()
+        with self._lock:
+            if self._pending or self._dead > len(self._sorted) // 2:
+                self._rebuild_sorted()
+            names = self._names
+            ids = []
+            position = bisect.bisect_left(self._sorted, (prefix,))
+            for name, timer_id in self._sorted[position:]:
+                if not name.startswith(prefix):
+                    break
+                if names.get(timer_id) == name:
+                    ids.append(timer_id)
+            return ids
+
+    def _rebuild_sorted(self):
+        if self._dead:
+            names = self._names
+            self._sorted = [entry for entry in self._sorted if names.get(entry[1]) == entry[0]]
+            self._dead = 0
+        # Appending then sorting lets timsort merge the already sorted run
+        self._sorted.extend(self._pending)
+        self._sorted.sort()
+        self._pending = []
+
+    def matching(self, text):
+        """Ids of timers whose name contains text, in the order they were added"""
+        text = text.casefold()
+        with self._lock:
+            last_text = self._last_text
+            if last_text is not None and last_text in text:
+                # Typing on only narrows: recheck the previous matches
+                candidates = self._last_matches
+            else:
+                candidates = self._names.items()
+            matches = [entry for entry in candidates if text in entry[1]]
+            self._last_text = text
+            self._last_matches = matches
+            return [entry[0] for entry in matches]
+
+    def query(self, text='', state=None):
+        """Ids matching a name filter and/or a state, in the order timers were added"""
+        if text:
+            ids = self.matching(text)
+            if state is None:
+                return ids
+            wanted = self.by_state(state)
+            return [i for i in ids if i in wanted]
+        if state is None:
+            with self._lock:
+                return list(self._names)
+        wanted = self.by_state(state)
+        with self._lock:
+            return [i for i in self._names if i in wanted]
@@ -0,0 +1,216 @@
+"""Streaming bulk import and export of timers (CSV and JSON Lines)
+
+Records flow through a generator pipeline, read -> parse -> batch, and
+each batch becomes TimerTask objects handed to the engine's add_many(),
+so only one batch of timers is in flight however large the file is.
+
+A record has a name and either total_seconds or hours/minutes/seconds;
+id, mode, remaining_seconds, group, repeat, hooks and after are optional.
+repeat is a recurrence spec, 'every:SECONDS' or 'cron:EXPRESSION'; cron
+timers need no duration, since they count down to the next matching time.
+hooks are completion hook specs (see timer_hooks), a list in JSON Lines and
+one per line of the cell in CSV. after is the ids of the timers a timer
+waits for (see timer_dag), a list in JSON Lines and space-separated in CSV;
+they may be in the same file, before or after it. Durations are
+whole seconds except in 'precise' mode, which keeps milliseconds. Exports
+write every field import understands, plus the state, so an export can be
+imported again.
+"""
+import csv
+import itertools
+import json
+import math
+import os
+import time
+
+from timer_engine import MODE_DEADLINE, MODE_PRECISE, MODES, TimerTask
+from timer_hooks import hook_specs, parse_hook
+from timer_schedule import parse_recurrence
+
+EXPORT_FIELDS = (
+    'id', 'name', 'total_seconds', 'remaining_seconds', 'state', 'mode', 'group', 'repeat', 'hooks', 'after'
+)
+
+# File suffix -> format
+FORMATS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+}
+
+DEFAULT_BATCH_SIZE = 5000
+
+def detect_format(path):
+    """'csv' or 'jsonl' from the file suffix"""
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix not in FORMATS:
+        raise ValueError(f"unsupported timer file type: {suffix or path}")
+    return FORMATS[suffix]
+
+# Import pipeline
+
+def read_records(path):
+    """Yield one dict per record of a CSV or JSON Lines file"""
+    file_format = detect_format(path)
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        raise ValueError(f"line {number}: {e}") from None
+
+def parse_records(records, allow_commands=False):
+    """Validate records into (name, total_seconds, id, mode, remaining, group, rule, hooks, after) tuples
+
+    Raises ValueError naming the bad record. No TimerTask is created here,
+    so a bad file does not claim any store slots. A file can come from
+    anyone, so its 'cmd:' hooks are rejected unless allow_commands is true.
+    """
+    for number, record in enumerate(records, 1):
+        try:
+            name = str(record.get('name') or '').strip()
+            if not name:
+                raise ValueError("missing name")
+
+            repeat = str(record.get('repeat') or '').strip()
+            rule = parse_recurrence(repeat) if repeat else None
+
+            mode = record.get('mode') or MODE_DEADLINE
+            if mode not in MODES:
+                raise ValueError(f"unknown mode {mode!r}")
+            # Only precise timers keep a millisecond part
+            number_type = float if mode == MODE_PRECISE else int
+
+            total = record.get('total_seconds')
+            if total not in (None, ''):
+                total = number_type(total)
+            else:
+                total = (
+                    int(record.get('hours') or 0) * 3600
+                    + int(record.get('minutes') or 0) * 60
+                    + number_type(record.get('seconds') or 0)
+                )
+            if total <= 0 and rule is not None:
+                # Calendar schedules: the first cycle runs to the next matching time
+                first = rule.first_duration(time.time())
+                if first is not None:
+                    total = math.ceil(first)
+            if total <= 0:
+                raise ValueError("duration must be positive")
+
+            remaining = record.get('remaining_seconds')
+            remaining = None if remaining in (None, '') else number_type(remaining)
+
+            hooks = record.get('hooks') or []
+            if isinstance(hooks, str):
+                hooks = hooks.splitlines()
+            if not all(isinstance(spec, str) for spec in hooks):
+                raise ValueError("hooks must be a list of specs")
+            hooks = [parse_hook(spec.strip(), allow_commands=allow_commands) for spec in hooks if spec.strip()]
+
+            after = record.get('after') or []
+            if isinstance(after, str):
+                after = after.split()
+            if not all(isinstance(timer_id, str) for timer_id in after):
+                raise ValueError("after must be a list of timer ids")
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"record {number}: {e}") from None
+        group = str(record.get('group') or '').strip() or None
+        yield name, total, record.get('id') or None, mode, remaining, group, rule, hooks, after
+
+def build_timers(specs):
+    """Create TimerTask objects from parsed tuples"""
+    timers = []
+    for name, total, task_id, mode, remaining, group, rule, hooks, after in specs:
+        timer = TimerTask(name, 0, 0, total, task_id=task_id, mode=mode)
+        timer.recurrence = rule
+        timer.hooks = hooks
+        timer.after = after
+        if remaining is not None and 0 < remaining < total:
+            timer.remaining_seconds = remaining
+        timers.append(timer)
+    return timers
+
+def batched(iterable, size):
+    """Yield lists of up to size items"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def import_timers(engine, path, batch_size=DEFAULT_BATCH_SIZE, allow_commands=False):
+    """Stream a timer file into an engine; returns the added timers
+
+    Batches that were added before a bad record stay in the engine. Grouped
+    records join their group once their batch is in; engines without
+    groups (the asyncio one) import them ungrouped.
+    """
+    added = []
+    can_group = hasattr(engine, 'set_group')
+    for specs in batched(parse_records(read_records(path), allow_commands), batch_size):
+        timers = build_timers(specs)
+        try:
+            added.extend(engine.add_many(timers))
+        except ValueError:
+            # Rejected batch: hand the slots back to the store
+            for timer in timers:
+                timer.detach()
+            raise
+
+        if can_group:
+            groups = {}
+            for spec, timer in zip(specs, timers):
+                if spec[5] is not None:
+                    groups.setdefault(spec[5], []).append(timer.id)
+            for name, timer_ids in groups.items():
+                engine.set_group(timer_ids, name)
+    return added
+
+# Export
+
+def iter_records(timers):
+    """Yield an export record per timer"""
+    for timer in timers:
+        snapshot = timer.snapshot()
+        mode = timer.mode
+        yield {
+            'id': snapshot.id,
+            'name': snapshot.name,
+            'total_seconds': snapshot.total_seconds,
+            'remaining_seconds': (
+                timer.remaining_ms / 1000 if mode == MODE_PRECISE else snapshot.remaining_seconds
+            ),
+            'state': snapshot.state,
+            'mode': mode,
+            'group': snapshot.group,
+            'repeat': timer.recurrence.spec if timer.recurrence is not None else None,
+            'hooks': hook_specs(timer),
+            'after': list(timer.after) or None,
+        }
+
+def export_timers(timers, path):
+    """Write timers to a CSV or JSON Lines file; returns the number written"""
+    file_format = detect_format(path)
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS)
+            writer.writeheader()
+            for record in iter_records(timers):
+                if record['hooks']:
+                    record['hooks'] = '\n'.join(record['hooks'])
+                if record['after']:
+                    record['after'] = ' '.join(record['after'])
+                writer.writerow(record)
+                count += 1
+        else:
+            for record in iter_records(timers):
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                count += 1
+    return count
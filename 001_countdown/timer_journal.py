@@ -0,0 +1,428 @@
+"""Crash-safe persistence for the countdown engine
+
+Every state-changing engine event is appended to a write-ahead journal as
+one compact JSON line. A writer thread batches the lines and fsyncs once
+per batch, so listeners on the UI thread only enqueue a tuple. After
+snapshot_every records the journal is compacted into a snapshot file.
+Each record carries the full state of its timer, so replaying the journal
+over a snapshot is idempotent. Group operations are journaled as one
+record per group and expanded over the members by the writer thread.
+"""
+import gc
+import json
+import os
+import queue
+import threading
+import time
+
+from timer_clock import default_clock
+from timer_engine import (
+    FLAG_COMPLETED, FLAG_PAUSED, FLAG_PRECISE, FLAG_RUNNING, FLAG_TICK, MODE_PRECISE, MODE_TICK,
+    STATE_COMPLETED, STATE_IDLE, STATE_PAUSED, STATE_RUNNING, TimerStore, default_store
+)
+from timer_hooks import hook_specs, parse_hook
+from timer_schedule import parse_recurrence
+
+JOURNAL_FILE = 'timers.journal'
+SNAPSHOT_FILE = 'timers.snapshot'
+SNAPSHOT_VERSION = 5
+
+# Timers built and restored per step of recover_batches()
+RESTORE_BATCH_SIZE = 2000
+
+# Snapshot columns; one flat list per field parses far faster than a list per timer
+SNAPSHOT_COLUMNS = ('id', 'wall', 'state', 'remaining', 'name', 'total', 'mode', 'group', 'repeat', 'hooks', 'after')
+
+# Engine events that change persistent state, and their journal codes
+EVENT_CODES = {
+    'added': 'a',
+    'started': 's',
+    'paused': 'p',
+    'resumed': 'u',
+    'reset': 'r',
+    'completed': 'c',
+    'deleted': 'd',
+    'grouped': 'g',
+    'linked': 'l',
+}
+
+# Group events, journaled as ['G', group, op, wall]
+GROUP_EVENT_CODES = {
+    'group_started': 's',
+    'group_paused': 'p',
+    'group_resumed': 'u',
+    'group_reset': 'r',
+}
+
+_STOP = object()
+
+class TimerJournal:
+    """Write-ahead journal plus periodic snapshots for one data directory
+
+    Records are stamped with the wall time of clock, and recovered timers
+    count down on it: pass the clock of the engine the journal records and
+    recovers into, real time by default.
+    """
+    def __init__(self, directory, fsync_interval=0.2, snapshot_every=50000, clock=None):
+        self.directory = directory
+        self.clock = default_clock if clock is None else clock
+        # Recovered timers live in a store on that clock
+        self.store = default_store if clock is None else TimerStore(clock)
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+
+        # Last record per timer id, mirrored by the writer thread for snapshots
+        self._state = {}
+        # Group name -> member ids, and paused group -> wall time of the pause
+        self._members = {}
+        self._paused_groups = {}
+        self._records_since_snapshot = 0
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    # Recording
+
+    def attach(self, engine):
+        """Start journaling every state change of an engine"""
+        if self._file is None:
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name="timer-journal")
+        self._thread.daemon = True
+        self._thread.start()
+        engine.subscribe(self.on_engine_event)
+
+    def on_engine_event(self, event, timer):
+        """Engine listener: capture the timer state and hand it to the writer"""
+        code = EVENT_CODES.get(event)
+        if code is None:
+            op = GROUP_EVENT_CODES.get(event)
+            if op is not None:
+                # timer is the TimerGroup here
+                self._queue.put(['G', timer.name, op, round(self.clock.time(), 3)])
+            return
+        if code == 'a':
+            rule = timer.recurrence
+            self._queue.put(self._record(code, timer) + [
+                timer.name, timer.total_seconds, timer.mode, self._group_of(timer),
+                rule.spec if rule is not None else None, hook_specs(timer), self._after_of(timer)
+            ])
+        elif code == 'g':
+            self._queue.put(self._record(code, timer) + [self._group_of(timer)])
+        elif code == 'l':
+            self._queue.put(self._record(code, timer) + [self._after_of(timer)])
+        elif code == 'd':
+            self._queue.put([code, timer.id, round(self.clock.time(), 3)])
+        else:
+            self._queue.put(self._record(code, timer))
+
+    def _group_of(self, timer):
+        group = getattr(timer, 'group', None)
+        return group.name if group is not None else None
+
+    def _after_of(self, timer):
+        return list(timer.after) or None
+
+    def _record(self, code, timer):
+        # Millisecond precision keeps the records short
+        return [code, timer.id, round(self.clock.time(), 3), timer.state, round(timer.remaining_time(), 3)]
+
+    def close(self):
+        """Flush pending records and stop the writer thread"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._file.close()
+        self._thread = None
+
+    def _run(self):
+        """Collect records for one fsync window, write them and fsync once"""
+        if self._records_since_snapshot:
+            # Fold the journal replayed at startup into a fresh snapshot
+            self.compact()
+
+        stopping = False
+        while not stopping:
+            record = self._queue.get()
+            batch = []
+            if record is _STOP:
+                stopping = True
+            else:
+                batch.append(record)
+                deadline = time.monotonic() + self.fsync_interval
+                while True:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        record = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if record is _STOP:
+                        stopping = True
+                        break
+                    batch.append(record)
+
+            # Pick up anything queued right behind the batch
+            while not stopping:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stopping = True
+                else:
+                    batch.append(record)
+
+            if batch:
+                self._write(batch)
+            if self._records_since_snapshot >= self.snapshot_every:
+                self.compact()
+
+    def _write(self, batch):
+        lines = []
+        for record in batch:
+            lines.append(json.dumps(record, separators=(',', ':'), ensure_ascii=False))
+            self._apply(record)
+        self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._records_since_snapshot += len(batch)
+
+    def _apply(self, record):
+        """Fold a record into the per-timer state used for snapshots"""
+        code, timer_id = record[0], record[1]
+        if code == 'G':
+            self._apply_group(*record[1:])
+        elif code == 'd':
+            entry = self._state.pop(timer_id, None)
+            if entry is not None and entry[7] is not None:
+                self._members[entry[7]].discard(timer_id)
+        elif code == 'a':
+            entry = record[1:]
+            # Journals written before groups, recurrence, hooks and dependencies existed
+            entry.extend([None] * (len(SNAPSHOT_COLUMNS) - len(entry)))
+            self._state[timer_id] = entry
+            if entry[7] is not None:
+                self._members.setdefault(entry[7], set()).add(timer_id)
+        elif timer_id in self._state:
+            # [id, wall, state, remaining, name, total, mode, group]
+            entry = self._state[timer_id]
+            entry[1:4] = record[2:5]
+            if code == 'g':
+                if entry[7] is not None:
+                    self._members[entry[7]].discard(timer_id)
+                entry[7] = record[5]
+                if entry[7] is not None:
+                    self._members.setdefault(entry[7], set()).add(timer_id)
+            elif code == 'l':
+                entry[10] = record[5]
+
+    def _apply_group(self, name, op, wall):
+        """Expand a group operation over the members' recorded state"""
+        frozen = name in self._paused_groups
+        if op == 'p' and frozen:
+            # Re-pausing a restored group must not take the downtime off twice
+            return
+        for timer_id in self._members.get(name, ()):
+            entry = self._state[timer_id]
+            if op == 'r':
+                entry[1:4] = [wall, STATE_IDLE, entry[5]]
+            elif op == 'p':
+                if entry[2] == STATE_RUNNING:
+                    # Running members stop losing time until the group resumes
+                    entry[3] = round(entry[3] - (wall - entry[1]), 3)
+                    entry[1] = wall
+            elif entry[2] == STATE_RUNNING and frozen:
+                entry[1] = wall
+            elif op == 's' and entry[2] == STATE_IDLE and not self._waiting(entry):
+                entry[1:3] = [wall, STATE_RUNNING]
+
+        if op == 'p':
+            self._paused_groups[name] = wall
+        else:
+            self._paused_groups.pop(name, None)
+
+    def _waiting(self, entry):
+        """True if a predecessor of the entry has not completed, so a group start left it idle"""
+        after = entry[10]
+        if not after:
+            return False
+        state = self._state
+        # Like the engine, count a predecessor with no record as not completed
+        return any(predecessor not in state or state[predecessor][2] != STATE_COMPLETED for predecessor in after)
+
+    # Snapshots
+
+    def compact(self):
+        """Write the folded state as a snapshot and truncate the journal"""
+        temp_path = self.snapshot_path + '.tmp'
+        columns = zip(*self._state.values()) if self._state else [()] * len(SNAPSHOT_COLUMNS)
+        snapshot = {'version': SNAPSHOT_VERSION, 'paused_groups': self._paused_groups}
+        snapshot.update(zip(SNAPSHOT_COLUMNS, map(list, columns)))
+
+        # json.dumps runs in the C encoder; json.dump to a file does not
+        data = json.dumps(snapshot, separators=(',', ':'), ensure_ascii=False)
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+
+        # A crash before truncation only replays records the snapshot already has
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.journal_path, 'w', encoding='utf-8')
+        os.fsync(self._file.fileno())
+        self._records_since_snapshot = 0
+
+    # Recovery
+
+    def load(self):
+        """Rebuild the last persisted state as {id: [id, wall, state, remaining, name, total, mode, group, repeat, hooks, after]}"""
+        self._state = {}
+        self._members = {}
+        self._paused_groups = {}
+        self._records_since_snapshot = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                data = json.loads(f.read())
+            count = len(data['id'])
+            # Older snapshots predate groups (version 1), recurrence (version 2), hooks (version 3)
+            # and dependencies (version 4)
+            columns = [data.get(column) or [None] * count for column in SNAPSHOT_COLUMNS]
+            for entry in zip(*columns):
+                self._state[entry[0]] = list(entry)
+                if entry[7] is not None:
+                    self._members.setdefault(entry[7], set()).add(entry[0])
+            self._paused_groups = data.get('paused_groups', {})
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn final write from a crash; everything before it is intact
+                        break
+                    self._apply(record)
+                    self._records_since_snapshot += 1
+        return self._state
+
+    def recover(self, engine):
+        """Load persisted timers into an engine, re-applying the wall time that passed
+
+        Returns the restored TimerTask objects in their original order. The
+        replayed journal is compacted by the writer thread once attached.
+        """
+        timers = []
+        for batch in self.recover_batches(engine, batch_size=None):
+            timers.extend(batch)
+        return timers
+
+    def recover_batches(self, engine, batch_size=RESTORE_BATCH_SIZE):
+        """Load the persisted state now and return an iterator restoring it a batch at a time
+
+        Only the snapshot and journal are read up front; TimerTask objects are
+        built, restored into the engine and grouped as each batch is asked
+        for, so a view can show the first rows while the rest is still to
+        come. The journal may be attached before the last batch is taken.
+        batch_size None restores everything in one batch.
+        """
+        entries = [list(entry) for entry in self.load().values()]
+        # Copies: once attached, the writer thread keeps folding records into these
+        paused_groups = dict(self._paused_groups)
+        return self._restore_batches(engine, entries, paused_groups, batch_size or len(entries) or 1)
+
+    def _restore_batches(self, engine, entries, paused_groups, batch_size):
+        # Engines without groups (the asyncio one) get the timers ungrouped
+        can_group = hasattr(engine, 'set_group')
+        for start in range(0, len(entries), batch_size):
+            chunk = entries[start:start + batch_size]
+            # Each task and its store reference each other (TimerTask._store,
+            # TimerStore.views), so the load does create cycles, but every one
+            # stays reachable from the engine; the collections that the burst of
+            # allocations would trigger meanwhile can free nothing
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                timers = engine.restore(self._rebuild(chunk, paused_groups))
+            finally:
+                if gc_enabled:
+                    gc.enable()
+
+            if can_group:
+                members = {}
+                for entry in chunk:
+                    if entry[7] is not None:
+                        members.setdefault(entry[7], []).append(entry[0])
+                for name, timer_ids in members.items():
+                    created = name not in engine.groups
+                    engine.set_group(timer_ids, name)
+                    # Later members join the group already frozen
+                    if created and name in paused_groups:
+                        engine.pause_group(name)
+            yield timers
+
+    def _rebuild(self, entries, paused_groups):
+        """Create TimerTask objects in their persisted state, filling the store a column at a time
+
+        The columns are what TimerTask.start() and pause() would write at
+        now on the store's clock; see TimerStore.allocate_many().
+        """
+        now = self.clock.time()
+        now_monotonic = self.clock.monotonic()
+        nan = float('nan')
+        ids, names, totals, flags, remaining, deadline, paused_at = [], [], [], [], [], [], []
+        rules = hooks = afters = None
+        for index, entry in enumerate(entries):
+            timer_id, wall, state, left, name, total, mode, group, repeat, specs, after = entry
+            flag = FLAG_TICK if mode == MODE_TICK else FLAG_PRECISE if mode == MODE_PRECISE else 0
+            if flag == FLAG_PRECISE:
+                total = round(total, 3)
+            end = paused = nan
+            if state == STATE_COMPLETED:
+                flag |= FLAG_COMPLETED
+                left = 0
+            elif state == STATE_RUNNING or state == STATE_PAUSED:
+                if state == STATE_PAUSED:
+                    flag |= FLAG_RUNNING | FLAG_PAUSED
+                    paused = now_monotonic
+                else:
+                    flag |= FLAG_RUNNING
+                    if group not in paused_groups:
+                        # Time kept passing while we were down; overdue timers complete at once
+                        left = max(0.0, left - (now - wall))
+                if mode == MODE_TICK:
+                    paused = nan
+                else:
+                    end = now_monotonic + left
+            else:
+                left = total
+            ids.append(timer_id)
+            names.append(name)
+            totals.append(total)
+            flags.append(flag)
+            remaining.append(left)
+            deadline.append(end)
+            paused_at.append(paused)
+            if repeat is not None:
+                if rules is None:
+                    rules = [None] * len(entries)
+                rules[index] = parse_recurrence(repeat)
+            if specs:
+                if hooks is None:
+                    hooks = [None] * len(entries)
+                # Written by this process into its own directory
+                hooks[index] = tuple(parse_hook(spec, allow_commands=True) for spec in specs)
+            if after:
+                if afters is None:
+                    afters = [None] * len(entries)
+                afters[index] = tuple(dict.fromkeys(after))
+        return self.store.allocate_many(
+            ids, names, totals, flags, remaining, deadline, paused_at, rules=rules, hooks=hooks, after=afters
+        )
@@ -0,0 +1,135 @@
+import tkinter as tk
+from tkinter import ttk
+
+class VirtualTimerList:
+    """Scrollable timer list that only builds widgets for the visible rows
+
+    Rows are laid out at fixed heights inside a plain viewport frame. A small
+    pool of row widgets (visible rows plus overscan) is rebound to whichever
+    TimerTask objects fall into view, so widget count and redraw cost depend
+    on the viewport size instead of the number of timers.
+    """
+    ROW_HEIGHT = 180
+    OVERSCAN = 2
+    SCROLL_STEP = 40
+
+    def __init__(self, parent, owner):
+        self.owner = owner
+        self.items = []
+        self.rows = []
+        self.offset = 0
+
+        self.viewport = tk.Frame(parent, bg='#2c3e50')
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self.yview)
+
+        self.viewport.pack(side="left", fill="both", expand=True, padx=10, pady=10)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.viewport.bind("<Configure>", lambda e: self.refresh())
+        self.bind_wheel(self.viewport)
+
+    def bind_wheel(self, widget):
+        """Scroll the list when the mouse wheel is used over a widget"""
+        widget.bind("<MouseWheel>", lambda e: self.scroll_by(-e.delta // 120 * self.SCROLL_STEP))
+        widget.bind("<Button-4>", lambda e: self.scroll_by(-self.SCROLL_STEP))
+        widget.bind("<Button-5>", lambda e: self.scroll_by(self.SCROLL_STEP))
+        for child in widget.winfo_children():
+            self.bind_wheel(child)
+
+    def append(self, timer):
+        """Add a timer at the end of the list"""
+        self.items.append(timer)
+        self.refresh()
+
+    def extend(self, timers):
+        """Add many timers with a single refresh"""
+        self.items.extend(timers)
+        self.refresh()
+
+    def remove(self, timer):
+        """Remove a timer and release its row"""
+        self.items.remove(timer)
+        self.refresh()
+
+    def remove_many(self, timers):
+        """Remove several timers with one pass and one refresh"""
+        gone = {id(timer) for timer in timers}
+        self.items = [timer for timer in self.items if id(timer) not in gone]
+        self.refresh()
+
+    def set_items(self, timers):
+        """Show a different sequence of timers, e.g. filter results, from the top"""
+        self.items = list(timers)
+        self.offset = 0
+        self.refresh()
+
+    def total_height(self):
+        return len(self.items) * self.ROW_HEIGHT
+
+    def yview(self, *args):
+        """Scrollbar command: 'moveto' fraction or 'scroll' units/pages"""
+        height = self.viewport.winfo_height()
+        if args[0] == 'moveto':
+            self.offset = int(float(args[1]) * self.total_height())
+        elif args[0] == 'scroll':
+            step = height if args[2] == 'pages' else self.SCROLL_STEP
+            self.offset += int(args[1]) * step
+        self.refresh()
+
+    def scroll_by(self, pixels):
+        self.offset += pixels
+        self.refresh()
+
+    def visible_range(self):
+        """Index range of the rows that need widgets, overscan included"""
+        height = self.viewport.winfo_height()
+        first = self.offset // self.ROW_HEIGHT - self.OVERSCAN
+        last = (self.offset + height) // self.ROW_HEIGHT + 1 + self.OVERSCAN
+        return max(0, first), min(len(self.items), last)
+
+    def refresh(self):
+        """Place and rebind the pooled rows for the current scroll offset"""
+        height = self.viewport.winfo_height()
+        total = self.total_height()
+        self.offset = max(0, min(self.offset, total - height))
+
+        first, last = self.visible_range()
+        while len(self.rows) < last - first:
+            display = self.owner.build_timer_row(self.viewport)
+            self.bind_wheel(display['frame'])
+            self.rows.append(display)
+
+        # Keep rows that still show a visible timer so only new ones rebind
+        visible = self.items[first:last]
+        wanted = {id(timer) for timer in visible}
+        bound = {}
+        free = []
+        for display in self.rows:
+            timer = display['timer']
+            if timer is not None and id(timer) in wanted:
+                bound[id(timer)] = display
+            else:
+                free.append(display)
+
+        for index, timer in enumerate(visible, first):
+            display = bound.get(id(timer))
+            if display is None:
+                display = free.pop()
+                self.owner.bind_timer_row(display, timer)
+            display['frame'].place(
+                x=10,
+                y=index * self.ROW_HEIGHT - self.offset,
+                relwidth=1.0,
+                width=-20,
+                height=self.ROW_HEIGHT - 10
+            )
+
+        for display in free:
+            if display['timer'] is not None:
+                self.owner.bind_timer_row(display, None)
+            display['frame'].place_forget()
+
+        if total > 0:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + height) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
@@ -0,0 +1,176 @@
+"""Runtime metrics in the Prometheus text format
+
+Histograms are observed on the hot paths (every timer fire, every row
+redraw), so observe() is a bisect and three additions with no lock: each
+histogram has a single writer thread, and a reader rendering mid-update
+is off by at most one sample.
+
+    registry = MetricsRegistry()
+    registry.add(engine.lateness)
+    registry.add(Gauge('countdown_threads', "Live threads", threading.active_count))
+    write_metrics_file(registry, 'metrics.prom')   # for node_exporter's textfile collector
+    MetricsServer(registry, 9464)                  # or scrape http://127.0.0.1:9464/metrics
+"""
+import bisect
+import http.server
+import math
+import os
+import threading
+
+# Seconds; timer fires and mainloop callbacks are expected in the low milliseconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Seconds; a row redraw is a handful of widget configure calls
+UPDATE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+
+def _format(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _label(name, value):
+    value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f'{name}="{value}"'
+
+class Histogram:
+    """Bucketed distribution with its sum, count and maximum"""
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # Per-bucket counts, the last one for values above every bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile; the maximum past the last bound"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"] + self.samples()
+
+    def samples(self, labels=''):
+        """Sample lines without the header; labels as rendered by _label()"""
+        lines = []
+        cumulative = 0
+        prefix = labels + ',' if labels else ''
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{{prefix}le="{_format(bound)}"}} {cumulative}')
+        suffix = f'{{{labels}}}' if labels else ''
+        lines.append(f"{self.name}_sum{suffix} {_format(self.sum)}")
+        lines.append(f"{self.name}_count{suffix} {self.count}")
+        return lines
+
+class HistogramFamily:
+    """Histograms of one metric split by a label, each created on first use"""
+    def __init__(self, name, help, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.histograms = {}
+
+    def get(self, value):
+        histogram = self.histograms.get(value)
+        if histogram is None:
+            histogram = self.histograms[value] = Histogram(self.name, self.help, self.buckets)
+        return histogram
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for value, histogram in list(self.histograms.items()):
+            lines.extend(histogram.samples(_label(self.label, value)))
+        return lines
+
+class Gauge:
+    """Value read when rendered: a number, or {label value: number} for one label"""
+    def __init__(self, name, help, read, label=None, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.label = label
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        value = self.read()
+        if self.label is None:
+            lines.append(f"{self.name} {_format(value)}")
+        else:
+            for key, item in value.items():
+                lines.append(f'{self.name}{{{_label(self.label, key)}}} {_format(item)}')
+        return lines
+
+class MetricsRegistry:
+    """Ordered set of metrics rendered together"""
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+def write_metrics_file(registry, path):
+    """Write the metrics atomically, so a collector never reads half a file"""
+    temporary = path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write(registry.render())
+    os.replace(temporary, path)
+
+class MetricsServer:
+    """Serve GET /metrics from a background thread"""
+    def __init__(self, registry, port, host='127.0.0.1'):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
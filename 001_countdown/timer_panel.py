@@ -0,0 +1,122 @@
+import time
+import tkinter as tk
+
+class CompletionPanel:
+    """Non-modal window listing finished timers
+
+    Completions are added in groups, so a burst of timers that expire
+    together shows up as one panel with one line each instead of a modal
+    messagebox per timer. The window is created on first use and only
+    withdrawn when dismissed, ready for the next group.
+    """
+    MAX_LINES = 1000
+
+    def __init__(self, root):
+        self.root = root
+        self.window = None
+        self.count = 0
+
+    def build(self):
+        self.window = tk.Toplevel(self.root)
+        self.window.title("时间到！")
+        self.window.configure(bg='#2c3e50')
+        self.window.protocol("WM_DELETE_WINDOW", self.dismiss)
+
+        self.header = tk.Label(
+            self.window,
+            text="",
+            font=("Arial", 14, "bold"),
+            fg='#ecf0f1',
+            bg='#2c3e50'
+        )
+        self.header.pack(pady=10, padx=10)
+
+        self.listbox = tk.Listbox(
+            self.window,
+            font=("Arial", 11),
+            width=40,
+            height=12,
+            bg='#34495e',
+            fg='#ecf0f1'
+        )
+        self.listbox.pack(fill='both', expand=True, padx=10)
+
+        tk.Button(
+            self.window,
+            text="知道了",
+            command=self.dismiss,
+            font=("Arial", 12),
+            bg='#27ae60',
+            fg='white',
+            width=10
+        ).pack(pady=10)
+
+    def add(self, timers):
+        """Show a group of completed timers, appended to any still on screen"""
+        if not timers:
+            return
+        if self.window is None:
+            self.build()
+
+        stamp = time.strftime('%H:%M:%S')
+        self.listbox.insert(tk.END, *(f"{stamp}  {timer.name}" for timer in timers))
+        # Bound the list; the header keeps the full count
+        overflow = self.listbox.size() - self.MAX_LINES
+        if overflow > 0:
+            self.listbox.delete(0, overflow - 1)
+        self.listbox.see(tk.END)
+
+        self.count += len(timers)
+        self.header.config(text=f"{self.count} 个任务已完成")
+        self.window.deiconify()
+        self.window.lift()
+
+    def dismiss(self):
+        """Clear the list and hide the window"""
+        if self.window is None:
+            return
+        self.listbox.delete(0, tk.END)
+        self.count = 0
+        self.window.withdraw()
+
+class StatsPanel:
+    """Small window with live runtime statistics
+
+    The owner pushes new text while it is shown; closing only withdraws it.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.window = None
+        self.visible = False
+
+    def build(self):
+        self.window = tk.Toplevel(self.root)
+        self.window.title("运行统计")
+        self.window.configure(bg='#2c3e50')
+        self.window.protocol("WM_DELETE_WINDOW", self.hide)
+
+        self.label = tk.Label(
+            self.window,
+            text="",
+            font=("Courier", 11),
+            justify='left',
+            anchor='w',
+            fg='#ecf0f1',
+            bg='#2c3e50'
+        )
+        self.label.pack(fill='both', expand=True, padx=15, pady=15)
+
+    def show(self, text):
+        if self.window is None:
+            self.build()
+        self.update(text)
+        self.visible = True
+        self.window.deiconify()
+        self.window.lift()
+
+    def update(self, text):
+        self.label.config(text=text)
+
+    def hide(self):
+        self.visible = False
+        self.window.withdraw()
@@ -0,0 +1,190 @@
+"""Recurrence rules for repeating timers
+
+A recurring timer does not complete for good: when it reaches zero the
+engine announces the completion and starts the next cycle in place, on the
+scheduler thread, with the same TimerTask and the same row in the UI.
+
+    Interval(300)                  # every 5 minutes, drift-free
+    CronSchedule('*/15 9-17 * * 1-5')
+    parse_recurrence('every:300')  # the text form used by the journal and files
+
+Rules are immutable and parsed once per distinct spec, so thousands of
+timers sharing a schedule share one rule object and its lookup cache.
+"""
+import bisect
+import functools
+import math
+from datetime import datetime, timedelta
+
+class Interval:
+    """Repeat a fixed duration back to back
+
+    Each cycle ends exactly seconds after the previous one ended, however
+    late the scheduler got to it; cycles missed while the timer could not
+    run (a suspended machine, a restart) are skipped, not replayed. Seconds
+    may have a millisecond part, for precise timers.
+    """
+    def __init__(self, seconds):
+        seconds = round(float(seconds), 3)
+        if not seconds > 0:
+            raise ValueError("interval must be positive")
+        self.seconds = int(seconds) if seconds.is_integer() else seconds
+
+    @property
+    def spec(self):
+        return f"every:{self.seconds}"
+
+    def first_duration(self, wall):
+        """Duration of a cycle started by the user; the timer's own duration"""
+        return None
+
+    def next_cycle(self, end, now, wall):
+        """(start, duration) of the cycle after one that ended at end, on the timer's clock"""
+        skipped = max(0, math.floor((now - end) / self.seconds))
+        return end + skipped * self.seconds, self.seconds
+
+    def __repr__(self):
+        return f"Interval({self.seconds})"
+
+# (low, high) of each cron field: minute, hour, day of month, month, day of week
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+}
+
+def _parse_cron_field(text, low, high):
+    """Sorted values of one cron field: '*', 'a', 'a-b', any of them '/step', comma-separated"""
+    values = set()
+    for part in text.split(','):
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+            if step <= 0:
+                raise ValueError(f"bad step in {text!r}")
+        else:
+            step = 1
+        if part == '*':
+            first, last = low, high
+        elif '-' in part:
+            first, last = map(int, part.split('-', 1))
+        else:
+            first = last = int(part)
+            if step > 1:
+                last = high
+        if not low <= first <= last <= high:
+            raise ValueError(f"{text!r} is outside {low}-{high}")
+        values.update(range(first, last + 1, step))
+    return sorted(values)
+
+class CronSchedule:
+    """Calendar schedule in five-field cron syntax, in local time
+
+    minute hour day-of-month month day-of-week, each '*', a value, a range,
+    a step or a list of those; Sunday is 0 or 7. As in cron, when both day
+    fields are restricted a day matching either one fires.
+
+    next_after() moves field by field, jumping straight to the next allowed
+    month, day, hour and minute with bisect, instead of probing minute by
+    minute; the last answer is cached because a burst of timers on the same
+    schedule all ask about the same minute.
+    """
+    def __init__(self, expression):
+        expression = ' '.join(expression.split())
+        fields = CRON_ALIASES.get(expression, expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expression!r}")
+        try:
+            parsed = [
+                _parse_cron_field(field, low, high)
+                for field, (low, high) in zip(fields, CRON_FIELDS)
+            ]
+        except ValueError as e:
+            raise ValueError(f"bad cron expression {expression!r}: {e}") from None
+
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # cron counts Sunday as 0 (or 7), datetime.weekday() as 6
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+        self._cached = (None, None)
+
+    @property
+    def spec(self):
+        return f"cron:{self.expression}"
+
+    def _day_matches(self, day):
+        in_month = day.day in self.days
+        in_week = day.weekday() in self.weekdays
+        if self.any_day:
+            return in_week
+        if self.any_weekday:
+            return in_month
+        return in_month or in_week
+
+    def next_after(self, moment):
+        """First matching minute strictly after a naive local datetime"""
+        key = moment.replace(second=0, microsecond=0)
+        if self._cached[0] == key:
+            return self._cached[1]
+
+        t = key + timedelta(minutes=1)
+        # Bounded: a valid expression matches within a few years (29 Feb on a given weekday)
+        limit = t.year + 30
+        while t.year <= limit:
+            if t.month not in self.months:
+                index = bisect.bisect_left(self.months, t.month)
+                if index == len(self.months):
+                    t = datetime(t.year + 1, self.months[0], 1)
+                else:
+                    t = datetime(t.year, self.months[index], 1)
+                continue
+            if not self._day_matches(t):
+                t = datetime(t.year, t.month, t.day) + timedelta(days=1)
+                continue
+            if t.hour not in self.hours:
+                index = bisect.bisect_left(self.hours, t.hour)
+                if index == len(self.hours):
+                    t = datetime(t.year, t.month, t.day) + timedelta(days=1)
+                else:
+                    t = t.replace(hour=self.hours[index], minute=0)
+                continue
+            if t.minute not in self.minutes:
+                index = bisect.bisect_left(self.minutes, t.minute)
+                if index == len(self.minutes):
+                    t = t.replace(minute=0) + timedelta(hours=1)
+                else:
+                    t = t.replace(minute=self.minutes[index])
+                continue
+            self._cached = (key, t)
+            return t
+        raise ValueError(f"cron expression never matches: {self.expression!r}")
+
+    def first_duration(self, wall):
+        """Seconds from wall-clock time wall to the next matching minute"""
+        return self.next_after(datetime.fromtimestamp(wall)).timestamp() - wall
+
+    def next_cycle(self, end, now, wall):
+        """(start, duration) of the next cycle: from now until the next matching minute"""
+        return now, self.first_duration(wall)
+
+    def __repr__(self):
+        return f"CronSchedule({self.expression!r})"
+
+@functools.lru_cache(maxsize=1024)
+def parse_recurrence(spec):
+    """Rule for 'every:SECONDS' or 'cron:EXPRESSION'; raises ValueError"""
+    kind, _, value = spec.partition(':')
+    if kind == 'every':
+        try:
+            return Interval(value)
+        except ValueError:
+            raise ValueError(f"bad interval {value!r}") from None
+    if kind == 'cron':
+        return CronSchedule(value)
+    raise ValueError(f"unknown recurrence {spec!r}")
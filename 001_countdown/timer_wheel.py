@@ -0,0 +1,178 @@
+"""Hierarchical timing wheel storage for the countdown engine
+
+A drop-in alternative to HeapTimerQueue for very large, mostly idle timer
+populations: TimerEngine(timer_queue=TimingWheel(), tick_events=False).
+"""
+import math
+import time
+
+class TimingWheel:
+    """Second/minute/hour/day wheels with O(1) push and cancel
+
+    The wheels have 100 x 10 ms, 60 x 1 s, 60 x 1 min and 24 x 1 h slots by
+    default; deadlines more than a day out wait in an overflow bucket. An
+    entry sits in the lowest wheel whose current revolution contains its
+    deadline and is cascaded one wheel down when time reaches its slot.
+    Empty stretches are skipped a whole slot at a time, so advancing costs
+    roughly the number of timers that expire, not the number stored.
+    """
+    def __init__(self, resolution=0.01, sizes=(100, 60, 60, 24), origin=None):
+        self.resolution = resolution
+        self.sizes = sizes
+        self.origin = time.monotonic() if origin is None else origin
+
+        # Ticks covered by one slot of each wheel; spans[-1] is a full day
+        self.spans = [1]
+        for size in sizes:
+            self.spans.append(self.spans[-1] * size)
+
+        self.wheels = [[{} for _ in range(size)] for size in sizes]
+        self.overflow = {}
+        self.counts = [0] * (len(sizes) + 1)
+        # timer id -> (level, slot dict) for O(1) cancel
+        self.location = {}
+        # Every tick before this one has been collected
+        self.current = 0
+
+    def __len__(self):
+        return len(self.location)
+
+    def _tick_of(self, deadline):
+        # The epsilon keeps slot boundaries computed by next_deadline in their own tick
+        return math.floor((deadline - self.origin) / self.resolution + 1e-6)
+
+    def _place(self, timer_id, entry, tick):
+        current = self.current
+        if tick < current:
+            tick = current
+        spans = self.spans
+        for level, size in enumerate(self.sizes):
+            span = spans[level + 1]
+            if tick // span == current // span:
+                slot = self.wheels[level][(tick // spans[level]) % size]
+                break
+        else:
+            level = len(self.sizes)
+            slot = self.overflow
+
+        slot[timer_id] = entry
+        self.counts[level] += 1
+        self.location[timer_id] = (level, slot)
+
+    def push(self, timer, deadline):
+        """Arm a timer at deadline, replacing any pending entry"""
+        timer_id = timer.id
+        location = self.location.get(timer_id)
+        if location is not None:
+            del location[1][timer_id]
+            self.counts[location[0]] -= 1
+        self._place(timer_id, (deadline, timer), self._tick_of(deadline))
+
+    def push_many(self, entries):
+        """Arm many (timer, deadline) pairs"""
+        for timer, deadline in entries:
+            self.push(timer, deadline)
+
+    def cancel(self, timer):
+        """Drop the pending entry of a timer, if any"""
+        location = self.location.pop(timer.id, None)
+        if location is not None:
+            level, slot = location
+            del slot[timer.id]
+            self.counts[level] -= 1
+
+    def next_deadline(self):
+        """Earliest time worth waking up for, or None when empty
+
+        Exact for entries due within the current second; for later ones it
+        is the moment their slot cascades, which is never after the deadline.
+        """
+        if not self.location:
+            return None
+
+        current = self.current
+        for level, size in enumerate(self.sizes):
+            if not self.counts[level]:
+                continue
+            span = self.spans[level]
+            first = current // span
+            # Entries of this wheel all lie in the current revolution of the next one
+            end = (current // self.spans[level + 1] + 1) * size
+            for index in range(first, end):
+                slot = self.wheels[level][index % size]
+                if slot:
+                    if level == 0:
+                        return min(entry[0] for entry in slot.values())
+                    return self.origin + max(index * span, current) * self.resolution
+        # Only the overflow is populated: wake when the day wheel turns over
+        return self.origin + (current // self.spans[-1] + 1) * self.spans[-1] * self.resolution
+
+    def pop_due(self, now):
+        """Remove and return the (deadline, timer) pairs due by now, in deadline order"""
+        target = self._tick_of(now)
+        size = self.sizes[0]
+        due = []
+        while True:
+            slot = self.wheels[0][self.current % size]
+            if slot:
+                if self.current < target:
+                    ready = list(slot.items())
+                else:
+                    ready = [item for item in slot.items() if item[1][0] <= now]
+                for timer_id, entry in ready:
+                    del slot[timer_id]
+                    del self.location[timer_id]
+                    due.append(entry)
+                self.counts[0] -= len(ready)
+
+            if self.current >= target:
+                break
+            self._advance(target)
+
+        due.sort(key=lambda entry: entry[0])
+        return due
+
+    def _advance(self, target):
+        """Move current to the next tick that needs work, cascading on the way"""
+        current = self.current
+        spans = self.spans
+        size = self.sizes[0]
+
+        if self.counts[0]:
+            # Next populated 10 ms slot within this second, else the next second
+            boundary = current - current % size + size
+            following = boundary
+            for tick in range(current + 1, min(boundary, target + 1)):
+                if self.wheels[0][tick % size]:
+                    following = tick
+                    break
+        else:
+            for level, count in enumerate(self.counts):
+                if count:
+                    break
+            else:
+                self.current = target
+                return
+            span = spans[level]
+            following = (current // span + 1) * span
+
+        if following > target:
+            self.current = target
+            return
+
+        self.current = following
+        if following % spans[-1] == 0 and self.overflow:
+            self._cascade(len(self.sizes), self.overflow)
+        for level in range(len(self.sizes) - 1, 0, -1):
+            if following % spans[level] == 0:
+                slot = self.wheels[level][(following // spans[level]) % self.sizes[level]]
+                if slot:
+                    self._cascade(level, slot)
+
+    def _cascade(self, level, slot):
+        """Re-place the entries of a slot now that time has reached it"""
+        entries = list(slot.items())
+        slot.clear()
+        self.counts[level] -= len(entries)
+        for timer_id, entry in entries:
+            self._place(timer_id, entry, self._tick_of(entry[0]))